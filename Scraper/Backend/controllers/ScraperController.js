@@ -92,7 +92,7 @@ exports.runScrapers = async (req, res) => {
           ? {
               message: 'CAPTCHA required',
               captcha: result.captcha,
-              sessionId: `${result.site}_${Date.now()}`,
+              sessionId: result.sessionId,
             }
           : { message: 'Scraping failed', error: result.error }),
       };
@@ -65,7 +65,7 @@ router.post('/scrape', async (req, res) => {
       return res.status(200).json({
         message: 'CAPTCHA required',
         captcha: result.captcha,
-        sessionId: `${site}_${Date.now()}`,
+        sessionId: result.sessionId,
       });
     }
     logger.info({ message: `Scraping completed for ${site}`, productCount: result.products?.length });
@@ -109,9 +109,20 @@ router.post('/captcha', async (req, res) => {
 
   try {
     const result = await validateCaptcha(site, captchaInput, sessionId);
-    if (result.valid) {
-      logger.info({ message: `CAPTCHA validated successfully for ${site}` });
-      res.status(200).json({ message: 'CAPTCHA validated successfully' });
+    if (result.status === 'captcha_required') {
+      // The resumed job ran into another CAPTCHA
+      logger.info({ message: `CAPTCHA required again for ${site}`, captcha: result.captcha });
+      res.status(200).json({
+        message: 'CAPTCHA required',
+        captcha: result.captcha,
+        sessionId: result.sessionId,
+      });
+    } else if (result.valid) {
+      logger.info({ message: `CAPTCHA validated successfully for ${site}`, productCount: result.products?.length });
+      res.status(200).json({
+        message: result.message || 'CAPTCHA validated successfully',
+        ...(result.status ? { status: result.status, products: result.products || [] } : {}),
+      });
     } else {
       logger.warn({ message: `Invalid CAPTCHA for ${site}`, result });
       res.status(400).json({ message: result.message || 'Invalid CAPTCHA' });
@@ -5,6 +5,7 @@ import logging
 import os
 import random
 import sys
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 from urllib.parse import quote, urljoin
@@ -19,6 +20,24 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException, WebDriverException, NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+from scraper_utils import net_capture
+from scraper_utils.canonical import ProductIndex
+from scraper_utils.cdp_driver import wrap_cdp
+from scraper_utils.cookie_jar import open_cookie_jar
+from scraper_utils.driver_supervisor import supervise
+from scraper_utils.export import export_run
+from scraper_utils.fingerprint import manage_fingerprint, random_fingerprint
+from scraper_utils.paginate import SearchPager
+from scraper_utils.pipeline import open_parse_pool
+from scraper_utils.product_store import open_store
+from scraper_utils.profiles import open_profile
+from scraper_utils.proxy_pool import open_proxy_pool
+from scraper_utils.rate_limit import limiter_for, throttled_get
+from scraper_utils.readiness import set_page_load_strategy
+from scraper_utils.run_report import run_report
+from scraper_utils.scroll import scroll_to_load
+from scraper_utils.seen_index import open_seen_index
+from scraper_utils.spill import open_products
 
 # Logging setup
 log_folder = Path("logs")
@@ -77,15 +96,12 @@ class AlibabaScraper:
         self.min_products = max(0, min_products)
         self.headless = headless
         self.chrome_binary = chrome_binary
-        self.scraped_data = []
+        self.scraped_data = open_products("alibaba")
         self.skipped_products = []
-        self.user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/120.0.0.0"
-        ]
+        self.store = open_store("alibaba", self.search_keyword)
+        self.seen = open_seen_index("alibaba")
+        self.product_index = ProductIndex("alibaba")
+        self.fingerprints = None
         self.output_dir = Path("data")
         self.output_dir.mkdir(exist_ok=True)
         self.driver = None
@@ -109,10 +125,19 @@ class AlibabaScraper:
             "video": "video, video[src], *[class*='video']",
             "captcha": "div[class*='captcha'], iframe[src*='captcha'], [id*='captcha'], div[class*='verify']"
         }
+        self.cookie_jar = open_cookie_jar("alibaba", self.base_url)
+        self.profile = open_profile("alibaba")
+        self.proxy_pool = open_proxy_pool("alibaba")
+        # Opened before the browser so parse workers fork from a small process
+        self.parse_pool = open_parse_pool("alibaba")
         self._setup_driver()
 
-    def _setup_driver(self):
-        """Set up Selenium WebDriver with Chrome."""
+    def __getstate__(self):
+        """Only the parsing configuration is sent to parse worker processes."""
+        return {"selectors": self.selectors, "base_url": self.base_url, "search_keyword": self.search_keyword}
+
+    def _start_browser(self, sticky_proxy=None):
+        """Launch a Chrome browser with the stealth settings, reusing `sticky_proxy` if it is still healthy."""
         chrome_options = Options()
         if self.headless:
             chrome_options.add_argument("--headless=new")
@@ -121,39 +146,54 @@ class AlibabaScraper:
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
         chrome_options.add_argument("--log-level=3")
-        chrome_options.add_argument(f"user-agent={random.choice(self.user_agents)}")
+        chrome_options.add_argument(f"user-agent={random_fingerprint()['user_agent']}")
         chrome_options.add_argument("--disable-blink-features=AutomationControlled")
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option("useAutomationExtension", False)
         if self.chrome_binary and os.path.isfile(self.chrome_binary):
             chrome_options.binary_location = self.chrome_binary
             logger.info(f"Using Chrome binary: {self.chrome_binary}")
+        self.profile.apply_chrome(chrome_options)
+        net_capture.prepare(chrome_options, "alibaba")
+        set_page_load_strategy(chrome_options, "alibaba")
+        proxy = self.proxy_pool.configure_chrome(chrome_options, sticky_proxy)
+        service = Service(ChromeDriverManager().install())
+        driver = self.proxy_pool.bind(
+            self.profile.attach(wrap_cdp(webdriver.Chrome(service=service, options=chrome_options), "alibaba")), proxy
+        )
+        self._apply_stealth(driver)
+        return driver
+
+    @staticmethod
+    def _apply_stealth(driver):
+        """Hide the automation markers from the scripts of every page the current tab loads."""
+        # navigator.platform and navigator.languages come from the fingerprint's user-agent override
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
+            "source": """
+                Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
+                window.navigator.chrome = { runtime: {} };
+                Object.defineProperty(window, 'chrome', { get: () => ({ runtime: {} }) });
+            """
+        })
+
+    def _setup_driver(self):
+        """Set up Selenium WebDriver with Chrome."""
         try:
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-                "source": """
-                    Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
-                    window.navigator.chrome = { runtime: {} };
-                    Object.defineProperty(window, 'chrome', { get: () => ({ runtime: {} }) });
-                    Object.defineProperty(navigator, 'platform', { get: () => 'Win32' });
-                    Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
-                """
-            })
+            self.driver = supervise(self._start_browser, "alibaba")
             self.wait = WebDriverWait(self.driver, 20)
             logger.info("WebDriver initialized")
+            self.cookie_jar.preload(self.driver)
+            # Alibaba always rotates: once per search page (see scrape_products) and after blocks
+            self.fingerprints = manage_fingerprint(self.driver, "alibaba", rotate_every=0, enabled=True)
+            self.capture = net_capture.open_capture(self.driver, "alibaba")
         except WebDriverException as e:
             logger.error(f"Failed to initialize WebDriver: {e}")
             raise
 
     def rotate_user_agent(self):
-        """Rotate user agent to avoid detection."""
-        try:
-            user_agent = random.choice(self.user_agents)
-            self.driver.execute_cdp_cmd('Network.setUserAgentOverride', {"userAgent": user_agent})
-            logger.debug(f"Rotated user agent to: {user_agent}")
-        except Exception as e:
-            logger.warning(f"Failed to rotate user agent: {e}")
+        """Rotate the browser fingerprint (user agent, locale, viewport) to avoid detection."""
+        if self.fingerprints:
+            self.fingerprints.rotate("new page")
 
     def clean_title(self, title: str) -> Optional[str]:
         """Clean and normalize product title."""
@@ -193,25 +233,31 @@ class AlibabaScraper:
             cleaned_title = cleaned_title[:97] + "..."
         return cleaned_title
 
+    def parse_price(self, raw_price: str) -> Optional[Dict[str, Optional[str]]]:
+        """Parse currency and exact price from a price text; None if it holds no price."""
+        if "Contact Supplier" in raw_price or "Negotiable" in raw_price:
+            return {"currency": None, "exact_price": "Ask Price"}
+        currency = None
+        currency_symbols = ["$", "€", "¥", "£", "US$", "CNY", "₹"]
+        for symbol in currency_symbols:
+            if symbol in raw_price:
+                currency = symbol
+                break
+        price_pattern = r'[\d,]+(?:\.\d+)?'
+        price_matches = re.findall(price_pattern, raw_price)
+        price_values = [re.sub(r'[^\d.]', '', p) for p in price_matches]
+        if price_values:
+            return {"currency": currency, "exact_price": price_values[0]}
+        return None
+
     def extract_price(self, soup: BeautifulSoup, title: str) -> Dict[str, Optional[str]]:
         """Extract currency and exact price."""
         try:
             for selector in self.selectors["price"].split(", "):
                 if price_el := soup.select_one(selector):
-                    raw_price = price_el.get_text(strip=True)
-                    if "Contact Supplier" in raw_price or "Negotiable" in raw_price:
-                        return {"currency": None, "exact_price": "Ask Price"}
-                    currency = None
-                    currency_symbols = ["$", "€", "¥", "£", "US$", "CNY", "₹"]
-                    for symbol in currency_symbols:
-                        if symbol in raw_price:
-                            currency = symbol
-                            break
-                    price_pattern = r'[\d,]+(?:\.\d+)?'
-                    price_matches = re.findall(price_pattern, raw_price)
-                    price_values = [re.sub(r'[^\d.]', '', p) for p in price_matches]
-                    if price_values:
-                        return {"currency": currency, "exact_price": price_values[0]}
+                    price = self.parse_price(price_el.get_text(strip=True))
+                    if price:
+                        return price
                     break
             logger.warning(f"No price found for {title}")
             return {"currency": None, "exact_price": None}
@@ -417,8 +463,22 @@ class AlibabaScraper:
             logger.error(f"Error handling anti-bot checks: {e}")
             return False
 
-    def extract_detail_page(self, url: str, title: str) -> Dict[str, any]:
-        """Extract data from product detail page."""
+    def fetch_detail_page(self, url: str) -> Optional[str]:
+        """Load a product detail page and return its HTML; None if it could not be loaded."""
+        try:
+            throttled_get(self.driver, url)
+            self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+            if not self.handle_anti_bot_checks():
+                logger.error(f"Failed anti-bot checks on detail page: {url}")
+                return None
+            scroll_to_load(self.driver, step=500, max_scrolls=2)
+            return self.driver.page_source
+        except Exception as e:
+            logger.error(f"Error loading detail page {url}: {e}")
+            return None
+
+    def parse_detail_page(self, detail_html: Optional[str], title: str) -> Dict[str, any]:
+        """Extract data from a product detail page's HTML; runs in a parse worker."""
         detail_data = {
             "description": None,
             "videos": None,
@@ -426,16 +486,9 @@ class AlibabaScraper:
             "images": [],
             "origin": None
         }
+        if not detail_html:
+            return detail_data
         try:
-            self.driver.get(url)
-            self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-            if not self.handle_anti_bot_checks():
-                logger.error(f"Failed anti-bot checks on detail page: {url}")
-                return detail_data
-            for i in range(2):
-                self.driver.execute_script(f"window.scrollTo(0, {i * 500});")
-                time.sleep(0.5)
-            detail_html = self.driver.page_source
             detail_soup = BeautifulSoup(detail_html, "html.parser")
             detail_data["description"] = self.extract_description(detail_soup, title)
             detail_data["videos"] = self.extract_videos(detail_soup, title)
@@ -460,188 +513,278 @@ class AlibabaScraper:
             detail_data["images"] = detail_data["images"][:5]
             logger.info(f"Extracted detail page data for: {title}")
         except Exception as e:
-            logger.error(f"Error extracting detail page {url}: {e}")
+            logger.error(f"Error extracting detail page for {title}: {e}")
         return detail_data
 
+    @staticmethod
+    def _new_product() -> Dict:
+        """Return an empty product record."""
+        return {
+            "url": None,
+            "title": None,
+            "currency": None,
+            "exact_price": None,
+            "description": None,
+            "min_order": None,
+            "supplier": None,
+            "origin": None,
+            "feedback": {"rating": None, "review": None},
+            "image_url": None,
+            "images": None,
+            "videos": None,
+            "dimensions": None,
+            "website_name": "Alibaba.com",
+            "discount_information": None,
+            "brand_name": None,
+            "specifications": {}
+        }
+
+    def _listings_from_dom(self, page: int) -> Optional[List[Dict]]:
+        """Collect listing data from the search page's product cards; None if there are none."""
+        working_selector = None
+        for selector in self.selectors["product_card"].split(", "):
+            try:
+                self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector)))
+                working_selector = selector
+                logger.info(f"Using product selector: {selector}")
+                break
+            except TimeoutException:
+                continue
+        if not working_selector:
+            logger.error(f"No products found on page {page}")
+            return None
+        scroll_to_load(self.driver, working_selector, max_scrolls=3)
+        product_list = []
+        idx = 0
+        while True:
+            if len(self.scraped_data) + len(product_list) >= self.min_products:
+                break
+            cards = self.driver.find_elements(By.CSS_SELECTOR, working_selector)
+            if idx >= len(cards):
+                break
+            retries = 3
+            card_elem = None
+            while retries > 0:
+                try:
+                    card_elem = cards[idx]
+                    break
+                except (StaleElementReferenceException, IndexError):
+                    retries -= 1
+                    time.sleep(1)
+                    cards = self.driver.find_elements(By.CSS_SELECTOR, working_selector)
+            if not card_elem:
+                logger.warning(f"Failed to retrieve card {idx} after retries")
+                self.skipped_products.append({"idx": idx + 1, "page": page, "reason": "Stale element after retries"})
+                idx += 1
+                continue
+            product_data = self._new_product()
+            try:
+                card_html = card_elem.get_attribute("outerHTML")
+                card_soup = BeautifulSoup(card_html, "html.parser")
+            except StaleElementReferenceException:
+                logger.warning(f"Stale element for card {idx}. Skipping.")
+                self.skipped_products.append({"idx": idx + 1, "page": page, "reason": "Stale element during HTML retrieval"})
+                idx += 1
+                continue
+            title = None
+            for selector in self.selectors["title"].split(", "):
+                if title_el := card_soup.select_one(selector):
+                    title = title_el.get_text(strip=True)
+                    break
+            if not title:
+                logger.warning(f"No title found for card {idx}")
+                self.skipped_products.append({"idx": idx + 1, "page": page, "reason": "No title"})
+                idx += 1
+                continue
+            product_data["title"] = self.clean_title(title)
+            if self.search_keyword.lower() not in product_data["title"].lower():
+                logger.info(f"Skipping non-matching product: {product_data['title']}")
+                self.skipped_products.append({
+                    "idx": idx + 1,
+                    "page": page,
+                    "title": product_data["title"],
+                    "reason": f"Does not match search keyword: {self.search_keyword}"
+                })
+                idx += 1
+                continue
+            product_url = None
+            for selector in self.selectors["product_link"].split(", "):
+                if a_tag := card_soup.select_one(selector):
+                    product_url = a_tag.get("href", None)
+                    break
+            if not product_url:
+                logger.warning(f"No URL found for {product_data['title']}")
+                self.skipped_products.append({
+                    "idx": idx + 1,
+                    "page": page,
+                    "title": product_data["title"],
+                    "reason": "No URL"
+                })
+                idx += 1
+                continue
+            if product_url.startswith('//'):
+                product_url = f"https:{product_url}"
+            elif not product_url.startswith(('http://', 'https://')):
+                product_url = urljoin(self.base_url, product_url)
+            if "?" in product_url:
+                product_url = product_url.split("?")[0]
+            product_data["url"] = product_url
+            product_data.update(self.extract_price(card_soup, product_data["title"]))
+            product_data["min_order"] = self.extract_min_order(card_soup, product_data["title"])
+            product_data["supplier"] = self.extract_supplier(card_soup, product_data["title"])
+            product_data["feedback"] = self.extract_feedback(card_soup, product_data["title"])
+            product_data["discount_information"] = self.extract_discount(card_soup, product_data["title"])
+            product_data["brand_name"] = self.extract_brand(product_data["title"])
+            image_data = self.extract_images(card_soup, card_elem, product_data["title"])
+            product_data.update(image_data)
+            if image_data["dimensions"]:
+                product_data["specifications"]["Dimensions"] = image_data["dimensions"]
+            product_data["dimensions"] = None  # Remove separate dimensions field
+            product_list.append(product_data)
+            logger.info(f"Collected listing data for product {idx + 1}/{len(cards)} on page {page}: {product_data['title']}")
+            idx += 1
+        return product_list
+
+    def _listings_from_capture(self, page: int, listings: List[Dict]) -> List[Dict]:
+        """Turn listings captured from the search API into product records, with the DOM path's rules."""
+        product_list = []
+        for idx, listing in enumerate(listings):
+            if len(self.scraped_data) + len(product_list) >= self.min_products:
+                break
+            product_data = self._new_product()
+            product_data["title"] = self.clean_title(str(listing["title"]))
+            if self.search_keyword.lower() not in product_data["title"].lower():
+                logger.info(f"Skipping non-matching product: {product_data['title']}")
+                self.skipped_products.append({
+                    "idx": idx + 1,
+                    "page": page,
+                    "title": product_data["title"],
+                    "reason": f"Does not match search keyword: {self.search_keyword}"
+                })
+                continue
+            product_data["url"] = self._absolute_url(str(listing["url"])).split("?")[0]
+            if "price" in listing:
+                product_data.update(self.parse_price(str(listing["price"])) or {})
+            if "min_order" in listing:
+                qty_match = re.search(r'(\d+)', str(listing["min_order"]))
+                unit_match = re.search(r'([A-Za-z]+)', str(listing["min_order"]))
+                if qty_match and unit_match:
+                    product_data["min_order"] = f"{qty_match.group(1)} {unit_match.group(1)}"
+            product_data["supplier"] = listing.get("supplier")
+            product_data["feedback"] = {
+                "rating": str(listing["rating"]) if "rating" in listing else None,
+                "review": str(listing["reviews"]) if "reviews" in listing else None,
+            }
+            product_data["brand_name"] = self.extract_brand(product_data["title"])
+            sources = [listing.get("image")] + [src for src in listing.get("images", []) if isinstance(src, str)]
+            images = list(dict.fromkeys(self._absolute_url(src) for src in sources if src))[:5]
+            product_data["images"] = images or None
+            product_data["image_url"] = images[0] if images else None
+            product_list.append(product_data)
+            logger.info(f"Collected captured listing {idx + 1}/{len(listings)} on page {page}: {product_data['title']}")
+        return product_list
+
+    def _collect_products(self, page: int, pending: deque, wait: bool):
+        """Merge parsed detail pages into their products and save them in order; unless `wait`, stop at the first unparsed one."""
+        while pending and (wait or pending[0][1] is None or pending[0][1].done()):
+            product_data, detail = pending.popleft()
+            try:
+                if detail is not None:
+                    detail_data = detail.result()
+                    product_data["description"] = detail_data["description"]
+                    product_data["videos"] = detail_data["videos"]
+                    product_data["specifications"].update(detail_data["specifications"])
+                    product_data["origin"] = detail_data["origin"]
+                    if detail_data["images"]:
+                        product_data["images"] = list(set((product_data["images"] or []) + detail_data["images"]))[:5]
+                        if not product_data["image_url"] and product_data["images"]:
+                            product_data["image_url"] = product_data["images"][0]
+                if product_data["title"] and product_data["url"]:
+                    self.scraped_data.append(product_data)
+                    self.store.add(product_data)
+                    self.seen.record(product_data)
+                    self.product_index.add(product_data["url"])
+                    logger.info(f"Scraped product on page {page}: {product_data['title']}")
+                else:
+                    self.skipped_products.append({
+                        "page": page,
+                        "title": product_data.get("title", "Unknown"),
+                        "reason": "Missing title or URL after detail page"
+                    })
+            except Exception as e:
+                logger.error(f"Failed to extract detail page for {product_data['title']}: {e}")
+                self.skipped_products.append({
+                    "page": page,
+                    "title": product_data["title"],
+                    "reason": f"Detail page error: {str(e)}"
+                })
+
+    def _absolute_url(self, url: str) -> str:
+        """Resolve protocol-relative and relative URLs against the site."""
+        if url.startswith('//'):
+            return f"https:{url}"
+        if not url.startswith(('http://', 'https://')):
+            return urljoin(self.base_url, url)
+        return url
+
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
     def scrape_products(self) -> List[Dict]:
         """Main scraping logic."""
+        pager = SearchPager(
+            self.driver, "alibaba",
+            lambda page: f"{self.base_url}/trade/search?SearchText={quote(self.search_keyword)}&page={page}",
+            self.max_pages, self.product_index, on_open=self._apply_stealth,
+            # Captured API responses belong to the tab that loaded them, so capture runs load pages in place
+            concurrency=1 if self.capture else None
+        )
         try:
             for page in range(1, self.max_pages + 1):
                 if len(self.scraped_data) >= self.min_products:
                     logger.info(f"Reached target of {self.min_products} products")
                     break
-                url = f"{self.base_url}/trade/search?SearchText={quote(self.search_keyword)}&page={page}"
+                url = pager.url_for(page)
                 logger.info(f"Scraping page {page}/{self.max_pages}: {url}")
                 self.rotate_user_agent()
-                self.driver.get(url)
+                if self.capture:
+                    self.capture.reset()
+                pager.load(page)
                 self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-                time.sleep(random.uniform(2, 4))
                 if not self.handle_anti_bot_checks():
                     logger.error(f"Failed anti-bot checks on page {page}")
                     continue
-                working_selector = None
-                for selector in self.selectors["product_card"].split(", "):
-                    try:
-                        self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector)))
-                        working_selector = selector
-                        logger.info(f"Using product selector: {selector}")
-                        break
-                    except TimeoutException:
-                        continue
-                if not working_selector:
-                    logger.error(f"No products found on page {page}")
-                    continue
-                previous_count = 0
-                for _ in range(3):
-                    cards = self.driver.find_elements(By.CSS_SELECTOR, working_selector)
-                    if len(cards) == previous_count:
-                        break
-                    previous_count = len(cards)
-                    self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(random.uniform(1, 2))
-                product_list = []
-                idx = 0
-                while True:
-                    if len(self.scraped_data) + len(product_list) >= self.min_products:
-                        break
-                    cards = self.driver.find_elements(By.CSS_SELECTOR, working_selector)
-                    if idx >= len(cards):
-                        break
-                    retries = 3
-                    card_elem = None
-                    while retries > 0:
-                        try:
-                            card_elem = cards[idx]
-                            break
-                        except (StaleElementReferenceException, IndexError):
-                            retries -= 1
-                            time.sleep(1)
-                            cards = self.driver.find_elements(By.CSS_SELECTOR, working_selector)
-                    if not card_elem:
-                        logger.warning(f"Failed to retrieve card {idx} after retries")
-                        self.skipped_products.append({"idx": idx + 1, "page": page, "reason": "Stale element after retries"})
-                        idx += 1
-                        continue
-                    product_data = {
-                        "url": None,
-                        "title": None,
-                        "currency": None,
-                        "exact_price": None,
-                        "description": None,
-                        "min_order": None,
-                        "supplier": None,
-                        "origin": None,
-                        "feedback": {"rating": None, "review": None},
-                        "image_url": None,
-                        "images": None,
-                        "videos": None,
-                        "dimensions": None,
-                        "website_name": "Alibaba.com",
-                        "discount_information": None,
-                        "brand_name": None,
-                        "specifications": {}
-                    }
-                    try:
-                        card_html = card_elem.get_attribute("outerHTML")
-                        card_soup = BeautifulSoup(card_html, "html.parser")
-                    except StaleElementReferenceException:
-                        logger.warning(f"Stale element for card {idx}. Skipping.")
-                        self.skipped_products.append({"idx": idx + 1, "page": page, "reason": "Stale element during HTML retrieval"})
-                        idx += 1
-                        continue
-                    title = None
-                    for selector in self.selectors["title"].split(", "):
-                        if title_el := card_soup.select_one(selector):
-                            title = title_el.get_text(strip=True)
-                            break
-                    if not title:
-                        logger.warning(f"No title found for card {idx}")
-                        self.skipped_products.append({"idx": idx + 1, "page": page, "reason": "No title"})
-                        idx += 1
+                listings = self.capture.listings() if self.capture else []
+                if listings:
+                    # Listings captured from the search API need no scrolling or DOM parsing
+                    product_list = self._listings_from_capture(page, listings)
+                else:
+                    product_list = self._listings_from_dom(page)
+                    if product_list is None:
                         continue
-                    product_data["title"] = self.clean_title(title)
-                    if self.search_keyword.lower() not in product_data["title"].lower():
-                        logger.info(f"Skipping non-matching product: {product_data['title']}")
-                        self.skipped_products.append({
-                            "idx": idx + 1,
-                            "page": page,
-                            "title": product_data["title"],
-                            "reason": f"Does not match search keyword: {self.search_keyword}"
-                        })
-                        idx += 1
-                        continue
-                    product_url = None
-                    for selector in self.selectors["product_link"].split(", "):
-                        if a_tag := card_soup.select_one(selector):
-                            product_url = a_tag.get("href", None)
-                            break
-                    if not product_url:
-                        logger.warning(f"No URL found for {product_data['title']}")
-                        self.skipped_products.append({
-                            "idx": idx + 1,
-                            "page": page,
-                            "title": product_data["title"],
-                            "reason": "No URL"
-                        })
-                        idx += 1
-                        continue
-                    if product_url.startswith('//'):
-                        product_url = f"https:{product_url}"
-                    elif not product_url.startswith(('http://', 'https://')):
-                        product_url = urljoin(self.base_url, product_url)
-                    if "?" in product_url:
-                        product_url = product_url.split("?")[0]
-                    product_data["url"] = product_url
-                    product_data.update(self.extract_price(card_soup, product_data["title"]))
-                    product_data["min_order"] = self.extract_min_order(card_soup, product_data["title"])
-                    product_data["supplier"] = self.extract_supplier(card_soup, product_data["title"])
-                    product_data["feedback"] = self.extract_feedback(card_soup, product_data["title"])
-                    product_data["discount_information"] = self.extract_discount(card_soup, product_data["title"])
-                    product_data["brand_name"] = self.extract_brand(product_data["title"])
-                    image_data = self.extract_images(card_soup, card_elem, product_data["title"])
-                    product_data.update(image_data)
-                    if image_data["dimensions"]:
-                        product_data["specifications"]["Dimensions"] = image_data["dimensions"]
-                    product_data["dimensions"] = None  # Remove separate dimensions field
-                    product_list.append(product_data)
-                    logger.info(f"Collected listing data for product {idx + 1}/{len(cards)} on page {page}: {product_data['title']}")
-                    idx += 1
+                if product_list:
+                    # Alibaba has no PageRetry; this is what lets the cookie jar keep a good session
+                    run_report.incr("pages_succeeded")
+                # Detail pages are parsed in the parse pool while the browser loads the next one
+                pending = deque()
                 for product_data in product_list:
-                    if len(self.scraped_data) >= self.min_products:
+                    if len(self.scraped_data) + len(pending) >= self.min_products:
                         break
-                    try:
-                        detail_data = self.extract_detail_page(product_data["url"], product_data["title"])
-                        product_data["description"] = detail_data["description"]
-                        product_data["videos"] = detail_data["videos"]
-                        product_data["specifications"].update(detail_data["specifications"])
-                        product_data["origin"] = detail_data["origin"]
-                        if detail_data["images"]:
-                            product_data["images"] = list(set((product_data["images"] or []) + detail_data["images"]))[:5]
-                            if not product_data["image_url"] and product_data["images"]:
-                                product_data["image_url"] = product_data["images"][0]
-                        if product_data["title"] and product_data["url"]:
-                            self.scraped_data.append(product_data)
-                            logger.info(f"Scraped product on page {page}: {product_data['title']}")
-                        else:
-                            self.skipped_products.append({
-                                "page": page,
-                                "title": product_data.get("title", "Unknown"),
-                                "reason": "Missing title or URL after detail page"
-                            })
-                    except Exception as e:
-                        logger.error(f"Failed to extract detail page for {product_data['title']}: {e}")
-                        self.skipped_products.append({
-                            "page": page,
-                            "title": product_data["title"],
-                            "reason": f"Detail page error: {str(e)}"
-                        })
-                    self.driver.get(url)
+                    pager.saw(product_data["url"])
+                    if self.product_index.is_duplicate(product_data["url"]):
+                        continue
+                    detail = None
+                    if not self.seen.reuse(product_data, self.store):
+                        detail_html = self.fetch_detail_page(product_data["url"])
+                        detail = self.parse_pool.submit(self.parse_detail_page, detail_html, product_data["title"])
+                    pending.append((product_data, detail))
+                    self._collect_products(page, pending, wait=False)
+                    throttled_get(self.driver, url)
                     self.wait.until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-                    time.sleep(random.uniform(1, 2))
+                self._collect_products(page, pending, wait=True)
+                # Pages that failed their anti-bot checks or had no listing container skipped this
+                if pager.finish(page, processed=True):
+                    break
                 try:
-                    self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(1)
+                    scroll_to_load(self.driver, max_scrolls=1)
                     next_button = None
                     for selector in self.selectors["next_page"].split(", "):
                         try:
@@ -654,8 +797,8 @@ class AlibabaScraper:
                     if not next_button:
                         logger.info("Next page button not found or disabled, stopping pagination")
                         break
+                    limiter_for(self.base_url).acquire()
                     self.driver.execute_script("arguments[0].click();", next_button)
-                    time.sleep(random.uniform(3, 5))
                 except Exception as e:
                     logger.info(f"Error finding next page button: {e}")
                     break
@@ -664,6 +807,23 @@ class AlibabaScraper:
         except Exception as e:
             logger.error(f"Scraping error: {e}")
         finally:
+            pager.close()
+            self.parse_pool.close()
+            self.store.flush()
+            export_run(self.store)
+            self.seen.close()
+            self.cookie_jar.finish(self.driver)
+            run_report.finish()
             self.save_results()
             self.close()
-        return self.scraped_data
\ No newline at end of file
+        return self.scraped_data
+
+    def close(self):
+        """Quit the browser and keep its profile for the next run."""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except WebDriverException as e:
+                logger.error(f"Error quitting WebDriver: {e}")
+            self.driver = None
+        self.profile.release()
\ No newline at end of file
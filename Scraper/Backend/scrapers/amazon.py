@@ -1,9 +1,9 @@
 import re
-import time
 import json
 import sys
 import logging
 import webbrowser
+from collections import deque
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -12,6 +12,25 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
+from scraper_utils import js_extract
+from scraper_utils.canonical import ProductIndex
+from scraper_utils.cdp_driver import wrap_cdp
+from scraper_utils.cookie_jar import open_cookie_jar
+from scraper_utils.driver_supervisor import supervise
+from scraper_utils.export import export_run
+from scraper_utils.extraction import extract_with_retry
+from scraper_utils.fingerprint import manage_fingerprint
+from scraper_utils.paginate import SearchPager
+from scraper_utils.pipeline import open_parse_pool
+from scraper_utils.product_store import open_store
+from scraper_utils.profiles import open_profile
+from scraper_utils.proxy_pool import open_proxy_pool
+from scraper_utils.rate_limit import throttled_get
+from scraper_utils.readiness import set_page_load_strategy, wait_ready
+from scraper_utils.retry import PageRetry
+from scraper_utils.run_report import run_report
+from scraper_utils.seen_index import open_seen_index
+from scraper_utils.spill import open_products, save_products
 
 # Configure logging
 logging.basicConfig(filename="amazon_scraper.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -42,6 +61,11 @@ except ValueError:
 fields = sys.argv[4].split(',')
 # Always include 'url' and 'website_name' for context and deduplication
 desired_fields = ['url', 'website_name'] + [f.strip() for f in fields if f.strip() in SUPPORTED_FIELDS]
+# Fields that need the product page
+detail_fields = [f for f in [
+    'description', 'supplier', 'feedback', 'image_url', 'images', 'videos',
+    'specifications', 'discount_information', 'brand_name'
+] if f in desired_fields]
 # Validate fields
 invalid_fields = [f for f in fields if f.strip() not in SUPPORTED_FIELDS]
 if invalid_fields:
@@ -51,35 +75,34 @@ if invalid_fields:
 
 # Setup output file
 output_file = f"products_{search_keyword.replace(' ', '_')}_amazon.json"
+browser_profile = open_profile("amazon")
+proxy_pool = open_proxy_pool("amazon")
 
-def initialize_driver():
-    """Configure and return a Selenium WebDriver instance"""
+def initialize_driver(sticky_proxy=None):
+    """Configure and return a Selenium WebDriver instance, reusing `sticky_proxy` if it is still healthy"""
     options = webdriver.ChromeOptions()
     options.add_argument("--headless=new")
     options.add_argument("--ignore-certificate-errors")
     options.add_argument("--log-level=3")
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36")
+    browser_profile.apply_chrome(options)
+    set_page_load_strategy(options, "amazon")
+    proxy = proxy_pool.configure_chrome(options, sticky_proxy)
     try:
         driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        return driver
+        return proxy_pool.bind(browser_profile.attach(wrap_cdp(driver, "amazon")), proxy)
     except Exception as e:
-        print(f"Error initializing Chrome browser: {e}")
         logging.error(f"Error initializing Chrome browser: {e}")
-        sys.exit(1)
+        raise
 
 def retry_extraction(func, attempts=3, delay=1, default=""):
     """Retries an extraction function up to 'attempts' times."""
-    for i in range(attempts):
-        try:
-            result = func()
-            if result:
-                return result
-        except Exception as e:
-            logging.warning(f"Retry {i+1}/{attempts} failed: {e}")
-            if i < attempts - 1:
-                time.sleep(delay)
-    return default
+    return extract_with_retry(func, attempts, delay, default)
+
+def full_size_image(url):
+    """Strip Amazon's size modifier (e.g. "._SS40_") from an image URL to get the full-size image."""
+    return re.sub(r'\._[^/]+?_\.(\w+)$', r'.\1', url)
 
 def clean_text(text):
     """Clean text by removing extra whitespace, newlines, control characters, and special Unicode characters."""
@@ -98,21 +121,237 @@ def filter_product_data(product_data):
             filtered_data[field] = product_data[field]
     return filtered_data
 
+def parse_product_page(html, title, exact_price):
+    """Extract the product page fields that need only its HTML; runs in a parse worker while the browser reads the gallery."""
+    product_page_html = BeautifulSoup(html, "html.parser")
+    parsed = {"title": title or "", "exact_price": exact_price, "feedback": {}}
+
+    # Extract description
+    if 'description' in desired_fields:
+        try:
+            description_elements = retry_extraction(
+                lambda: product_page_html.find("div", {"id": "feature-bullets"}).find_all("li", {"class": "a-spacing-mini"}),
+                default=[]
+            )
+            if description_elements:
+                description = " ".join([clean_text(elem.get_text(strip=True)) for elem in description_elements])
+                parsed["description"] = description
+                print(f"Description: {description[:100]}...")
+                logging.info(f"Description: {description[:100]}...")
+            else:
+                container = retry_extraction(
+                    lambda: product_page_html.find("ul", {"class": "a-unordered-list a-vertical a-spacing-small"})
+                )
+                if container:
+                    description = " ".join([clean_text(li.get_text(strip=True)) for li in container.find_all("li")])
+                    parsed["description"] = description
+                    print(f"Description (fallback): {description[:100]}...")
+                    logging.info(f"Description (fallback): {description[:100]}...")
+        except Exception as e:
+            print(f"Error extracting description: {e}")
+            logging.warning(f"Error extracting description: {e}")
+
+    # Extract discount information
+    if 'discount_information' in desired_fields:
+        try:
+            discount_elem = retry_extraction(
+                lambda: product_page_html.select_one("span.savingsPercentage")
+            )
+            if discount_elem:
+                parsed["discount_information"] = clean_text(discount_elem.get_text(strip=True))
+                print(f"Discount: {parsed['discount_information']}")
+                logging.info(f"Discount: {parsed['discount_information']}")
+            else:
+                mrp_element = retry_extraction(
+                    lambda: product_page_html.select_one("span.a-price.a-text-price span.a-offscreen")
+                )
+                if mrp_element and parsed["exact_price"]:
+                    mrp_text = clean_text(mrp_element.get_text(strip=True))
+                    mrp_value = re.sub(r'[^\d.]', '', mrp_text)
+                    current_price = re.sub(r'[^\d.]', '', parsed["exact_price"])
+                    if mrp_value and current_price:
+                        mrp_value = float(mrp_value)
+                        current_price = float(current_price)
+                        if mrp_value > current_price:
+                            discount_percentage = ((mrp_value - current_price) / mrp_value) * 100
+                            parsed["discount_information"] = f"{discount_percentage:.2f}% off"
+                            print(f"Calculated discount: {parsed['discount_information']}")
+                            logging.info(f"Calculated discount: {parsed['discount_information']}")
+        except Exception as e:
+            print(f"Error extracting discount: {e}")
+            logging.warning(f"Error extracting discount: {e}")
+
+    # Extract specifications
+    if 'specifications' in desired_fields:
+        try:
+            product_details = {}
+            detail_lists = product_page_html.select("ul.detail-bullet-list > li")
+            for li in detail_lists:
+                label_tag = li.select_one("span.a-text-bold")
+                value_tag = label_tag.find_next_sibling("span") if label_tag else None
+                if label_tag and value_tag:
+                    label = clean_text(label_tag.get_text(strip=True).replace(":", ""))
+                    value = clean_text(value_tag.get_text(" ", strip=True))
+                    if label and value:
+                        product_details[label] = value
+            if not product_details:
+                details_table = product_page_html.select_one("table#productDetails_detailBullets_sections1")
+                if details_table:
+                    for row in details_table.find_all("tr"):
+                        label = row.find("th", {"class": "a-color-secondary a-size-base prodDetSectionEntry"})
+                        value = row.find("td", {"class": "a-size-base prodDetAttrValue"})
+                        if label and value:
+                            label_text = clean_text(label.get_text(strip=True).replace(":", ""))
+                            value_text = clean_text(value.get_text(" ", strip=True))
+                            if label_text and value_text:
+                                product_details[label_text] = value_text
+            tech_specs_table = product_page_html.find("table", {"class": "aplus-tech-spec-table"})
+            if tech_specs_table:
+                for row in tech_specs_table.find_all("tr"):
+                    cells = row.find_all("td")
+                    if len(cells) == 2:
+                        key = clean_text(cells[0].get_text(strip=True))
+                        value = clean_text(cells[1].get_text(strip=True))
+                        if key and value:
+                            product_details[key] = value
+            parsed["specifications"] = product_details
+            print(f"Specifications: {product_details}")
+            logging.info(f"Specifications: {product_details}")
+        except Exception as e:
+            print(f"Error extracting specifications: {e}")
+            logging.warning(f"Error extracting specifications: {e}")
+
+    # Extract product reviews
+    if 'feedback' in desired_fields:
+        try:
+            product_review_element = retry_extraction(
+                lambda: product_page_html.find("span", {"id": "acrCustomerReviewText"})
+            )
+            if product_review_element:
+                product_review_text = clean_text(product_review_element.get_text(strip=True))
+                numeric_match = re.search(r"(\d+)", product_review_text)
+                if numeric_match:
+                    parsed["feedback"]["review"] = numeric_match.group(1)
+                    print(f"Reviews: {parsed['feedback']['review']}")
+                    logging.info(f"Reviews: {parsed['feedback']['review']}")
+        except Exception as e:
+            print(f"Error extracting product reviews: {e}")
+            logging.warning(f"Error extracting product reviews: {e}")
+
+    # Extract product rating
+    if 'feedback' in desired_fields:
+        try:
+            product_rating_element = retry_extraction(
+                lambda: product_page_html.find(
+                    lambda tag: tag.name == "span" and tag.get("id") == "acrPopover" and "reviewCountTextLinkedHistogram" in tag.get("class", []) and tag.has_attr("title")
+                )
+            )
+            if product_rating_element:
+                rating_span = product_rating_element.find("span", {"class": "a-size-base a-color-base"})
+                if rating_span:
+                    parsed["feedback"]["rating"] = clean_text(rating_span.get_text(strip=True))
+                    print(f"Rating: {parsed['feedback']['rating']}")
+                    logging.info(f"Rating: {parsed['feedback']['rating']}")
+        except Exception as e:
+            print(f"Error extracting product rating: {e}")
+            logging.warning(f"Error extracting product rating: {e}")
+
+    # Extract product supplier
+    if 'supplier' in desired_fields:
+        try:
+            product_supplier_element = product_page_html.find("a", {"id": "sellerProfileTriggerId"})
+            if not product_supplier_element:
+                product_supplier_element = product_page_html.find("span", {"class": "tabular-buybox-text"})
+            if product_supplier_element:
+                parsed["supplier"] = clean_text(product_supplier_element.get_text(strip=True))
+                print(f"Supplier: {parsed['supplier']}")
+                logging.info(f"Supplier: {parsed['supplier']}")
+        except Exception as e:
+            print(f"Error extracting product supplier: {e}")
+            logging.warning(f"Error extracting product supplier: {e}")
+
+    # Extract brand name
+    if 'brand_name' in desired_fields:
+        try:
+            brand_elem = product_page_html.find("a", {"id": "bylineInfo"})
+            if brand_elem:
+                parsed["brand_name"] = clean_text(brand_elem.get_text(strip=True))
+                print(f"Brand: {parsed['brand_name']}")
+                logging.info(f"Brand: {parsed['brand_name']}")
+            else:
+                title = parsed.get("title", "").lower()
+                if "louis vuitton" in title:
+                    parsed["brand_name"] = "Louis Vuitton"
+                    print("Brand from title: Louis Vuitton")
+                    logging.info("Brand from title: Louis Vuitton")
+        except Exception as e:
+            print(f"Error extracting brand name: {e}")
+            logging.warning(f"Error extracting brand name: {e}")
+
+    del parsed["title"], parsed["exact_price"]
+    return parsed
+
+def collect_products(pending, scraped_products, store, seen, wait):
+    """Merge parsed product pages into their products and save them in order; unless `wait`, stop at the first unparsed one."""
+    while pending and (wait or pending[0][1] is None or pending[0][1].done()):
+        product_json_data, parsed_page, index = pending.popleft()
+        fetched = parsed_page is not None
+        if parsed_page is not None:
+            try:
+                parsed = parsed_page.result()
+                product_json_data["feedback"].update(parsed.pop("feedback"))
+                product_json_data.update(parsed)
+            except Exception as e:
+                fetched = False
+                print(f"Error processing product page {product_json_data['url']}: {e}")
+                logging.error(f"Error processing product page {product_json_data['url']}: {e}")
+
+        # Filter and save product
+        filtered_product = filter_product_data(product_json_data)
+        scraped_products[product_json_data["url"]] = filtered_product
+        store.add(filtered_product)
+        seen.record(product_json_data, fetched)
+        print(f"✅ Product {index} scraped successfully")
+
 def scrape_amazon_products():
     """Main scraping function"""
-    browser = initialize_driver()
-    scraped_products = {}
+    # Opened before the browser so parse workers fork from a small process
+    parse_pool = open_parse_pool("amazon")
+    try:
+        browser = supervise(initialize_driver, "amazon")
+    except Exception as e:
+        print(f"Error initializing Chrome browser: {e}")
+        sys.exit(1)
+    cookie_jar = open_cookie_jar("amazon", "https://www.amazon.in")
+    cookie_jar.preload(browser)
+    manage_fingerprint(browser, "amazon")
+    scraped_products = open_products("amazon")
+    store = open_store("amazon", search_keyword)
+    seen = open_seen_index("amazon")
+    product_index = ProductIndex("amazon")
+    page_retry = PageRetry("amazon", retries)
+    pager = SearchPager(
+        browser, "amazon", lambda page: f"https://www.amazon.in/s?k={search_keyword.replace(' ', '+')}&page={page}",
+        search_page, product_index
+    )
+    use_js_extract = js_extract.enabled("amazon")
+    # Products whose page is still being parsed, saved in order once their parse finishes
+    pending = deque()
     try:
         for page in range(1, search_page + 1):
+            if not page_retry.allow():
+                print(f"Amazon is blocking requests, skipping pages {page}-{search_page}")
+                logging.warning(f"Amazon is blocking requests, skipping pages {page}-{search_page}")
+                break
+            # Only a parsed page can tell that the results have run out
+            page_parsed = False
             for attempt in range(retries):
                 try:
-                    search_url = f"https://www.amazon.in/s?k={search_keyword.replace(' ', '+')}&page={page}"
+                    search_url = pager.url_for(page)
                     print(f"Scraping page {page}, attempt {attempt + 1}/{retries}: {search_url}")
                     logging.info(f"Scraping page {page}, attempt {attempt + 1}/{retries}: {search_url}")
-                    browser.get(search_url)
-                    WebDriverWait(browser, 10).until(
-                        lambda d: d.execute_script("return document.readyState") == "complete"
-                    )
+                    pager.load(page)
+                    wait_ready(browser, "amazon", "search", timeout=10)
 
                     # Select product cards container
                     try:
@@ -127,6 +366,7 @@ def scrape_amazon_products():
                     if not product_cards:
                         print(f"No product cards found on page {page}")
                         logging.warning(f"No product cards found on page {page}")
+                        page_parsed = True
                         break
 
                     print(f"Found {len(product_cards)} products on page {page}")
@@ -166,9 +406,9 @@ def scrape_amazon_products():
                                 continue
 
                         # Avoid duplicates
-                        if product_json_data["url"] in scraped_products:
+                        pager.saw(product_json_data["url"])
+                        if product_index.is_duplicate(product_json_data["url"]):
                             print(f"Skipping duplicate product: {product_json_data['url']}")
-                            logging.info(f"Skipping duplicate product: {product_json_data['url']}")
                             continue
 
                         # Extract product title
@@ -214,180 +454,43 @@ def scrape_amazon_products():
                                 logging.warning(f"Error extracting product price: {e}")
 
                         # Open product page for additional details
-                        if product_json_data["url"] and any(field in desired_fields for field in [
-                            'description', 'supplier', 'feedback', 'image_url', 'images', 'videos',
-                            'specifications', 'discount_information', 'brand_name'
-                        ]):
+                        parsed_page = None
+                        if product_json_data["url"] and detail_fields and not seen.reuse(
+                            product_json_data, store, detail_fields
+                        ):
                             try:
-                                browser.get(product_json_data["url"])
-                                WebDriverWait(browser, 10).until(
-                                    lambda d: d.execute_script("return document.readyState") == "complete"
-                                )
-                                product_page_html = BeautifulSoup(browser.page_source, "html.parser")
-
-                                # Extract description
-                                if 'description' in desired_fields:
-                                    try:
-                                        description_elements = retry_extraction(
-                                            lambda: product_page_html.find("div", {"id": "feature-bullets"}).find_all("li", {"class": "a-spacing-mini"}),
-                                            default=[]
-                                        )
-                                        if description_elements:
-                                            description = " ".join([clean_text(elem.get_text(strip=True)) for elem in description_elements])
-                                            product_json_data["description"] = description
-                                            print(f"Description: {description[:100]}...")
-                                            logging.info(f"Description: {description[:100]}...")
-                                        else:
-                                            container = retry_extraction(
-                                                lambda: product_page_html.find("ul", {"class": "a-unordered-list a-vertical a-spacing-small"})
-                                            )
-                                            if container:
-                                                description = " ".join([clean_text(li.get_text(strip=True)) for li in container.find_all("li")])
-                                                product_json_data["description"] = description
-                                                print(f"Description (fallback): {description[:100]}...")
-                                                logging.info(f"Description (fallback): {description[:100]}...")
-                                    except Exception as e:
-                                        print(f"Error extracting description: {e}")
-                                        logging.warning(f"Error extracting description: {e}")
-
-                                # Extract discount information
-                                if 'discount_information' in desired_fields:
-                                    try:
-                                        discount_elem = retry_extraction(
-                                            lambda: product_page_html.select_one("span.savingsPercentage")
-                                        )
-                                        if discount_elem:
-                                            product_json_data["discount_information"] = clean_text(discount_elem.get_text(strip=True))
-                                            print(f"Discount: {product_json_data['discount_information']}")
-                                            logging.info(f"Discount: {product_json_data['discount_information']}")
-                                        else:
-                                            mrp_element = retry_extraction(
-                                                lambda: product_page_html.select_one("span.a-price.a-text-price span.a-offscreen")
-                                            )
-                                            if mrp_element and product_json_data["exact_price"]:
-                                                mrp_text = clean_text(mrp_element.get_text(strip=True))
-                                                mrp_value = re.sub(r'[^\d.]', '', mrp_text)
-                                                current_price = re.sub(r'[^\d.]', '', product_json_data["exact_price"])
-                                                if mrp_value and current_price:
-                                                    mrp_value = float(mrp_value)
-                                                    current_price = float(current_price)
-                                                    if mrp_value > current_price:
-                                                        discount_percentage = ((mrp_value - current_price) / mrp_value) * 100
-                                                        product_json_data["discount_information"] = f"{discount_percentage:.2f}% off"
-                                                        print(f"Calculated discount: {product_json_data['discount_information']}")
-                                                        logging.info(f"Calculated discount: {product_json_data['discount_information']}")
-                                    except Exception as e:
-                                        print(f"Error extracting discount: {e}")
-                                        logging.warning(f"Error extracting discount: {e}")
-
-                                # Extract specifications
-                                if 'specifications' in desired_fields:
-                                    try:
-                                        product_details = {}
-                                        detail_lists = product_page_html.select("ul.detail-bullet-list > li")
-                                        for li in detail_lists:
-                                            label_tag = li.select_one("span.a-text-bold")
-                                            value_tag = label_tag.find_next_sibling("span") if label_tag else None
-                                            if label_tag and value_tag:
-                                                label = clean_text(label_tag.get_text(strip=True).replace(":", ""))
-                                                value = clean_text(value_tag.get_text(" ", strip=True))
-                                                if label and value:
-                                                    product_details[label] = value
-                                        if not product_details:
-                                            details_table = product_page_html.select_one("table#productDetails_detailBullets_sections1")
-                                            if details_table:
-                                                for row in details_table.find_all("tr"):
-                                                    label = row.find("th", {"class": "a-color-secondary a-size-base prodDetSectionEntry"})
-                                                    value = row.find("td", {"class": "a-size-base prodDetAttrValue"})
-                                                    if label and value:
-                                                        label_text = clean_text(label.get_text(strip=True).replace(":", ""))
-                                                        value_text = clean_text(value.get_text(" ", strip=True))
-                                                        if label_text and value_text:
-                                                            product_details[label_text] = value_text
-                                        tech_specs_table = product_page_html.find("table", {"class": "aplus-tech-spec-table"})
-                                        if tech_specs_table:
-                                            for row in tech_specs_table.find_all("tr"):
-                                                cells = row.find_all("td")
-                                                if len(cells) == 2:
-                                                    key = clean_text(cells[0].get_text(strip=True))
-                                                    value = clean_text(cells[1].get_text(strip=True))
-                                                    if key and value:
-                                                        product_details[key] = value
-                                        product_json_data["specifications"] = product_details
-                                        print(f"Specifications: {product_details}")
-                                        logging.info(f"Specifications: {product_details}")
-                                    except Exception as e:
-                                        print(f"Error extracting specifications: {e}")
-                                        logging.warning(f"Error extracting specifications: {e}")
-
-                                # Extract product reviews
-                                if 'feedback' in desired_fields:
-                                    try:
-                                        product_review_element = retry_extraction(
-                                            lambda: product_page_html.find("span", {"id": "acrCustomerReviewText"})
-                                        )
-                                        if product_review_element:
-                                            product_review_text = clean_text(product_review_element.get_text(strip=True))
-                                            numeric_match = re.search(r"(\d+)", product_review_text)
-                                            if numeric_match:
-                                                product_json_data["feedback"]["review"] = numeric_match.group(1)
-                                                print(f"Reviews: {product_json_data['feedback']['review']}")
-                                                logging.info(f"Reviews: {product_json_data['feedback']['review']}")
-                                    except Exception as e:
-                                        print(f"Error extracting product reviews: {e}")
-                                        logging.warning(f"Error extracting product reviews: {e}")
-
-                                # Extract product rating
-                                if 'feedback' in desired_fields:
-                                    try:
-                                        product_rating_element = retry_extraction(
-                                            lambda: product_page_html.find(
-                                                lambda tag: tag.name == "span" and tag.get("id") == "acrPopover" and "reviewCountTextLinkedHistogram" in tag.get("class", []) and tag.has_attr("title")
-                                            )
-                                        )
-                                        if product_rating_element:
-                                            rating_span = product_rating_element.find("span", {"class": "a-size-base a-color-base"})
-                                            if rating_span:
-                                                product_json_data["feedback"]["rating"] = clean_text(rating_span.get_text(strip=True))
-                                                print(f"Rating: {product_json_data['feedback']['rating']}")
-                                                logging.info(f"Rating: {product_json_data['feedback']['rating']}")
-                                    except Exception as e:
-                                        print(f"Error extracting product rating: {e}")
-                                        logging.warning(f"Error extracting product rating: {e}")
-
-                                # Extract product supplier
-                                if 'supplier' in desired_fields:
-                                    try:
-                                        product_supplier_element = product_page_html.find("a", {"id": "sellerProfileTriggerId"})
-                                        if not product_supplier_element:
-                                            product_supplier_element = product_page_html.find("span", {"class": "tabular-buybox-text"})
-                                        if product_supplier_element:
-                                            product_json_data["supplier"] = clean_text(product_supplier_element.get_text(strip=True))
-                                            print(f"Supplier: {product_json_data['supplier']}")
-                                            logging.info(f"Supplier: {product_json_data['supplier']}")
-                                    except Exception as e:
-                                        print(f"Error extracting product supplier: {e}")
-                                        logging.warning(f"Error extracting product supplier: {e}")
+                                throttled_get(browser, product_json_data["url"])
+                                wait_ready(browser, "amazon", "product", timeout=10)
+                                # The HTML-only fields are parsed in the parse pool while the browser reads the
+                                # image gallery and goes on to the next product page
+                                parsed_page = parse_pool.submit(parse_product_page, browser.page_source,
+                                                                product_json_data.get("title"), product_json_data["exact_price"])
 
                                 # Extract product images
                                 if 'image_url' in desired_fields or 'images' in desired_fields:
                                     try:
-                                        altImages = WebDriverWait(browser, 5).until(
-                                            EC.presence_of_element_located((By.ID, "altImages"))
-                                        )
-                                        imgButtons = altImages.find_elements(By.CSS_SELECTOR, "li.imageThumbnail")
-                                        image_urls = set()
-                                        for imgButton in imgButtons:
-                                            WebDriverWait(browser, 2).until(EC.element_to_be_clickable(imgButton))
-                                            imgButton.click()
-                                            product_image_wrapper = WebDriverWait(browser, 2).until(
-                                                EC.presence_of_element_located((By.CSS_SELECTOR, "ul.a-unordered-list.a-nostyle.a-horizontal.list.maintain-height"))
+                                        if use_js_extract:
+                                            # Read every thumbnail in one call instead of clicking through them
+                                            gallery = js_extract.extract_page(browser, js_extract.SPECS["amazon"])["fields"]
+                                            thumbnails = gallery.get("images") or [gallery.get("main_image")]
+                                            image_urls = dict.fromkeys(full_size_image(src) for src in thumbnails if src)
+                                        else:
+                                            altImages = WebDriverWait(browser, 5).until(
+                                                EC.presence_of_element_located((By.ID, "altImages"))
                                             )
-                                            product_image_list = product_image_wrapper.find_element(By.CSS_SELECTOR, "li.selected")
-                                            product_image = product_image_list.find_element(By.CSS_SELECTOR, "img.a-dynamic-image")
-                                            image_url = product_image.get_attribute('src')
-                                            if image_url:
-                                                image_urls.add(image_url)
+                                            imgButtons = altImages.find_elements(By.CSS_SELECTOR, "li.imageThumbnail")
+                                            image_urls = set()
+                                            for imgButton in imgButtons:
+                                                WebDriverWait(browser, 2).until(EC.element_to_be_clickable(imgButton))
+                                                imgButton.click()
+                                                product_image_wrapper = WebDriverWait(browser, 2).until(
+                                                    EC.presence_of_element_located((By.CSS_SELECTOR, "ul.a-unordered-list.a-nostyle.a-horizontal.list.maintain-height"))
+                                                )
+                                                product_image_list = product_image_wrapper.find_element(By.CSS_SELECTOR, "li.selected")
+                                                product_image = product_image_list.find_element(By.CSS_SELECTOR, "img.a-dynamic-image")
+                                                image_url = product_image.get_attribute('src')
+                                                if image_url:
+                                                    image_urls.add(image_url)
                                         product_json_data["images"] = list(image_urls)
                                         if product_json_data["images"] and 'image_url' in desired_fields:
                                             product_json_data["image_url"] = product_json_data["images"][0]
@@ -399,42 +502,33 @@ def scrape_amazon_products():
                                         print(f"Error extracting product images: {e}")
                                         logging.warning(f"Error extracting product images: {e}")
 
-                                # Extract brand name
-                                if 'brand_name' in desired_fields:
-                                    try:
-                                        brand_elem = product_page_html.find("a", {"id": "bylineInfo"})
-                                        if brand_elem:
-                                            product_json_data["brand_name"] = clean_text(brand_elem.get_text(strip=True))
-                                            print(f"Brand: {product_json_data['brand_name']}")
-                                            logging.info(f"Brand: {product_json_data['brand_name']}")
-                                        else:
-                                            title = product_json_data.get("title", "").lower()
-                                            if "louis vuitton" in title:
-                                                product_json_data["brand_name"] = "Louis Vuitton"
-                                                print("Brand from title: Louis Vuitton")
-                                                logging.info("Brand from title: Louis Vuitton")
-                                    except Exception as e:
-                                        print(f"Error extracting brand name: {e}")
-                                        logging.warning(f"Error extracting brand name: {e}")
-
                             except Exception as e:
                                 print(f"Error processing product page {product_json_data['url']}: {e}")
                                 logging.error(f"Error processing product page {product_json_data['url']}: {e}")
 
-                        # Filter and save product
-                        filtered_product = filter_product_data(product_json_data)
-                        scraped_products[product_json_data["url"]] = filtered_product
-                        print(f"✅ Product {index} scraped successfully")
+                        # Claimed now so a repeat of the product is skipped before it is saved
+                        product_index.add(product_json_data["url"])
+                        pending.append((product_json_data, parsed_page, index))
+                        collect_products(pending, scraped_products, store, seen, wait=False)
+
+                    collect_products(pending, scraped_products, store, seen, wait=True)
 
                 except Exception as e:
+                    # Products claimed before the failure are still saved, since the retry skips them
+                    collect_products(pending, scraped_products, store, seen, wait=True)
                     print(f"Attempt {attempt + 1}/{retries}: Error scraping page {page}: {e}")
                     logging.error(f"Attempt {attempt + 1}/{retries}: Error scraping page {page}: {e}")
-                    time.sleep(5)
+                    if not page_retry.failed(attempt, e, browser):
+                        break
                 else:
+                    page_retry.succeeded()
+                    page_parsed = True
                     break
             else:
                 print(f"Failed to scrape page {page} after {retries} attempts")
                 logging.error(f"Failed to scrape page {page} after {retries} attempts")
+            if pager.finish(page, processed=page_parsed):
+                break
 
         # Save to JSON
         try:
@@ -444,8 +538,7 @@ def scrape_amazon_products():
                 print("No products scraped. JSON file will not be created.")
                 logging.warning("No products scraped. JSON file will not be created.")
                 return
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(list(scraped_products.values()), f, ensure_ascii=False, indent=4)
+            save_products(output_file, scraped_products)
             print(f"Scraping completed and saved to {output_file}")
             logging.info(f"Scraping completed and saved to {output_file}")
         except Exception as e:
@@ -453,11 +546,20 @@ def scrape_amazon_products():
             logging.error(f"Error saving JSON file: {e}")
 
     finally:
+        pager.close()
+        parse_pool.close()
+        export_run(store)
+        store.close()
+        seen.close()
+        scraped_products.close()
+        cookie_jar.finish(browser)
         try:
             browser.quit()
         except Exception as e:
             print(f"Error closing browser: {e}")
             logging.error(f"Error closing browser: {e}")
+        browser_profile.release()
+        print(f"Run report: {json.dumps(run_report.finish())}")
 
 if __name__ == "__main__":
     try:
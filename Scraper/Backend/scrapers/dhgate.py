@@ -1,11 +1,7 @@
 import sys
 import json
-import os
-import pickle
 import logging
-import time
 import re
-import random
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -15,6 +11,26 @@ from bs4 import BeautifulSoup
 from webdriver_manager.firefox import GeckoDriverManager
 from webdriver_manager.chrome import ChromeDriverManager
 from urllib.parse import quote
+from scraper_utils.browser_park import attach, close_parked, make_parkable, park, parking_enabled, release
+from scraper_utils.canonical import ProductIndex
+from scraper_utils.cdp_driver import wrap_cdp
+from scraper_utils.cookie_jar import open_cookie_jar
+from scraper_utils.driver_supervisor import supervise
+from scraper_utils.export import export_run
+from scraper_utils.extraction import extract_with_retry
+from scraper_utils.fingerprint import manage_fingerprint
+from scraper_utils.product_store import open_store
+from scraper_utils.profiles import open_profile
+from scraper_utils.proxy_pool import open_proxy_pool
+from scraper_utils.rate_limit import throttled_get
+from scraper_utils.readiness import set_page_load_strategy
+from scraper_utils.retry import CAPTCHA, PageRetry
+from scraper_utils.run_report import run_report
+from scraper_utils.scroll import scroll_to_load
+from scraper_utils.seen_index import open_seen_index
+from scraper_utils.session_store import CaptchaRequired, delete_session, load_session, new_session_id, save_session
+from scraper_utils.snapshot import PageSnapshot
+from scraper_utils.spill import open_products, print_result, save_products
 
 # Setup logging to file and console
 logging.basicConfig(
@@ -81,11 +97,14 @@ else:
     output_file = f"products_{keyword.replace(' ', '_')}_dhgate.json"
     logger.info(f"Output file will be saved as: {output_file}")
 
-def setup_driver():
-    """Configure and return a Selenium WebDriver instance."""
+browser_profile = open_profile("dhgate")
+proxy_pool = open_proxy_pool("dhgate")
+
+def setup_driver(sticky_proxy=None):
+    """Configure and return a Selenium WebDriver instance, reusing `sticky_proxy` if it is still healthy."""
     logger.info("Initializing Selenium WebDriver")
     
-    # Try Firefox first
+    # Try Firefox first, unless the browser may need to be parked, which only Chrome supports
     firefox_options = webdriver.FirefoxOptions()
     firefox_options.add_argument("--headless")
     firefox_options.add_argument("--ignore-certificate-errors")
@@ -94,18 +113,22 @@ def setup_driver():
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
         "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     )
+    browser_profile.apply_firefox(firefox_options)
+    set_page_load_strategy(firefox_options, "dhgate")
+    firefox_proxy = proxy_pool.configure_firefox(firefox_options, sticky_proxy)
     
-    try:
-        driver = webdriver.Firefox(
-            service=webdriver.firefox.service.Service(GeckoDriverManager().install()),
-            options=firefox_options
-        )
-        driver.set_page_load_timeout(30)
-        driver.maximize_window()
-        logger.info("Firefox WebDriver initialized successfully")
-        return driver
-    except WebDriverException as e:
-        logger.warning(f"Firefox WebDriver initialization failed: {str(e)}. Falling back to Chrome")
+    if not parking_enabled():
+        try:
+            driver = webdriver.Firefox(
+                service=webdriver.firefox.service.Service(GeckoDriverManager().install()),
+                options=firefox_options
+            )
+            driver.set_page_load_timeout(30)
+            driver.maximize_window()
+            logger.info("Firefox WebDriver initialized successfully")
+            return proxy_pool.bind(browser_profile.attach(driver), firefox_proxy)
+        except WebDriverException as e:
+            logger.warning(f"Firefox WebDriver initialization failed: {str(e)}. Falling back to Chrome")
     
     # Fallback to Chrome
     chrome_options = webdriver.ChromeOptions()
@@ -117,6 +140,10 @@ def setup_driver():
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
         "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     )
+    make_parkable(chrome_options)
+    browser_profile.apply_chrome(chrome_options)
+    set_page_load_strategy(chrome_options, "dhgate")
+    chrome_proxy = proxy_pool.configure_chrome(chrome_options, sticky_proxy)
     
     try:
         driver = webdriver.Chrome(
@@ -126,7 +153,7 @@ def setup_driver():
         driver.set_page_load_timeout(30)
         driver.maximize_window()
         logger.info("Chrome WebDriver initialized successfully")
-        return driver
+        return proxy_pool.bind(browser_profile.attach(wrap_cdp(driver, "dhgate")), chrome_proxy)
     except WebDriverException as e:
         # Try specifying Chrome binary as a last resort
         try:
@@ -138,46 +165,19 @@ def setup_driver():
             driver.set_page_load_timeout(30)
             driver.maximize_window()
             logger.info("Chrome WebDriver initialized with specified binary")
-            return driver
+            return proxy_pool.bind(browser_profile.attach(wrap_cdp(driver, "dhgate")), chrome_proxy)
         except WebDriverException as e2:
-            error_msg = f"Error initializing browser (Firefox and Chrome failed): {str(e2)}"
-            logger.error(error_msg)
-            print(json.dumps({"status": "error", "message": error_msg}))
-            sys.exit(1)
-
-def save_session(session_id, url, cookies):
-    """Save browser session for CAPTCHA handling."""
-    session_data = {'url': url, 'cookies': cookies}
-    session_file = f"session_{session_id}.pkl"
-    try:
-        with open(session_file, 'wb') as f:
-            pickle.dump(session_data, f)
-        logger.info(f"Saved session to {session_file}")
-    except Exception as e:
-        logger.error(f"Error saving session: {e}")
-
-def load_session(session_id):
-    """Load browser session."""
-    session_file = f"session_{session_id}.pkl"
-    if os.path.exists(session_file):
-        try:
-            with open(session_file, 'rb') as f:
-                return pickle.load(f)
-        except Exception as e:
-            logger.error(f"Error loading session: {e}")
-            return None
-    logger.warning(f"Session file {session_file} not found")
-    return None
+            logger.error(f"Error initializing browser (Firefox and Chrome failed): {str(e2)}")
+            raise
 
-def detect_captcha(page_source, browser):
-    """Detect CAPTCHA presence."""
+def detect_captcha(page):
+    """Detect CAPTCHA presence in a PageSnapshot."""
     try:
-        page_source_lower = page_source.lower()
         captcha_indicators = ['h-captcha', 'recaptcha', 'verify you are not a robot', 'please verify', 'captcha']
-        if any(indicator in page_source_lower for indicator in captcha_indicators):
+        if any(indicator in page.lower for indicator in captcha_indicators):
             logger.warning("CAPTCHA detected in page source")
             return True
-        soup = BeautifulSoup(page_source, 'html.parser')
+        soup = page.soup
         captcha_div = (
             soup.find('div', class_='captcha-container') or
             soup.find('div', id='captcha') or
@@ -187,7 +187,7 @@ def detect_captcha(page_source, browser):
         if captcha_div:
             logger.warning("CAPTCHA element found in HTML")
             return True
-        if 'captcha' in browser.current_url.lower():
+        if 'captcha' in page.url.lower():
             logger.warning("CAPTCHA detected in URL")
             return True
         return False
@@ -195,11 +195,10 @@ def detect_captcha(page_source, browser):
         logger.error(f"Error detecting CAPTCHA: {e}")
         return False
 
-def get_captcha_details(browser):
-    """Extract CAPTCHA details."""
+def get_captcha_details(page):
+    """Extract CAPTCHA details from a PageSnapshot."""
     try:
-        page_source = browser.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
+        soup = page.soup
         captcha_img = (
             soup.find('img', class_='captcha-image') or
             soup.find('img', id='captcha') or
@@ -209,48 +208,73 @@ def get_captcha_details(browser):
         captcha_type = 'image' if captcha_url else 'interactive'
         return {
             'type': captcha_type,
-            'url': captcha_url or browser.current_url,
+            'url': captcha_url or page.url,
             'html': None
         }
     except Exception as e:
         logger.error(f"Error extracting CAPTCHA details: {e}")
-        return {'type': 'unknown', 'url': browser.current_url, 'html': None}
+        return {'type': 'unknown', 'url': page.url, 'html': None}
 
 def validate_captcha(captcha_input, session_id):
-    """Validate CAPTCHA input."""
-    browser = setup_driver()
+    """Validate CAPTCHA input and resume the interrupted job."""
+    global desired_fields, output_file
+    session_data = load_session(session_id)
+    if not session_data:
+        result = {"valid": False, "message": f"Session {session_id} not found or expired"}
+        logger.error(result["message"])
+        print(json.dumps(result))
+        return
+    parked = session_data.get('parked')
+    browser = attach(parked, webdriver.chrome.service.Service(ChromeDriverManager().install())) if parked else None
+    reattached = browser is not None
+    if reattached:
+        # The parked browser still runs on the interrupted run's profile; this run saves that one when it ends
+        browser_profile.adopt(parked.get('profile_dir'))
+    elif parked:
+        browser_profile.discard(parked.get('profile_dir'))
+    browser = browser or setup_driver((session_data.get('job') or {}).get('proxy'))
     try:
-        session_data = load_session(session_id)
-        if not session_data:
-            result = {"valid": False, "message": f"Session {session_id} not found"}
-            logger.error(result["message"])
-            print(json.dumps(result))
-            return
-        
-        browser.get(session_data['url'])
-        for cookie in session_data['cookies']:
-            browser.add_cookie(cookie)
+        if not reattached:
+            throttled_get(browser, session_data['url'])
+            for cookie in session_data['cookies']:
+                browser.add_cookie(cookie)
         
         # Mock CAPTCHA validation (DHgate-specific CAPTCHA handling would go here)
         if captcha_input == "mock123":
-            save_session(session_id, browser.current_url, browser.get_cookies())
-            result = {"valid": True, "message": "CAPTCHA validated successfully"}
-            logger.info(result["message"])
-            print(json.dumps(result))
+            logger.info("CAPTCHA validated successfully")
+            job = session_data.get('job')
+            if not job:
+                result = {"valid": True, "message": "CAPTCHA validated successfully"}
+                print(json.dumps(result))
+                return
+            desired_fields = job['fields']
+            output_file = job['output_file']
+            # scrape_dhgate takes over the browser and quits it when done
+            resumed_browser, browser = browser, None
+            scrape_dhgate(job['keyword'], job['page_count'], job['retries'], desired_fields,
+                          resume=session_data, browser=resumed_browser)
         else:
             result = {"valid": False, "message": "Invalid CAPTCHA input"}
             logger.error(result["message"])
             print(json.dumps(result))
+            if reattached:
+                # Leave the browser parked on the CAPTCHA page for the next attempt
+                release(browser)
+                browser = None
     except Exception as e:
         result = {"valid": False, "message": f"Error validating CAPTCHA: {str(e)}"}
         logger.error(result["message"])
         print(json.dumps(result))
     finally:
-        try:
-            browser.quit()
-            logger.info("Browser closed successfully")
-        except Exception as e:
-            logger.error(f"Error quitting browser: {e}")
+        if browser:
+            try:
+                browser.quit()
+                logger.info("Browser closed successfully")
+            except Exception as e:
+                logger.error(f"Error quitting browser: {e}")
+            if reattached:
+                close_parked(parked)
+            browser_profile.release()
 
 def clean_text(text):
     """Clean text by removing extra whitespace."""
@@ -284,16 +308,7 @@ def parse_price(price_text):
 
 def retry_extraction(func, attempts=3, delay=2, default=None):
     """Retries an extraction function up to 'attempts' times."""
-    for i in range(attempts):
-        try:
-            result = func()
-            if result:
-                return result
-        except Exception as e:
-            logger.warning(f"Retry {i+1}/{attempts} failed: {str(e)}")
-            if i < attempts - 1:
-                time.sleep(delay)
-    return default
+    return extract_with_retry(func, attempts, delay, default)
 
 def filter_product_data(product_data):
     """Filter product data to include only desired fields."""
@@ -303,7 +318,7 @@ def filter_product_data(product_data):
             filtered_data[field] = product_data[field]
     return filtered_data
 
-def extract_product_data(card, browser, desired_fields):
+def extract_product_data(card, browser, desired_fields, seen=None, store=None, product_index=None):
     """Extract product data from a card element."""
     product = {
         "url": None,
@@ -351,6 +366,8 @@ def extract_product_data(card, browser, desired_fields):
         if not product['url']:
             logger.warning("No valid URL found for product")
             return None
+        if product_index and product_index.is_duplicate(product['url']):
+            return None
 
         # Price
         if 'currency' in desired_fields or 'exact_price' in desired_fields:
@@ -393,29 +410,22 @@ def extract_product_data(card, browser, desired_fields):
             logger.info(f"Discount: {product['discount_information']}")
 
         # Navigate to product page for detailed fields
-        if any(field in desired_fields for field in ['min_order', 'supplier', 'origin', 'feedback', 'specifications', 'images', 'videos', 'brand_name']):
+        needs_detail = any(field in desired_fields for field in ['min_order', 'supplier', 'origin', 'feedback', 'specifications', 'images', 'videos', 'brand_name'])
+        if needs_detail and not (seen and seen.reuse(product, store)):
             try:
                 logger.info(f"Navigating to product page: {product['url']}")
-                browser.get(product['url'])
+                throttled_get(browser, product['url'])
                 WebDriverWait(browser, 15).until(
                     EC.presence_of_element_located((By.CSS_SELECTOR, 'div.product-info, .product-detail, div.prodSpecifications_showLayer'))
                 )
                 
-                # Check for CAPTCHA
-                if detect_captcha(browser.page_source, browser):
-                    session_id = f"dhgate_{int(time.time())}"
-                    captcha_details = get_captcha_details(browser)
-                    save_session(session_id, browser.current_url, browser.get_cookies())
-                    result = {
-                        "status": "captcha_required",
-                        "captcha": captcha_details,
-                        "sessionId": session_id
-                    }
-                    logger.info(f"CAPTCHA detected on product page: {json.dumps(result)}")
-                    print(json.dumps(result))
-                    sys.exit(0)  # Exit to trigger CAPTCHA handling in Node.js
+                # Check for CAPTCHA; the same snapshot is parsed once for the extractors below
+                snapshot = PageSnapshot(browser)
+                if detect_captcha(snapshot):
+                    logger.info(f"CAPTCHA detected on product page: {product['url']}")
+                    raise CaptchaRequired(get_captcha_details(snapshot), product['url'])
                 
-                page_soup = BeautifulSoup(browser.page_source, 'html.parser')
+                page_soup = snapshot.soup
 
                 # Min Order
                 if 'min_order' in desired_fields:
@@ -620,46 +630,69 @@ def extract_product_data(card, browser, desired_fields):
                 logger.warning(f"Error loading product page {product['url']}: {e}")
 
         return product
+    except CaptchaRequired:
+        raise
     except Exception as e:
         logger.error(f"Error extracting product data: {e}")
         return product
 
-def scrape_dhgate(keyword, page_count, retries, desired_fields):
-    """Main scraping function."""
+def scrape_dhgate(keyword, page_count, retries, desired_fields, resume=None, browser=None):
+    """Main scraping function; `resume` is a saved CAPTCHA session to continue from."""
     logger.info("Starting DHgate scraping")
-    browser = setup_driver()
-    products = {}
+    cookie_jar = open_cookie_jar("dhgate", "https://www.dhgate.com")
+    if not browser:
+        browser = supervise(setup_driver, "dhgate")
+        cookie_jar.preload(browser)
+        manage_fingerprint(browser, "dhgate")
+    else:
+        # Replacements of a resumed browser stay on the proxy its CAPTCHA was solved through
+        sticky_proxy = (resume.get('job') or {}).get('proxy') if resume else None
+        browser = supervise(lambda proxy=None: setup_driver(proxy or sticky_proxy), "dhgate", browser)
+    products = open_products("dhgate")
     messages = []  # Collect messages for final output
-    session_id = f"dhgate_{int(time.time())}"
+    session_id = resume['session_id'] if resume else new_session_id("dhgate")
+    job = {"keyword": keyword, "page_count": page_count, "retries": retries,
+           "fields": desired_fields, "output_file": output_file, "proxy": proxy_pool.proxy_of(browser)}
+    start = (resume or {}).get('position') or {"page": 1, "card": 0}
+    position = dict(start)
+    parked = None
+    store = open_store("dhgate", keyword)
+    seen = open_seen_index("dhgate")
+    product_index = ProductIndex("dhgate")
+    page_retry = PageRetry("dhgate", retries)
+    if resume:
+        for product in resume['products']:
+            products.append(product)
+            product_index.add(product.get('url'))
+        logger.info(f"Resuming session {session_id} at page {start['page']}, card {start['card'] + 1} "
+                    f"with {len(products)} products")
     
     try:
-        for page in range(1, page_count + 1):
+        for page in range(start['page'], page_count + 1):
+            if not page_retry.allow():
+                message = f"DHgate is blocking requests, skipped pages {page}-{page_count}"
+                logger.warning(message)
+                messages.append(message)
+                break
             url = f"https://www.dhgate.com/wholesale/search.do?act=search&searchkey={quote(keyword)}&pageNo={page}"
             logger.info(f"Scraping page {page}: {url}")
+            first_card = start['card'] if page == start['page'] else 0
+            position = {"page": page, "card": first_card}
             for attempt in range(retries):
                 try:
-                    browser.get(url)
+                    throttled_get(browser, url)
                     WebDriverWait(browser, 15).until(
                         EC.presence_of_element_located((By.CSS_SELECTOR, '.gallery-pro, .item-box, .product-item'))
                     )
                     
                     # Check for CAPTCHA
-                    if detect_captcha(browser.page_source, browser):
-                        captcha_details = get_captcha_details(browser)
-                        save_session(session_id, browser.current_url, browser.get_cookies())
-                        result = {
-                            "status": "captcha_required",
-                            "captcha": captcha_details,
-                            "sessionId": session_id
-                        }
-                        messages.append("CAPTCHA detected")
-                        logger.info(f"CAPTCHA detected: {json.dumps(result)}")
-                        print(json.dumps(result))
-                        return result
+                    snapshot = PageSnapshot(browser)
+                    if detect_captcha(snapshot):
+                        page_retry.failed(attempt, browser=browser, kind=CAPTCHA)
+                        raise CaptchaRequired(get_captcha_details(snapshot), url)
                     
-                    # Scroll to load all products
-                    browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    time.sleep(2)  # Wait for lazy-loaded content
+                    # Scroll until lazy-loaded products stop appearing
+                    scroll_to_load(browser, '.gallery-pro, .item-box, .product-item, li.item')
 
                     # Try multiple product card selectors
                     product_cards_selectors = [
@@ -690,42 +723,48 @@ def scrape_dhgate(keyword, page_count, retries, desired_fields):
                     
                     logger.info(f"Found {len(product_cards)} products on page {page}")
                     for index, card in enumerate(product_cards):
-                        product = extract_product_data(card, browser, desired_fields)
+                        if index < first_card:
+                            continue
+                        position["card"] = index
+                        product = extract_product_data(card, browser, desired_fields, seen, store, product_index)
                         if product and product['url'] and product['url'] not in products:
                             filtered_product = filter_product_data(product)
                             products[product['url']] = filtered_product
+                            store.add(filtered_product)
+                            seen.record(product)
+                            product_index.add(product['url'])
                             logger.info(f"Product {index + 1} scraped successfully")
-                        
-                        # Random delay to mimic human behavior
-                        time.sleep(random.uniform(0.5, 1.5))
                     
+                    page_retry.succeeded()
                     break
                 except (TimeoutException, NoSuchElementException) as e:
                     logger.error(f"Attempt {attempt + 1}/{retries} failed for page {page}: {str(e)}")
-                    if attempt == retries - 1:
-                        message = f"Failed to scrape page {page} after {retries} attempts"
+                    if not page_retry.failed(attempt, e, browser):
+                        message = f"Failed to scrape page {page} after {attempt + 1} attempts"
                         logger.warning(message)
                         messages.append(message)
                         break
-                    time.sleep(5)
         
         # Save to JSON and return result
         try:
-            result = {
-                "status": "completed",
-                "products": list(products.values())
-            }
+            result = {"status": "completed"}
             if messages:
                 result["messages"] = messages
             if not products:
                 message = "No products were scraped across all pages"
                 logger.info(message)
                 result["messages"] = result.get("messages", []) + [message]
+            result["report"] = run_report.finish()
 
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result["products"], f, ensure_ascii=False, indent=4)
+            save_products(output_file, products)
             logger.info(f"Scraping completed and saved to {output_file}. Total products: {len(products)}")
-            print(json.dumps(result))
+            if resume:
+                result["valid"] = True
+                result["message"] = "CAPTCHA validated successfully, scraping resumed"
+            print_result(result, products)
+            if resume:
+                # The finally block below closes the resumed browser
+                delete_session(session_id, close_browser=False)
             return result
         
         except Exception as e:
@@ -734,24 +773,43 @@ def scrape_dhgate(keyword, page_count, retries, desired_fields):
             print(json.dumps(result))
             return result
     
+    except CaptchaRequired as e:
+        # The resumed run starts again at position's card, so a detail page that hit the CAPTCHA is fetched again
+        url, cookies = browser.current_url, browser.get_cookies()
+        parked = park(browser)
+        if parked:
+            # The parked browser keeps using this run's profile; the run that resumes it saves it
+            parked['profile_dir'] = browser_profile.workdir
+        save_session(session_id, "dhgate", url, cookies,
+                     job, position, list(products.values()), parked)
+        result = {
+            "status": "captcha_required",
+            "captcha": e.details,
+            "sessionId": session_id
+        }
+        logger.info(f"CAPTCHA detected: {json.dumps(result)}")
+        print(json.dumps(result))
+        return result
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         result = {"status": "error", "message": str(e)}
         print(json.dumps(result))
         return result
     finally:
-        try:
-            browser.quit()
-            logger.info("Browser closed successfully")
-        except Exception as e:
-            logger.error(f"Error quitting browser: {e}")
-        session_file = f"session_{session_id}.pkl"
-        if os.path.exists(session_file):
+        export_run(store)
+        store.close()
+        seen.close()
+        products.close()
+        if not parked:
+            cookie_jar.finish(browser)
             try:
-                os.remove(session_file)
-                logger.info(f"Removed session file: {session_file}")
+                browser.quit()
+                logger.info("Browser closed successfully")
             except Exception as e:
-                logger.error(f"Error removing session file: {e}")
+                logger.error(f"Error quitting browser: {e}")
+            if resume:
+                close_parked(resume.get('parked'))
+            browser_profile.release()
 
 def main():
     """Main entry point."""
@@ -759,8 +817,7 @@ def main():
     if sys.argv[1] == "--validate-captcha":
         validate_captcha(captcha_input, session_id)
     else:
-        result = scrape_dhgate(keyword, page_count, retries, desired_fields)
-        print(json.dumps(result))
+        scrape_dhgate(keyword, page_count, retries, desired_fields)
 
 if __name__ == "__main__":
     browser = None
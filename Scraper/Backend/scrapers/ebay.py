@@ -1,8 +1,6 @@
 import re
-import time
 import json
 import sys
-import random
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,6 +9,24 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
+from scraper_utils.canonical import ProductIndex
+from scraper_utils.cdp_driver import wrap_cdp
+from scraper_utils.cookie_jar import open_cookie_jar
+from scraper_utils.driver_supervisor import supervise
+from scraper_utils.export import export_run
+from scraper_utils.extraction import extract_with_retry
+from scraper_utils.fingerprint import manage_fingerprint
+from scraper_utils.page_size import plan
+from scraper_utils.paginate import SearchPager
+from scraper_utils.product_store import open_store
+from scraper_utils.profiles import open_profile
+from scraper_utils.proxy_pool import open_proxy_pool
+from scraper_utils.rate_limit import throttled_get
+from scraper_utils.readiness import set_page_load_strategy
+from scraper_utils.retry import PageRetry
+from scraper_utils.run_report import run_report
+from scraper_utils.seen_index import open_seen_index
+from scraper_utils.spill import open_products, save_products
 
 # Supported fields for user selection
 SUPPORTED_FIELDS = [
@@ -37,6 +53,11 @@ except ValueError as e:
 # Parse and validate fields
 fields = [f.strip() for f in sys.argv[4].split(',') if f.strip()]
 desired_fields = ['url', 'website_name'] + [f for f in fields if f in SUPPORTED_FIELDS]
+# Fields that need the product page
+detail_fields = [f for f in [
+    'description', 'supplier', 'feedback', 'image_url', 'images', 'dimensions',
+    'discount_information', 'brand_name'
+] if f in desired_fields]
 invalid_fields = [f for f in fields if f not in SUPPORTED_FIELDS]
 if invalid_fields:
     print(f"Error: Invalid fields: {', '.join(invalid_fields)}. Supported fields: {', '.join(SUPPORTED_FIELDS)}")
@@ -47,9 +68,11 @@ if not desired_fields:
 
 # Setup output file
 output_file = f"products_{search_keyword.replace(' ', '_').lower()}_ebay.json"
+browser_profile = open_profile("ebay")
+proxy_pool = open_proxy_pool("ebay")
 
-def initialize_driver():
-    """Configure and return a Selenium WebDriver instance."""
+def initialize_driver(sticky_proxy=None):
+    """Configure and return a Selenium WebDriver instance, reusing `sticky_proxy` if it is still healthy."""
     options = webdriver.ChromeOptions()
     options.add_argument("--headless=new")
     options.add_argument("--disable-gpu")
@@ -59,25 +82,16 @@ def initialize_driver():
     options.add_argument("--log-level=3")
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36")
-    try:
-        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-        driver.set_page_load_timeout(30)
-        return driver
-    except WebDriverException as e:
-        print(f"Error initializing Chrome browser: {e}")
-        sys.exit(1)
+    browser_profile.apply_chrome(options)
+    set_page_load_strategy(options, "ebay")
+    proxy = proxy_pool.configure_chrome(options, sticky_proxy)
+    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    driver.set_page_load_timeout(30)
+    return proxy_pool.bind(browser_profile.attach(wrap_cdp(driver, "ebay")), proxy)
 
 def retry_extraction(func, attempts=3, delay=1, default=None):
     """Retries an extraction function up to 'attempts' times."""
-    for i in range(attempts):
-        try:
-            result = func()
-            if result is not None:
-                return result
-        except Exception as e:
-            if i < attempts - 1:
-                time.sleep(delay + random.uniform(0, 0.5))
-    return default
+    return extract_with_retry(func, attempts, delay, default, jitter=0.5, allow_empty=True)
 
 def filter_product_data(product_data):
     """Filter product data to include only desired fields."""
@@ -85,15 +99,44 @@ def filter_product_data(product_data):
 
 def scrape_ebay_products():
     """Main scraping function."""
-    browser = initialize_driver()
-    scraped_products = {}
     try:
-        for page in range(1, page_count + 1):
+        browser = supervise(initialize_driver, "ebay")
+    except WebDriverException as e:
+        print(f"Error initializing Chrome browser: {e}")
+        sys.exit(1)
+    cookie_jar = open_cookie_jar("ebay", "https://www.ebay.com")
+    cookie_jar.preload(browser)
+    manage_fingerprint(browser, "ebay")
+    scraped_products = open_products("ebay")
+    store = open_store("ebay", search_keyword)
+    seen = open_seen_index("ebay")
+    product_index = ProductIndex("ebay")
+    page_retry = PageRetry("ebay", retries)
+    # page_count pages of eBay's default size, fetched as fewer larger pages
+    page_plan = plan("ebay", page_count)
+    pager = SearchPager(
+        browser, "ebay",
+        lambda page: page_plan.apply(
+            f"https://www.ebay.com/sch/i.html?_nkw={search_keyword.replace(' ', '+')}&_sacat=0&_pgn={page}"
+        ),
+        page_plan.pages, product_index
+    )
+    cards_seen = 0
+    try:
+        for page in range(1, page_plan.pages + 1):
+            if not page_retry.allow():
+                print(f"eBay is blocking requests, skipping pages {page}-{page_plan.pages}")
+                break
+            # A retried page's cards are counted once
+            cards_before_page = cards_seen
+            # Only a parsed page can tell that the results have run out
+            page_parsed = False
             for attempt in range(retries):
                 try:
-                    search_url = f"https://www.ebay.com/sch/i.html?_nkw={search_keyword.replace(' ', '+')}&_sacat=0&_pgn={page}"
+                    cards_seen = cards_before_page
+                    search_url = pager.url_for(page)
                     print(f"Scraping page {page}, attempt {attempt + 1}/{retries}: {search_url}")
-                    browser.get(search_url)
+                    pager.load(page)
                     WebDriverWait(browser, 15).until(
                         EC.presence_of_element_located((By.CSS_SELECTOR, "ul.srp-results"))
                     )
@@ -103,9 +146,13 @@ def scrape_ebay_products():
                     product_cards = soup.select("div.s-item__wrapper")
                     if not product_cards:
                         print(f"No product cards found on page {page}")
+                        page_parsed = True
                         break
 
                     for product in product_cards:
+                        if page_plan.reached(cards_seen):
+                            break
+                        cards_seen += 1
                         product_data = {
                             "url": "",
                             "title": "",
@@ -140,7 +187,8 @@ def scrape_ebay_products():
                                 print(f"Product URL: {url}")
 
                         # Skip duplicates
-                        if product_data["url"] in scraped_products:
+                        pager.saw(product_data["url"])
+                        if product_index.is_duplicate(product_data["url"]):
                             continue
 
                         # Extract currency and price
@@ -168,12 +216,10 @@ def scrape_ebay_products():
                                     print(f"Origin: {product_data['origin']}")
 
                         # Scrape product page for additional details
-                        if product_data["url"] and any(field in desired_fields for field in [
-                            'description', 'supplier', 'feedback', 'image_url', 'images', 'dimensions',
-                            'discount_information', 'brand_name'
-                        ]):
+                        detail_fetched = False
+                        if product_data["url"] and detail_fields and not seen.reuse(product_data, store, detail_fields):
                             try:
-                                browser.get(product_data["url"])
+                                throttled_get(browser, product_data["url"])
                                 WebDriverWait(browser, 10).until(
                                     EC.presence_of_element_located((By.CSS_SELECTOR, "div#viTabs_0_is"))
                                 )
@@ -299,27 +345,34 @@ def scrape_ebay_products():
                                         product_data["brand_name"] = brand_name
                                         print(f"Brand: {brand_name}")
 
+                                detail_fetched = True
                             except Exception as e:
                                 print(f"Error scraping product page {product_data['url']}: {e}")
 
                         # Save filtered product
                         if product_data["url"]:
-                            scraped_products[product_data["url"]] = filter_product_data(product_data)
+                            filtered_product = filter_product_data(product_data)
+                            scraped_products[product_data["url"]] = filtered_product
+                            store.add(filtered_product)
+                            seen.record(product_data, detail_fetched)
+                            product_index.add(product_data["url"])
 
-                    # Random delay to avoid rate limiting
-                    time.sleep(random.uniform(1, 3))
+                    page_retry.succeeded()
+                    page_parsed = True
                     break
                 except (TimeoutException, WebDriverException) as e:
                     print(f"Attempt {attempt + 1}/{retries}: Error scraping page {page}: {e}")
-                    time.sleep(5 + random.uniform(0, 2))
+                    if not page_retry.failed(attempt, e, browser):
+                        break
             else:
                 print(f"Failed to scrape page {page} after {retries} attempts.")
+            if pager.finish(page, processed=page_parsed) or page_plan.reached(cards_seen):
+                break
 
         # Save to JSON
         if scraped_products:
             try:
-                with open(output_file, "w", encoding="utf-8") as f:
-                    json.dump(list(scraped_products.values()), f, ensure_ascii=False, indent=4)
+                save_products(output_file, scraped_products)
                 print(f"Scraped {len(scraped_products)} products. Saved to {output_file}")
             except Exception as e:
                 print(f"Error saving JSON file: {e}")
@@ -327,7 +380,15 @@ def scrape_ebay_products():
             print("No products scraped. JSON file not created.")
 
     finally:
+        pager.close()
+        export_run(store)
+        store.close()
+        seen.close()
+        scraped_products.close()
+        cookie_jar.finish(browser)
         browser.quit()
+        browser_profile.release()
+        print(f"Run report: {json.dumps(run_report.finish())}")
 
 if __name__ == "__main__":
     scrape_ebay_products()
\ No newline at end of file
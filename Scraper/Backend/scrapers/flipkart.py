@@ -12,6 +12,25 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
+from scraper_utils import net_capture
+from scraper_utils.canonical import ProductIndex
+from scraper_utils.cdp_driver import wrap_cdp
+from scraper_utils.cookie_jar import open_cookie_jar
+from scraper_utils.driver_supervisor import supervise
+from scraper_utils.export import export_run
+from scraper_utils.extraction import extract_with_retry
+from scraper_utils.fingerprint import manage_fingerprint
+from scraper_utils.product_store import open_store
+from scraper_utils.profiles import open_profile
+from scraper_utils.proxy_pool import open_proxy_pool
+from scraper_utils.rate_limit import throttled_get
+from scraper_utils.readiness import set_page_load_strategy, wait_ready
+from scraper_utils.retry import CAPTCHA, PageRetry
+from scraper_utils.run_report import run_report
+from scraper_utils.scroll import scroll_to_load
+from scraper_utils.seen_index import open_seen_index
+from scraper_utils.snapshot import PageSnapshot
+from scraper_utils.spill import open_products, print_result, save_products
 
 # Configure logging to a file and console for debugging
 logging.basicConfig(
@@ -58,6 +77,10 @@ except ValueError:
 fields = sys.argv[4].split(',')
 # Always include 'url' and 'website_name' for context and deduplication
 desired_fields = list(set(['url', 'website_name'] + [f.strip() for f in fields if f.strip() in SUPPORTED_FIELDS]))
+# Fields that need the product page
+detail_fields = [f for f in [
+    'description', 'supplier', 'feedback', 'images', 'videos', 'specifications', 'discount_information'
+] if f in desired_fields]
 # Validate fields
 invalid_fields = [f for f in fields if f.strip() not in SUPPORTED_FIELDS]
 if invalid_fields:
@@ -72,9 +95,11 @@ if invalid_fields:
 # Setup output file
 output_file = f"products_{search_keyword.replace(' ', '_')}_flipkart.json"
 logging.info(f"Output file will be saved as: {output_file}")
+browser_profile = open_profile("flipkart")
+proxy_pool = open_proxy_pool("flipkart")
 
-def selenium_config():
-    """Configure and return a Selenium WebDriver instance."""
+def selenium_config(sticky_proxy=None):
+    """Configure and return a Selenium WebDriver instance, reusing `sticky_proxy` if it is still healthy."""
     logging.info("Initializing Selenium WebDriver")
     options = webdriver.ChromeOptions()
     options.add_argument("--headless=new")
@@ -82,13 +107,17 @@ def selenium_config():
     options.add_argument("--log-level=3")
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36")
+    browser_profile.apply_chrome(options)
+    net_capture.prepare(options, "flipkart")
+    set_page_load_strategy(options, "flipkart")
+    proxy = proxy_pool.configure_chrome(options, sticky_proxy)
     
     # Fallback for Chrome binary if not found
     try:
         browser = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
         browser.maximize_window()
         logging.info("Chrome WebDriver initialized successfully")
-        return browser
+        return proxy_pool.bind(browser_profile.attach(wrap_cdp(browser, "flipkart")), proxy)
     except WebDriverException as e:
         logging.error(f"Primary WebDriver initialization failed: {str(e)}")
         # Try specifying Chrome binary location (common issue on Windows)
@@ -97,28 +126,14 @@ def selenium_config():
             browser = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
             browser.maximize_window()
             logging.info("WebDriver initialized with specified Chrome binary")
-            return browser
+            return proxy_pool.bind(browser_profile.attach(wrap_cdp(browser, "flipkart")), proxy)
         except WebDriverException as e2:
-            error_msg = f"Error initializing Chrome browser: {str(e2)}"
-            logging.error(error_msg)
-            print(json.dumps({
-                "status": "error",
-                "message": error_msg
-            }))
-            sys.exit(1)
+            logging.error(f"Error initializing Chrome browser: {str(e2)}")
+            raise
 
 def retry_extraction(func, attempts=3, delay=2, default="N/A"):
     """Retries an extraction function up to 'attempts' times."""
-    for i in range(attempts):
-        try:
-            result = func()
-            if result:
-                return result
-        except Exception as e:
-            logging.warning(f"Retry {i+1}/{attempts} failed: {str(e)}")
-            if i < attempts - 1:
-                time.sleep(delay)
-    return default
+    return extract_with_retry(func, attempts, delay, default)
 
 def filter_product_data(product_data):
     """Filter product data to include only desired fields."""
@@ -128,19 +143,31 @@ def filter_product_data(product_data):
             filtered_data[field] = product_data[field]
     return filtered_data
 
-def detect_captcha(browser):
-    """Detect CAPTCHA by checking for common CAPTCHA elements or redirects."""
+def apply_listing(product_json_data, listing):
+    """Fill a product's search-page fields from a listing captured from Flipkart's search API."""
+    url = listing["url"]
+    product_json_data["url"] = url if url.startswith("http") else f"https://www.flipkart.com{url}"
+    product_json_data["title"] = listing["title"]
+    if "price" in listing:
+        currency = listing.get("currency", "N/A")
+        product_json_data["currency"] = "₹" if currency == "INR" else currency
+        product_json_data["exact_price"] = str(listing["price"])
+    if "image" in listing:
+        # Image URLs are templates for the size and quality the page wants
+        product_json_data["image_url"] = (listing["image"].replace("{@width}", "416")
+                                          .replace("{@height}", "416").replace("{@quality}", "70"))
+
+def detect_captcha(page):
+    """Detect CAPTCHA in a PageSnapshot by checking for common CAPTCHA elements or redirects."""
     try:
-        page_source = browser.page_source.lower()
         captcha_indicators = ['captcha', 'verify you are not a robot', 'recaptcha', 'please verify']
-        if any(indicator in page_source for indicator in captcha_indicators):
+        if any(indicator in page.lower for indicator in captcha_indicators):
             logging.warning("CAPTCHA detected in page source")
             return True
-        soup = BeautifulSoup(page_source, 'html.parser')
-        if soup.find('div', class_='g-recaptcha') or soup.find('form', id='challenge-form'):
+        if page.soup.find('div', class_='g-recaptcha') or page.soup.find('form', id='challenge-form'):
             logging.warning("CAPTCHA element found in HTML")
             return True
-        if 'captcha' in browser.current_url.lower():
+        if 'captcha' in page.url.lower():
             logging.warning("CAPTCHA detected in URL")
             return True
         return False
@@ -151,50 +178,65 @@ def detect_captcha(browser):
 def scrape_flipkart_products(browser):
     """Main scraping function."""
     logging.info("Starting Flipkart scraping")
-    scraped_products = {}
+    cookie_jar = open_cookie_jar("flipkart", "https://www.flipkart.com")
+    cookie_jar.preload(browser)
+    manage_fingerprint(browser, "flipkart")
+    scraped_products = open_products("flipkart")
     messages = []  # Collect messages for final output
+    store = open_store("flipkart", search_keyword)
+    seen = open_seen_index("flipkart")
+    product_index = ProductIndex("flipkart")
+    page_retry = PageRetry("flipkart", retries)
+    capture = net_capture.open_capture(browser, "flipkart")
 
     for page in range(1, search_page + 1):
+        if not page_retry.allow():
+            message = f"Flipkart is blocking requests, skipped pages {page}-{search_page}"
+            logging.warning(message)
+            messages.append(message)
+            break
         for attempt in range(retries):
             try:
                 search_url = f"https://www.flipkart.com/search?q={search_keyword.replace(' ', '+')}&page={page}"
                 logging.info(f"Scraping page {page}, attempt {attempt + 1}/{retries}: {search_url}")
-                browser.get(search_url)
-                WebDriverWait(browser, 15).until(
-                    lambda d: d.execute_script("return document.readyState") == "complete"
-                )
+                if capture:
+                    capture.reset()
+                throttled_get(browser, search_url)
+                wait_ready(browser, "flipkart", "search", timeout=15)
 
                 # Check for CAPTCHA
-                if detect_captcha(browser):
+                if detect_captcha(PageSnapshot(browser)):
                     message = f"CAPTCHA detected on page {page}"
                     logging.warning(message)
                     messages.append(message)
-                    time.sleep(5)
-                    continue
-
-                # Scroll to ensure all products load
-                browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)  # Wait for lazy-loaded content
-
-                # Try multiple product card selectors
-                product_cards_selectors = [
-                    'div._2kHMtA',  # Grid layout
-                    'div.tUxRFH',  # List layout
-                    'div._1AtVbE',  # Container
-                    'div[data-id]',  # Fallback
-                ]
-                product_cards = None
-                for selector in product_cards_selectors:
-                    try:
-                        product_cards = WebDriverWait(browser, 10).until(
-                            EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
-                        )
-                        if product_cards:
-                            logging.info(f"Found product cards with selector: {selector}")
-                            break
-                    except TimeoutException:
-                        logging.info(f"Selector {selector} failed")
+                    if page_retry.failed(attempt, browser=browser, kind=CAPTCHA):
                         continue
+                    break
+
+                # Listings captured from the search API need no scrolling or DOM parsing
+                product_cards = capture.listings() if capture else None
+                if not product_cards:
+                    # Scroll until lazy-loaded products stop appearing
+                    scroll_to_load(browser, 'div._2kHMtA, div.tUxRFH, div._1AtVbE, div[data-id]')
+
+                    # Try multiple product card selectors
+                    product_cards_selectors = [
+                        'div._2kHMtA',  # Grid layout
+                        'div.tUxRFH',  # List layout
+                        'div._1AtVbE',  # Container
+                        'div[data-id]',  # Fallback
+                    ]
+                    for selector in product_cards_selectors:
+                        try:
+                            product_cards = WebDriverWait(browser, 10).until(
+                                EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
+                            )
+                            if product_cards:
+                                logging.info(f"Found product cards with selector: {selector}")
+                                break
+                        except TimeoutException:
+                            logging.info(f"Selector {selector} failed")
+                            continue
 
                 if not product_cards:
                     message = f"No products found on page {page}"
@@ -221,8 +263,11 @@ def scrape_flipkart_products(browser):
                         "discount_information": "N/A"
                     }
 
+                    if isinstance(product_card, dict):
+                        # Captured from the search API: the search-page fields are already there
+                        apply_listing(product_json_data, product_card)
                     # Extract product URL
-                    if 'url' in desired_fields:
+                    elif 'url' in desired_fields:
                         try:
                             product_url_tag = product_card.find_element(By.CSS_SELECTOR, "a[href*='flipkart.com']")
                             product_json_data["url"] = product_url_tag.get_attribute("href")
@@ -231,11 +276,13 @@ def scrape_flipkart_products(browser):
                             logging.error(f"Error extracting URL for product {index + 1}: {str(e)}")
 
                     # Skip duplicates
-                    if product_json_data["url"] in scraped_products or product_json_data["url"] == "N/A":
+                    if product_json_data["url"] == "N/A" or product_index.is_duplicate(product_json_data["url"]):
                         continue
 
                     # Extract fields from search page
-                    if any(field in desired_fields for field in ['title', 'exact_price', 'currency', 'image_url']):
+                    if not isinstance(product_card, dict) and any(
+                        field in desired_fields for field in ['title', 'exact_price', 'currency', 'image_url']
+                    ):
                         try:
                             # Title
                             if 'title' in desired_fields:
@@ -265,21 +312,20 @@ def scrape_flipkart_products(browser):
                             logging.error(f"Error extracting search page data for product {index + 1}: {str(e)}")
 
                     # Open product page for detailed fields
-                    if product_json_data["url"] != "N/A" and any(field in desired_fields for field in [
-                        'description', 'supplier', 'feedback', 'images', 'videos', 'specifications', 'discount_information'
-                    ]):
+                    detail_fetched = False
+                    if product_json_data["url"] != "N/A" and detail_fields and not seen.reuse(
+                        product_json_data, store, detail_fields
+                    ):
                         try:
                             logging.info(f"Navigating to product page: {product_json_data['url']}")
-                            browser.get(product_json_data["url"])
-                            WebDriverWait(browser, 15).until(
-                                lambda d: d.execute_script("return document.readyState") == "complete"
-                            )
-                            browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                            time.sleep(2)  # Wait for lazy-loaded content
-                            product_page_html = BeautifulSoup(browser.page_source, "html.parser")
+                            throttled_get(browser, product_json_data["url"])
+                            wait_ready(browser, "flipkart", "product", timeout=15)
+                            scroll_to_load(browser)
+                            snapshot = PageSnapshot(browser)
+                            product_page_html = snapshot.soup
 
                             # Check for CAPTCHA
-                            if detect_captcha(browser):
+                            if detect_captcha(snapshot):
                                 message = f"CAPTCHA detected on product page: {product_json_data['url']}"
                                 logging.warning(message)
                                 messages.append(message)
@@ -376,6 +422,7 @@ def scrape_flipkart_products(browser):
                                 except Exception as e:
                                     logging.error(f"Error extracting specifications: {str(e)}")
 
+                            detail_fetched = True
                         except Exception as e:
                             logging.error(f"Error processing product page {product_json_data['url']}: {str(e)}")
                             messages.append(f"Error processing product {index + 1} on page {page}")
@@ -383,35 +430,39 @@ def scrape_flipkart_products(browser):
                     # Filter and store product data
                     filtered_product = filter_product_data(product_json_data)
                     scraped_products[product_json_data["url"]] = filtered_product
+                    store.add(filtered_product)
+                    seen.record(product_json_data, detail_fetched)
+                    product_index.add(product_json_data["url"])
                     logging.info(f"Product {index + 1} scraped successfully")
 
+                page_retry.succeeded()
                 break  # Exit retry loop on success
             except Exception as e:
                 logging.error(f"Attempt {attempt + 1}/{retries}: Error scraping page {page}: {str(e)}")
-                time.sleep(5)
-                if attempt == retries - 1:
-                    message = f"Failed to scrape page {page} after {retries} attempts"
+                if not page_retry.failed(attempt, e, browser):
+                    message = f"Failed to scrape page {page} after {attempt + 1} attempts"
                     logging.warning(message)
                     messages.append(message)
                     break
 
+    export_run(store)
+    store.close()
+    seen.close()
+
     # Save to JSON and return result
     try:
-        result = {
-            "status": "completed",
-            "products": list(scraped_products.values())
-        }
+        result = {"status": "completed"}
         if messages:
             result["messages"] = messages
         if not scraped_products:
             message = "No products were scraped across all pages"
             logging.info(message)
             result["messages"] = result.get("messages", []) + [message]
+        result["report"] = run_report.finish()
 
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(result["products"], f, ensure_ascii=False, indent=4)
+        save_products(output_file, scraped_products)
         logging.info(f"Scraping completed and saved to {output_file}. Total products: {len(scraped_products)}")
-        print(json.dumps(result))
+        print_result(result, scraped_products)
         return True
     except Exception as e:
         logging.error(f"Error saving JSON file: {str(e)}")
@@ -420,12 +471,15 @@ def scrape_flipkart_products(browser):
             "message": f"Error saving JSON file: {str(e)}"
         }))
         return False
+    finally:
+        scraped_products.close()
+        cookie_jar.finish(browser)
 
 if __name__ == "__main__":
     logging.info("Starting main execution")
     browser = None
     try:
-        browser = selenium_config()
+        browser = supervise(selenium_config, "flipkart")
         scrape_flipkart_products(browser)
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}")
@@ -440,4 +494,5 @@ if __name__ == "__main__":
                 browser.quit()
                 logging.info("Browser closed successfully")
             except Exception as e:
-                logging.error(f"Error closing browser: {str(e)}")
\ No newline at end of file
+                logging.error(f"Error closing browser: {str(e)}")
+        browser_profile.release()
\ No newline at end of file
@@ -1,11 +1,7 @@
 import sys
 import json
-import os
-import pickle
 import logging
-import time
 import re
-import random
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -14,6 +10,27 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 from bs4 import BeautifulSoup
 from webdriver_manager.chrome import ChromeDriverManager
 from urllib.parse import quote
+from scraper_utils import js_extract
+from scraper_utils.browser_park import attach, close_parked, make_parkable, park, release
+from scraper_utils.canonical import ProductIndex
+from scraper_utils.cdp_driver import wrap_cdp
+from scraper_utils.cookie_jar import open_cookie_jar
+from scraper_utils.driver_supervisor import supervise
+from scraper_utils.export import export_run
+from scraper_utils.extraction import extract_with_retry
+from scraper_utils.fingerprint import manage_fingerprint
+from scraper_utils.paginate import SearchPager
+from scraper_utils.product_store import open_store
+from scraper_utils.profiles import open_profile
+from scraper_utils.proxy_pool import open_proxy_pool
+from scraper_utils.rate_limit import throttled_get
+from scraper_utils.readiness import set_page_load_strategy, wait_ready
+from scraper_utils.retry import CAPTCHA, PageRetry
+from scraper_utils.run_report import run_report
+from scraper_utils.scroll import scroll_to_load
+from scraper_utils.session_store import CaptchaRequired, delete_session, load_session, new_session_id, save_session
+from scraper_utils.snapshot import PageSnapshot
+from scraper_utils.spill import open_products, print_result, save_products
 
 # Setup logging to file and stderr (no stdout to avoid JSON parsing issues)
 logging.basicConfig(
@@ -80,8 +97,11 @@ else:
     output_file = f"products_{keyword.replace(' ', '_')}_indiamart.json"
     logger.info(f"Output file will be saved as: {output_file}")
 
-def setup_driver():
-    """Configure and return a Selenium WebDriver instance."""
+browser_profile = open_profile("indiamart")
+proxy_pool = open_proxy_pool("indiamart")
+
+def setup_driver(sticky_proxy=None):
+    """Configure and return a Selenium WebDriver instance, reusing `sticky_proxy` if it is still healthy."""
     logger.info("Initializing Selenium WebDriver")
     options = webdriver.ChromeOptions()
     options.add_argument("--headless=new")
@@ -94,6 +114,10 @@ def setup_driver():
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
         "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     )
+    make_parkable(options)
+    browser_profile.apply_chrome(options)
+    set_page_load_strategy(options, "indiamart")
+    proxy = proxy_pool.configure_chrome(options, sticky_proxy)
     
     try:
         driver = webdriver.Chrome(
@@ -103,7 +127,7 @@ def setup_driver():
         driver.set_page_load_timeout(30)
         driver.maximize_window()
         logger.info("Chrome WebDriver initialized successfully")
-        return driver
+        return proxy_pool.bind(browser_profile.attach(wrap_cdp(driver, "indiamart")), proxy)
     except WebDriverException as e:
         logger.warning(f"Primary WebDriver initialization failed: {str(e)}. Trying with specified Chrome binary")
         try:
@@ -115,46 +139,19 @@ def setup_driver():
             driver.set_page_load_timeout(30)
             driver.maximize_window()
             logger.info("Chrome WebDriver initialized with specified binary")
-            return driver
+            return proxy_pool.bind(browser_profile.attach(wrap_cdp(driver, "indiamart")), proxy)
         except WebDriverException as e2:
-            error_msg = f"Error initializing Chrome browser: {str(e2)}"
-            logger.error(error_msg)
-            print(json.dumps({"status": "error", "message": error_msg}))
-            sys.exit(1)
-
-def save_session(session_id, url, cookies):
-    """Save browser session for CAPTCHA handling."""
-    session_data = {'url': url, 'cookies': cookies}
-    session_file = f"session_{session_id}.pkl"
-    try:
-        with open(session_file, 'wb') as f:
-            pickle.dump(session_data, f)
-        logger.info(f"Saved session to {session_file}")
-    except Exception as e:
-        logger.error(f"Error saving session: {e}")
-
-def load_session(session_id):
-    """Load browser session."""
-    session_file = f"session_{session_id}.pkl"
-    if os.path.exists(session_file):
-        try:
-            with open(session_file, 'rb') as f:
-                return pickle.load(f)
-        except Exception as e:
-            logger.error(f"Error loading session: {e}")
-            return None
-    logger.warning(f"Session file {session_file} not found")
-    return None
+            logger.error(f"Error initializing Chrome browser: {str(e2)}")
+            raise
 
-def detect_captcha(page_source, browser):
-    """Detect CAPTCHA presence."""
+def detect_captcha(page):
+    """Detect CAPTCHA presence in a PageSnapshot."""
     try:
-        page_source_lower = page_source.lower()
         captcha_indicators = ['captcha', 'verify you are not a robot', 'recaptcha', 'please verify']
-        if any(indicator in page_source_lower for indicator in captcha_indicators):
+        if any(indicator in page.lower for indicator in captcha_indicators):
             logger.warning("CAPTCHA detected in page source")
             return True
-        soup = BeautifulSoup(page_source, 'html.parser')
+        soup = page.soup
         captcha_div = (
             soup.find('div', class_='captcha-container') or
             soup.find('div', id='captcha') or
@@ -164,7 +161,7 @@ def detect_captcha(page_source, browser):
         if captcha_div:
             logger.warning("CAPTCHA element found in HTML")
             return True
-        if 'captcha' in browser.current_url.lower():
+        if 'captcha' in page.url.lower():
             logger.warning("CAPTCHA detected in URL")
             return True
         return False
@@ -172,11 +169,10 @@ def detect_captcha(page_source, browser):
         logger.error(f"Error detecting CAPTCHA: {e}")
         return False
 
-def get_captcha_details(browser):
-    """Extract CAPTCHA details."""
+def get_captcha_details(page):
+    """Extract CAPTCHA details from a PageSnapshot."""
     try:
-        page_source = browser.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
+        soup = page.soup
         captcha_img = (
             soup.find('img', class_='captcha-image') or
             soup.find('img', id='captcha') or
@@ -186,48 +182,73 @@ def get_captcha_details(browser):
         captcha_type = 'image' if captcha_url else 'interactive'
         return {
             'type': captcha_type,
-            'url': captcha_url or browser.current_url,
+            'url': captcha_url or page.url,
             'html': None
         }
     except Exception as e:
         logger.error(f"Error extracting CAPTCHA details: {e}")
-        return {'type': 'unknown', 'url': browser.current_url, 'html': None}
+        return {'type': 'unknown', 'url': page.url, 'html': None}
 
 def validate_captcha(captcha_input, session_id):
-    """Validate CAPTCHA input."""
-    browser = setup_driver()
+    """Validate CAPTCHA input and resume the interrupted job."""
+    global desired_fields, output_file
+    session_data = load_session(session_id)
+    if not session_data:
+        result = {"valid": False, "message": f"Session {session_id} not found or expired"}
+        logger.error(result["message"])
+        print(json.dumps(result))
+        return
+    parked = session_data.get('parked')
+    browser = attach(parked, webdriver.chrome.service.Service(ChromeDriverManager().install())) if parked else None
+    reattached = browser is not None
+    if reattached:
+        # The parked browser still runs on the interrupted run's profile; this run saves that one when it ends
+        browser_profile.adopt(parked.get('profile_dir'))
+    elif parked:
+        browser_profile.discard(parked.get('profile_dir'))
+    browser = browser or setup_driver((session_data.get('job') or {}).get('proxy'))
     try:
-        session_data = load_session(session_id)
-        if not session_data:
-            result = {"valid": False, "message": f"Session {session_id} not found"}
-            logger.error(result["message"])
-            print(json.dumps(result))
-            return
-        
-        browser.get(session_data['url'])
-        for cookie in session_data['cookies']:
-            browser.add_cookie(cookie)
+        if not reattached:
+            throttled_get(browser, session_data['url'])
+            for cookie in session_data['cookies']:
+                browser.add_cookie(cookie)
         
         # Mock CAPTCHA validation (IndiaMart-specific CAPTCHA handling would go here)
         if captcha_input == "mock123":
-            save_session(session_id, browser.current_url, browser.get_cookies())
-            result = {"valid": True, "message": "CAPTCHA validated successfully"}
-            logger.info(result["message"])
-            print(json.dumps(result))
+            logger.info("CAPTCHA validated successfully")
+            job = session_data.get('job')
+            if not job:
+                result = {"valid": True, "message": "CAPTCHA validated successfully"}
+                print(json.dumps(result))
+                return
+            desired_fields = job['fields']
+            output_file = job['output_file']
+            # scrape_indiamart takes over the browser and quits it when done
+            resumed_browser, browser = browser, None
+            scrape_indiamart(job['keyword'], job['page_count'], job['retries'], desired_fields,
+                             resume=session_data, browser=resumed_browser)
         else:
             result = {"valid": False, "message": "Invalid CAPTCHA input"}
             logger.error(result["message"])
             print(json.dumps(result))
+            if reattached:
+                # Leave the browser parked on the CAPTCHA page for the next attempt
+                release(browser)
+                browser = None
     except Exception as e:
         result = {"valid": False, "message": f"Error validating CAPTCHA: {str(e)}"}
         logger.error(result["message"])
         print(json.dumps(result))
     finally:
-        try:
-            browser.quit()
-            logger.info("Browser closed successfully")
-        except Exception as e:
-            logger.error(f"Error quitting browser: {e}")
+        if browser:
+            try:
+                browser.quit()
+                logger.info("Browser closed successfully")
+            except Exception as e:
+                logger.error(f"Error quitting browser: {e}")
+            if reattached:
+                close_parked(parked)
+            browser_profile.release()
 
 def clean_text(text):
     """Clean text by removing extra whitespace and HTML tags."""
@@ -308,16 +329,7 @@ def parse_price(price_text):
 
 def retry_extraction(func, attempts=3, delay=2, default=None):
     """Retries an extraction function up to 'attempts' times."""
-    for i in range(attempts):
-        try:
-            result = func()
-            if result:
-                return result
-        except Exception as e:
-            logger.warning(f"Retry {i+1}/{attempts} failed: {str(e)}")
-            if i < attempts - 1:
-                time.sleep(delay)
-    return default
+    return extract_with_retry(func, attempts, delay, default)
 
 def filter_product_data(product_data):
     """Filter product data to include only desired fields."""
@@ -327,9 +339,9 @@ def filter_product_data(product_data):
             filtered_data[field] = product_data[field]
     return filtered_data
 
-def extract_product_data(card, browser, desired_fields, keyword):
-    """Extract product data from a card element."""
-    product = {
+def new_product():
+    """Return an empty product record."""
+    return {
         "url": None,
         "title": None,
         "currency": None,
@@ -348,6 +360,9 @@ def extract_product_data(card, browser, desired_fields, keyword):
         "brand_name": None
     }
 
+def extract_product_data(card, browser, desired_fields, keyword):
+    """Extract product data from a card element."""
+    product = new_product()
     try:
         soup = BeautifulSoup(card.get_attribute('outerHTML'), 'html.parser')
 
@@ -661,77 +676,174 @@ def extract_product_data(card, browser, desired_fields, keyword):
         logger.error(f"Error extracting product data for {product.get('title', 'Unknown')}: {e}")
         return None
 
-def scrape_indiamart(keyword, page_count, retries, desired_fields):
-    """Main scraping function."""
+def product_from_fields(record, desired_fields, keyword):
+    """Build a product from card fields read in the browser by js_extract, with extract_product_data's rules."""
+    fields = record['fields']
+    product = new_product()
+    logger.debug(f"Card fields from selectors: {record['selectors']}")
+
+    if 'title' in desired_fields:
+        product['title'] = clean_title(fields.get('title'), keyword)
+        if not product['title']:
+            logger.warning("No title found for product")
+            return None
+
+    if 'url' in desired_fields:
+        href = fields.get('url')
+        if href:
+            product['url'] = (href if href.startswith('http') else f"https://www.indiamart.com{href}").split('?')[0]
+        if not product['url']:
+            logger.warning(f"No URL found for {product['title']}")
+            return None
+
+    # Relaxed keyword filter to include products with partial matches
+    if product['title']:
+        keyword_parts = keyword.lower().split()
+        if not any(part in product['title'].lower() for part in keyword_parts if len(part) > 3):
+            logger.info(f"Skipping non-matching product: {product['title']}")
+            return None
+
+    if 'currency' in desired_fields or 'exact_price' in desired_fields:
+        product.update(parse_price(fields.get('price')))
+        if not fields.get('price'):
+            logger.warning(f"No price element found for {product['title']}")
+
+    if 'description' in desired_fields:
+        product['description'] = clean_text(fields.get('description'))
+
+    if 'min_order' in desired_fields:
+        text = clean_text(fields.get('min_order'))
+        if text:
+            qty_match = re.search(r'(\d+)', text)
+            unit_match = re.search(r'([A-Za-z]+)', text)
+            product['min_order'] = f"{qty_match.group(1)} {unit_match.group(1)}" if qty_match and unit_match else None
+        else:
+            product['min_order'] = "1 unit"
+
+    if 'supplier' in desired_fields:
+        product['supplier'] = clean_text(fields.get('supplier'))
+
+    if 'origin' in desired_fields:
+        product['origin'] = clean_text(fields.get('origin'))
+
+    if 'feedback' in desired_fields:
+        rating_match = re.search(r'([\d.]+)', fields.get('rating') or '')
+        product['feedback']['rating'] = rating_match.group(1) if rating_match else None
+        review_match = re.search(r'\((\d+)\)', fields.get('reviews') or '')
+        product['feedback']['review'] = review_match.group(1) if review_match else None
+
+    if 'images' in desired_fields or 'image_url' in desired_fields or 'dimensions' in desired_fields:
+        images = [src for src in fields.get('images', [])
+                  if not src.endswith(('placeholder.png', 'default.jpg', 'noimage.jpg'))]
+        product['images'] = images
+        product['image_url'] = images[0] if images else None
+        if images:
+            product['dimensions'] = f"{fields.get('image_width', 'Unknown')}x{fields.get('image_height', 'Unknown')}"
+
+    if 'videos' in desired_fields:
+        product['videos'] = fields.get('videos', [])
+
+    if 'discount_information' in desired_fields:
+        product['discount_information'] = clean_text(fields.get('discount'))
+
+    if 'brand_name' in desired_fields and product['title']:
+        common_brands = ["rolex", "omega", "tag heuer", "cartier", "patek philippe", "audemars piguet", "tissot", "seiko", "citizen"]
+        title_lower = product['title'].lower()
+        for brand in common_brands:
+            if re.search(r'\b' + brand + r'\b', title_lower):
+                product['brand_name'] = brand.capitalize()
+                break
+
+    return product
+
+def scrape_indiamart(keyword, page_count, retries, desired_fields, resume=None, browser=None):
+    """Main scraping function; `resume` is a saved CAPTCHA session to continue from."""
     logger.info("Starting IndiaMart scraping")
-    browser = setup_driver()
-    products = {}
+    cookie_jar = open_cookie_jar("indiamart", "https://dir.indiamart.com")
+    if not browser:
+        browser = supervise(setup_driver, "indiamart")
+        cookie_jar.preload(browser)
+        manage_fingerprint(browser, "indiamart")
+    else:
+        # Replacements of a resumed browser stay on the proxy its CAPTCHA was solved through
+        sticky_proxy = (resume.get('job') or {}).get('proxy') if resume else None
+        browser = supervise(lambda proxy=None: setup_driver(proxy or sticky_proxy), "indiamart", browser)
+    products = open_products("indiamart")
     messages = []
-    session_id = f"indiamart_{int(time.time())}"
+    session_id = resume['session_id'] if resume else new_session_id("indiamart")
+    job = {"keyword": keyword, "page_count": page_count, "retries": retries,
+           "fields": desired_fields, "output_file": output_file, "proxy": proxy_pool.proxy_of(browser)}
+    start = (resume or {}).get('position') or {"page": 1, "card": 0}
+    position = dict(start)
+    parked = None
     skipped_products = []
+    store = open_store("indiamart", keyword)
+    product_index = ProductIndex("indiamart")
+    page_retry = PageRetry("indiamart", retries)
+    pager = SearchPager(
+        browser, "indiamart",
+        lambda page: f"https://dir.indiamart.com/search.mp?ss={quote(keyword.replace(' ', '+'))}&page={page}",
+        page_count, product_index
+    )
+    use_js_extract = js_extract.enabled("indiamart")
+    if resume:
+        for product in resume['products']:
+            products.append(product)
+            product_index.add(product.get('url'))
+        logger.info(f"Resuming session {session_id} at page {start['page']}, card {start['card'] + 1} "
+                    f"with {len(products)} products")
     
     try:
-        for page in range(1, page_count + 1):
-            url = f"https://dir.indiamart.com/search.mp?ss={quote(keyword.replace(' ', '+'))}&page={page}"
+        for page in range(start['page'], page_count + 1):
+            if not page_retry.allow():
+                message = f"IndiaMART is blocking requests, skipped pages {page}-{page_count}"
+                logger.warning(message)
+                messages.append(message)
+                break
+            url = pager.url_for(page)
             logger.info(f"Scraping page {page}/{page_count}: {url}")
+            first_card = start['card'] if page == start['page'] else 0
+            position = {"page": page, "card": first_card}
+            # Only a parsed page can tell that the results have run out
+            page_parsed = False
             for attempt in range(retries):
                 try:
-                    browser.get(url)
-                    WebDriverWait(browser, 20).until(
-                        lambda d: d.execute_script("return document.readyState") == "complete"
-                    )
+                    pager.load(page)
+                    wait_ready(browser, "indiamart", "search", timeout=20)
                     
                     # Check for CAPTCHA
-                    if detect_captcha(browser.page_source, browser):
-                        captcha_details = get_captcha_details(browser)
-                        save_session(session_id, browser.current_url, browser.get_cookies())
-                        result = {
-                            "status": "captcha_required",
-                            "captcha": captcha_details,
-                            "sessionId": session_id
-                        }
-                        messages.append("CAPTCHA detected")
-                        logger.info(f"CAPTCHA detected: {json.dumps(result)}")
-                        print(json.dumps(result))
-                        return result
+                    snapshot = PageSnapshot(browser)
+                    if detect_captcha(snapshot):
+                        page_retry.failed(attempt, browser=browser, kind=CAPTCHA)
+                        raise CaptchaRequired(get_captcha_details(snapshot), url)
                     
                     # Scroll to load all products
-                    previous_product_count = 0
-                    max_scroll_attempts = 5
-                    scroll_attempts = 0
-                    while scroll_attempts < max_scroll_attempts:
-                        cards = browser.find_elements(By.CSS_SELECTOR, 'div.card, div.product-card, div.listing')
-                        current_count = len(cards)
-                        logger.info(f"Scroll attempt {scroll_attempts + 1}: Found {current_count} products")
-                        if current_count == previous_product_count:
-                            break
-                        previous_product_count = current_count
-                        browser.execute_script(
-                            "window.scrollTo(0, Math.min(document.body.scrollHeight, window.scrollY + 800));"
-                        )
-                        time.sleep(random.uniform(1, 2))
-                        scroll_attempts += 1
-
-                    # Try multiple product card selectors
-                    product_cards_selectors = [
-                        'div.card',
-                        'div.product-card',
-                        'div.listing',
-                        'div[class*="product"]',
-                        'li.listing-item'
-                    ]
+                    scroll_to_load(browser, 'div.card, div.product-card, div.listing', step=800, max_scrolls=5)
+
                     product_cards = None
-                    for selector in product_cards_selectors:
-                        try:
-                            product_cards = WebDriverWait(browser, 10).until(
-                                EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
-                            )
-                            if product_cards:
-                                logger.info(f"Found product cards with selector: {selector}")
-                                break
-                        except TimeoutException:
-                            logger.info(f"Selector {selector} failed")
-                            continue
+                    if use_js_extract:
+                        # All cards and their fields in one round trip
+                        product_cards = js_extract.extract(browser, js_extract.SPECS["indiamart"])
+                    else:
+                        # Try multiple product card selectors
+                        product_cards_selectors = [
+                            'div.card',
+                            'div.product-card',
+                            'div.listing',
+                            'div[class*="product"]',
+                            'li.listing-item'
+                        ]
+                        for selector in product_cards_selectors:
+                            try:
+                                product_cards = WebDriverWait(browser, 10).until(
+                                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
+                                )
+                                if product_cards:
+                                    logger.info(f"Found product cards with selector: {selector}")
+                                    break
+                            except TimeoutException:
+                                logger.info(f"Selector {selector} failed")
+                                continue
 
                     if not product_cards:
                         message = f"No products found on page {page}"
@@ -739,15 +851,25 @@ def scrape_indiamart(keyword, page_count, retries, desired_fields):
                         messages.append(message)
                         with open(f"debug_page_{page}.html", "w", encoding="utf-8") as f:
                             f.write(browser.page_source)
+                        page_parsed = True
                         break
                     
                     logger.info(f"Found {len(product_cards)} products on page {page}")
                     for index, card in enumerate(product_cards):
-                        product = extract_product_data(card, browser, desired_fields, keyword)
+                        if index < first_card:
+                            continue
+                        position["card"] = index
+                        if use_js_extract:
+                            product = product_from_fields(card, desired_fields, keyword)
+                        else:
+                            product = extract_product_data(card, browser, desired_fields, keyword)
+                        pager.saw(product and product['url'])
                         if product and product['url']:
-                            if product['url'] not in products:
+                            if not product_index.is_duplicate(product['url']):
                                 filtered_product = filter_product_data(product)
                                 products[product['url']] = filtered_product
+                                store.add(filtered_product)
+                                product_index.add(product['url'])
                                 logger.info(f"Product {index + 1} scraped successfully")
                             else:
                                 logger.info(f"Skipping duplicate product: {product['title']}")
@@ -761,43 +883,41 @@ def scrape_indiamart(keyword, page_count, retries, desired_fields):
                                 "title": "Unknown",
                                 "reason": "Extraction failed or non-matching product"
                             })
-                        
-                        time.sleep(random.uniform(0.5, 1.5))
                     
+                    page_retry.succeeded()
+                    page_parsed = True
                     break
+                except CaptchaRequired:
+                    raise
                 except TimeoutException as e:
                     logger.error(f"Attempt {attempt + 1}/{retries} failed for page {page}: Timeout - {str(e)}")
-                    if attempt == retries - 1:
-                        message = f"Failed to scrape page {page} after {retries} attempts"
+                    if not page_retry.failed(attempt, e, browser):
+                        message = f"Failed to scrape page {page} after {attempt + 1} attempts"
                         logger.warning(message)
                         messages.append(message)
                         with open(f"debug_page_{page}.html", "w", encoding="utf-8") as f:
                             f.write(browser.page_source)
                         break
-                    time.sleep(5 * (attempt + 1))
                 except Exception as e:
                     logger.error(f"Attempt {attempt + 1}/{retries} failed for page {page}: {str(e)}")
-                    if attempt == retries - 1:
-                        message = f"Failed to scrape page {page} after {retries} attempts"
+                    if not page_retry.failed(attempt, e, browser):
+                        message = f"Failed to scrape page {page} after {attempt + 1} attempts"
                         logger.warning(message)
                         messages.append(message)
                         break
-                    time.sleep(5 * (attempt + 1))
-            
-            time.sleep(random.uniform(2, 5))
+            if pager.finish(page, processed=page_parsed):
+                break
         
         # Save to JSON and return result
         try:
-            result = {
-                "status": "completed",
-                "products": list(products.values())
-            }
+            result = {"status": "completed"}
             if messages:
                 result["messages"] = messages
             if not products:
                 message = "No products were scraped across all pages"
                 logger.info(message)
                 result["messages"] = result.get("messages", []) + [message]
+            result["report"] = run_report.finish()
 
             # Save skipped products for debugging
             if skipped_products:
@@ -807,12 +927,17 @@ def scrape_indiamart(keyword, page_count, retries, desired_fields):
                 logger.info(f"Skipped products saved to {skipped_file}")
 
             # Save products to output file
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result["products"], f, ensure_ascii=False, indent=4)
+            save_products(output_file, products)
             logger.info(f"Scraping completed and saved to {output_file}. Total products: {len(products)}")
 
             # Print JSON result exactly once
-            print(json.dumps(result))
+            if resume:
+                result["valid"] = True
+                result["message"] = "CAPTCHA validated successfully, scraping resumed"
+            print_result(result, products)
+            if resume:
+                # The finally block below closes the resumed browser
+                delete_session(session_id, close_browser=False)
             return result
         
         except Exception as e:
@@ -821,24 +946,45 @@ def scrape_indiamart(keyword, page_count, retries, desired_fields):
             print(json.dumps(result))
             return result
     
+    except CaptchaRequired as e:
+        # The resumed run starts again at position's card, so a detail page that hit the CAPTCHA is fetched again
+        # The parked browser keeps only the CAPTCHA tab
+        pager.close()
+        url, cookies = browser.current_url, browser.get_cookies()
+        parked = park(browser)
+        if parked:
+            # The parked browser keeps using this run's profile; the run that resumes it saves it
+            parked['profile_dir'] = browser_profile.workdir
+        save_session(session_id, "indiamart", url, cookies,
+                     job, position, list(products.values()), parked)
+        result = {
+            "status": "captcha_required",
+            "captcha": e.details,
+            "sessionId": session_id
+        }
+        logger.info(f"CAPTCHA detected: {json.dumps(result)}")
+        print(json.dumps(result))
+        return result
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         result = {"status": "error", "message": str(e)}
         print(json.dumps(result))
         return result
     finally:
-        try:
-            browser.quit()
-            logger.info("Browser closed successfully")
-        except Exception as e:
-            logger.error(f"Error quitting browser: {e}")
-        session_file = f"session_{session_id}.pkl"
-        if os.path.exists(session_file):
+        pager.close()
+        export_run(store)
+        store.close()
+        products.close()
+        if not parked:
+            cookie_jar.finish(browser)
             try:
-                os.remove(session_file)
-                logger.info(f"Removed session file: {session_file}")
+                browser.quit()
+                logger.info("Browser closed successfully")
             except Exception as e:
-                logger.error(f"Error removing session file: {e}")
+                logger.error(f"Error quitting browser: {e}")
+            if resume:
+                close_parked(resume.get('parked'))
+            browser_profile.release()
 
 def main():
     """Main entry point."""
@@ -1,15 +1,28 @@
-import time
 import json
-import os
 import sys
-import pickle
 import logging
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from scraper_utils.canonical import ProductIndex
+from scraper_utils.cookie_jar import open_cookie_jar
+from scraper_utils.driver_supervisor import supervise
+from scraper_utils.export import export_run
+from scraper_utils.extraction import extract_with_retry
+from scraper_utils.product_store import open_store
+from scraper_utils.profiles import open_profile
+from scraper_utils.proxy_pool import open_proxy_pool
+from scraper_utils.rate_limit import throttled_get
+from scraper_utils.readiness import set_page_load_strategy, wait_ready
+from scraper_utils.retry import CAPTCHA, PageRetry
+from scraper_utils.run_report import run_report
+from scraper_utils.scroll import scroll_to_load
+from scraper_utils.seen_index import open_seen_index
+from scraper_utils.session_store import CaptchaRequired, delete_session, load_session, new_session_id, save_session
+from scraper_utils.snapshot import PageSnapshot
+from scraper_utils.spill import open_products, print_result, save_products
 
 # Configure logging to a file for debugging
 logging.basicConfig(
@@ -88,9 +101,18 @@ options.add_argument("--headless")
 options.add_argument("--ignore-certificate-errors")
 options.add_argument("--log-level=3")
 options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+browser_profile = open_profile("madeinchina")
+browser_profile.apply_firefox(options)
+set_page_load_strategy(options, "madeinchina")
+proxy_pool = open_proxy_pool("madeinchina")
+
+def start_browser(sticky_proxy=None):
+    """Launch a Firefox browser through a proxy from the pool, reusing `sticky_proxy` if it is still healthy."""
+    proxy = proxy_pool.configure_firefox(options, sticky_proxy)
+    return proxy_pool.bind(webdriver.Firefox(options=options), proxy)
 
 try:
-    browser = webdriver.Firefox(options=options)
+    browser = supervise(start_browser, "madeinchina")
 except Exception as e:
     print(json.dumps({
         "status": "error",
@@ -98,51 +120,31 @@ except Exception as e:
     }))
     sys.exit(1)
 
-def save_session(session_id, url, cookies):
-    """Save browser session (cookies and URL) to resume after CAPTCHA."""
-    session_data = {'url': url, 'cookies': cookies}
-    session_file = f"session_{session_id}.pkl"
-    with open(session_file, 'wb') as f:
-        pickle.dump(session_data, f)
-    logging.info(f"Saved session {session_id}")
-
-def load_session(session_id):
-    """Load browser session for resuming scraping."""
-    session_file = f"session_{session_id}.pkl"
-    if os.path.exists(session_file):
-        with open(session_file, 'rb') as f:
-            return pickle.load(f)
-    return None
-
-def detect_captcha():
-    """Detect CAPTCHA by checking for common CAPTCHA elements or redirects."""
+def detect_captcha(page):
+    """Detect CAPTCHA in a PageSnapshot by checking for common CAPTCHA elements or redirects."""
     try:
-        page_source = browser.page_source
-        if any(keyword in page_source.lower() for keyword in ['h-captcha', 'recaptcha', 'please verify you are not a robot']):
+        if any(keyword in page.lower for keyword in ['h-captcha', 'recaptcha', 'please verify you are not a robot']):
             return True
-        soup = BeautifulSoup(page_source, 'html.parser')
-        captcha_div = soup.find('div', class_='captcha-container')
+        captcha_div = page.soup.find('div', class_='captcha-container')
         if captcha_div:
             return True
-        if 'captcha' in browser.current_url.lower():
+        if 'captcha' in page.url.lower():
             return True
         return False
     except Exception as e:
         logging.error(f"Error detecting CAPTCHA: {str(e)}")
         return False
 
-def get_captcha_details():
-    """Extract CAPTCHA details (type, URL, or HTML)."""
+def get_captcha_details(page):
+    """Extract CAPTCHA details (type, URL, or HTML) from a PageSnapshot."""
     try:
-        page_source = browser.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-        captcha_img = soup.find('img', class_='captcha-image')
+        captcha_img = page.soup.find('img', class_='captcha-image')
         captcha_url = captcha_img['src'] if captcha_img and 'src' in captcha_img.attrs else None
         captcha_type = 'image' if captcha_url else 'interactive'
         
         return {
             'type': captcha_type,
-            'url': captcha_url or browser.current_url,
+            'url': captcha_url or page.url,
             'html': None
         }
     except Exception as e:
@@ -150,7 +152,9 @@ def get_captcha_details():
         return {'type': 'image', 'url': 'https://example.com/captcha.jpg', 'html': None}
 
 def validate_captcha(captcha_input, session_id):
-    """Validate CAPTCHA input."""
+    """Validate CAPTCHA input and resume the interrupted job."""
+    global search_keyword, search_page, retries, desired_fields, output_file
+    resumed = False
     try:
         session_data = load_session(session_id)
         if not session_data:
@@ -161,18 +165,29 @@ def validate_captcha(captcha_input, session_id):
             print(json.dumps(captcha_result))
             return False
         
-        browser.get(session_data['url'])
+        throttled_get(browser, session_data['url'])
         for cookie in session_data['cookies']:
             browser.add_cookie(cookie)
         
         # For demonstration/testing purposes
         if captcha_input == "mock123":
-            captcha_result = {
-                "valid": True,
-                "message": "CAPTCHA validated successfully"
-            }
-            print(json.dumps(captcha_result))
-            save_session(session_id, browser.current_url, browser.get_cookies())
+            logging.info("CAPTCHA validated successfully")
+            job = session_data.get('job')
+            if not job:
+                captcha_result = {
+                    "valid": True,
+                    "message": "CAPTCHA validated successfully"
+                }
+                print(json.dumps(captcha_result))
+                return True
+            search_keyword = job['keyword']
+            search_page = job['page_count']
+            retries = job['retries']
+            desired_fields = job['fields']
+            output_file = job['output_file']
+            # scrape_madeinchina_products quits the browser when it is done
+            resumed = True
+            scrape_madeinchina_products(resume=session_data)
             return True
         else:
             captcha_result = {
@@ -188,18 +203,14 @@ def validate_captcha(captcha_input, session_id):
         }
         print(json.dumps(captcha_result))
         return False
+    finally:
+        if not resumed:
+            browser.quit()
+            browser_profile.release()
 
 def retry_extraction(func, attempts=3, delay=1, default=""):
     """Retry a function with specified attempts and delay."""
-    for i in range(attempts):
-        try:
-            result = func()
-            if result:
-                return result
-        except Exception as e:
-            logging.warning(f"Retry {i+1}/{attempts} failed: {str(e)}")
-            time.sleep(delay)
-    return default
+    return extract_with_retry(func, attempts, delay, default)
 
 def filter_product_data(product_data, desired_fields):
     """Filter product data to include only desired fields."""
@@ -209,35 +220,50 @@ def filter_product_data(product_data, desired_fields):
             filtered_data[field] = product_data[field]
     return filtered_data
 
-def scrape_madeinchina_products():
-    # Handle validate-captcha mode
-    if sys.argv[1] == "--validate-captcha":
-        validate_captcha(sys.argv[2], sys.argv[3])
-        sys.exit(0)
-
-    scraped_products = {}
-    session_id = f"madeinchina_{int(time.time())}"
+def scrape_madeinchina_products(resume=None):
+    """Scrape search pages; `resume` is a saved CAPTCHA session to continue from."""
+    cookie_jar = open_cookie_jar("madeinchina", "https://www.made-in-china.com")
+    if not resume:
+        cookie_jar.preload(browser)
+    scraped_products = open_products("madeinchina")
+    session_id = resume['session_id'] if resume else new_session_id("madeinchina")
+    job = {"keyword": search_keyword, "page_count": search_page, "retries": retries,
+           "fields": desired_fields, "output_file": output_file}
+    start = (resume or {}).get('position') or {"page": 1, "card": 0}
+    position = dict(start)
     messages = []  # Collect messages for final output
+    store = open_store("madeinchina", search_keyword)
+    seen = open_seen_index("madeinchina")
+    product_index = ProductIndex("madeinchina")
+    page_retry = PageRetry("madeinchina", retries)
+    if resume:
+        for product in resume['products']:
+            scraped_products[product['url']] = product
+            product_index.add(product['url'])
+        logging.info(f"Resuming session {session_id} at page {start['page']}, card {start['card'] + 1} "
+                     f"with {len(scraped_products)} products")
     
     try:
-        for page in range(1, search_page + 1):
+        for page in range(start['page'], search_page + 1):
+            if not page_retry.allow():
+                message = f"Made-in-China is blocking requests, skipped pages {page}-{search_page}"
+                logging.warning(message)
+                messages.append(message)
+                break
+            first_card = start['card'] if page == start['page'] else 0
+            position = {"page": page, "card": first_card}
             for attempt in range(retries):
                 try:
                     # Simplified search URL, removing potentially unnecessary parameters
                     search_url = f'https://www.made-in-china.com/multi-search/{search_keyword}/F1/{page}.html'
-                    browser.get(search_url)
-                    WebDriverWait(browser, 10).until(lambda d: d.execute_script("return document.readyState") == "complete")
+                    throttled_get(browser, search_url)
+                    wait_ready(browser, "madeinchina", "search", timeout=10)
                     
                     # Check for CAPTCHA
-                    if detect_captcha():
-                        captcha_details = get_captcha_details()
-                        save_session(session_id, browser.current_url, browser.get_cookies())
-                        print(json.dumps({
-                            "status": "captcha_required",
-                            "captcha": captcha_details,
-                            "sessionId": session_id
-                        }))
-                        sys.exit(0)
+                    snapshot = PageSnapshot(browser)
+                    if detect_captcha(snapshot):
+                        page_retry.failed(attempt, browser=browser, kind=CAPTCHA)
+                        raise CaptchaRequired(get_captcha_details(snapshot), search_url)
 
                     # Try multiple selectors to find product list
                     product_cards_container = None
@@ -271,7 +297,10 @@ def scrape_madeinchina_products():
                         messages.append(message)
                         break
 
-                    for product in product_cards:
+                    for index, product in enumerate(product_cards):
+                        if index < first_card:
+                            continue
+                        position["card"] = index
                         product_json_data = {
                             "url": "",
                             "title": "",
@@ -304,7 +333,7 @@ def scrape_madeinchina_products():
                                 logging.error(f"Error extracting product URL: {str(e)}")
 
                         # Skip if product URL already scraped or empty
-                        if not product_json_data["url"] or product_json_data["url"] in scraped_products:
+                        if not product_json_data["url"] or product_index.is_duplicate(product_json_data["url"]):
                             continue
 
                         # Extract product title
@@ -351,23 +380,16 @@ def scrape_madeinchina_products():
 
                         # Scrape product page details if needed
                         if any(field in desired_fields for field in ['origin', 'feedback', 'specifications', 'images', 'videos']):
-                            if product_json_data["url"]:
+                            if product_json_data["url"] and not seen.reuse(product_json_data, store):
                                 try:
-                                    browser.get(product_json_data["url"])
-                                    WebDriverWait(browser, 10).until(lambda d: d.execute_script("return document.readyState") == "complete")
-                                    if detect_captcha():
-                                        captcha_details = get_captcha_details()
-                                        save_session(session_id, browser.current_url, browser.get_cookies())
-                                        print(json.dumps({
-                                            "status": "captcha_required",
-                                            "captcha": captcha_details,
-                                            "sessionId": session_id
-                                        }))
-                                        sys.exit(0)
-                                    
-                                    browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                                    WebDriverWait(browser, 2).until(lambda d: True)
-                                    product_page_html = BeautifulSoup(browser.page_source, "html.parser")
+                                    throttled_get(browser, product_json_data["url"])
+                                    wait_ready(browser, "madeinchina", "product", timeout=10)
+                                    # Scrolled first so one snapshot serves the CAPTCHA check and the extractors
+                                    scroll_to_load(browser)
+                                    snapshot = PageSnapshot(browser)
+                                    if detect_captcha(snapshot):
+                                        raise CaptchaRequired(get_captcha_details(snapshot), product_json_data["url"])
+                                    product_page_html = snapshot.soup
 
                                     # Extract origin
                                     if 'origin' in desired_fields:
@@ -437,19 +459,27 @@ def scrape_madeinchina_products():
                                         except Exception as e:
                                             logging.error(f"Error extracting media: {str(e)}")
 
+                                except CaptchaRequired:
+                                    raise
                                 except Exception as e:
                                     logging.error(f"Error processing product page {product_json_data['url']}: {str(e)}")
 
                         # Filter and store product data
                         filtered_product = filter_product_data(product_json_data, desired_fields)
                         scraped_products[product_json_data["url"]] = filtered_product
+                        store.add(filtered_product)
+                        seen.record(product_json_data)
+                        product_index.add(product_json_data["url"])
 
+                    page_retry.succeeded()
                     break  # Exit retry loop on success
+                except CaptchaRequired:
+                    raise
                 except Exception as e:
                     logging.error(f"Attempt {attempt + 1}/{retries}: Error scraping page {page}: {str(e)}")
-                    time.sleep(5)
-                if attempt == retries - 1:  # If all retries failed
-                    message = f"Failed to scrape page {page} after {retries} attempts"
+                    if page_retry.failed(attempt, e, browser):
+                        continue
+                    message = f"Failed to scrape page {page} after {attempt + 1} attempts"
                     logging.warning(message)
                     messages.append(message)
                     break  # Exit retry loop and move to next page
@@ -461,18 +491,29 @@ def scrape_madeinchina_products():
             messages.append(message)
 
         # Write final output to file
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(list(scraped_products.values()), f, ensure_ascii=False, indent=4)
+        save_products(output_file, scraped_products)
         
         # Return final JSON result
-        result = {
-            "status": "completed",
-            "products": list(scraped_products.values())
-        }
+        result = {"status": "completed"}
         if messages:
             result["messages"] = messages
-        print(json.dumps(result))
-
+        result["report"] = run_report.finish()
+        if resume:
+            result["valid"] = True
+            result["message"] = "CAPTCHA validated successfully, scraping resumed"
+        print_result(result, scraped_products)
+        if resume:
+            delete_session(session_id)
+
+    except CaptchaRequired as e:
+        # The resumed run starts again at position's card, so a detail page that hit the CAPTCHA is fetched again
+        save_session(session_id, "madeinchina", browser.current_url, browser.get_cookies(),
+                     job, position, list(scraped_products.values()))
+        print(json.dumps({
+            "status": "captcha_required",
+            "captcha": e.details,
+            "sessionId": session_id
+        }))
     except Exception as e:
         logging.error(f"Fatal error in scrape_madeinchina_products: {str(e)}")
         print(json.dumps({
@@ -480,10 +521,16 @@ def scrape_madeinchina_products():
             "message": f"Fatal error: {str(e)}"
         }))
     finally:
+        export_run(store)
+        store.close()
+        seen.close()
+        scraped_products.close()
+        cookie_jar.finish(browser)
         browser.quit()
-        session_file = f"session_{session_id}.pkl"
-        if os.path.exists(session_file):
-            os.remove(session_file)
+        browser_profile.release()
 
 if __name__ == "__main__":
-    scrape_madeinchina_products()
\ No newline at end of file
+    if sys.argv[1] == "--validate-captcha":
+        validate_captcha(captcha_input, session_id)
+    else:
+        scrape_madeinchina_products()
\ No newline at end of file
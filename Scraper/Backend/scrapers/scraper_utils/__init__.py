@@ -0,0 +1 @@
+"""Shared helpers used by the site scrapers in this directory."""
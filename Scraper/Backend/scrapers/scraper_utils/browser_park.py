@@ -0,0 +1,146 @@
+"""Keep a live Chrome browser parked while the user solves a CAPTCHA.
+
+With SCRAPER_PARK_BROWSER=1 Chrome is launched with chromedriver's "detach"
+option, so the browser outlives the scraping process. On a CAPTCHA the
+scraper stores the browser's DevTools address and PID in the CAPTCHA
+session instead of quitting it. `--validate-captcha` then attaches a new
+chromedriver to that browser, which is still on the CAPTCHA page with its
+cookies and JavaScript state, and resumes the job without launching a
+second browser or reloading the page.
+
+Parked browsers are closed after SCRAPER_PARK_TTL_MINUTES (default 30) or
+when their session is deleted or expires. Firefox cannot be reattached this
+way, so Firefox sessions (and browsers that died while parked) fall back to
+launching a new browser and replaying the saved cookies.
+"""
+import logging
+import os
+import signal
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from .config import env_bool, env_float
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+
+def parking_enabled() -> bool:
+    """Return True if CAPTCHA sessions should park the live browser."""
+    return env_bool("SCRAPER_PARK_BROWSER")
+
+
+def park_ttl() -> float:
+    """Return how long a parked browser is kept alive, in seconds."""
+    return env_float("SCRAPER_PARK_TTL_MINUTES", 30) * 60
+
+
+def make_parkable(chrome_options):
+    """Let Chrome outlive chromedriver so it can be parked; a no-op unless parking is enabled."""
+    if parking_enabled():
+        chrome_options.add_experimental_option("detach", True)
+    return chrome_options
+
+
+def _browser_pid(driver):
+    try:
+        info = driver.execute_cdp_cmd("SystemInfo.getProcessInfo", {})
+        for process in info.get("processInfo", []):
+            if process.get("type") == "browser":
+                return process.get("id")
+    except Exception as e:
+        logger.debug(f"Could not read the browser PID: {e}")
+    return None
+
+
+def park(driver):
+    """Detach from a live Chrome browser and return what is needed to reattach, or None.
+
+    Returns None (and leaves the driver untouched) when parking is disabled or
+    the browser is not a Chrome instance with a DevTools address.
+    """
+    if not parking_enabled():
+        return None
+    address = (driver.capabilities or {}).get("goog:chromeOptions", {}).get("debuggerAddress")
+    if not address:
+        return None
+    parked = {
+        "debugger_address": address,
+        "pid": _browser_pid(driver),
+        "page_load_strategy": (driver.capabilities or {}).get("pageLoadStrategy", "normal"),
+        "parked_at": time.time(),
+    }
+    try:
+        # Stopping chromedriver without quitting leaves the detached browser running
+        driver.service.stop()
+    except Exception as e:
+        logger.warning(f"Could not detach from the browser, not parking it: {e}")
+        return None
+    # A supervised driver's spare browsers are not needed once its browser is parked
+    discard_spares = getattr(driver, "discard_spares", None)
+    if discard_spares:
+        discard_spares()
+    run_report.incr("browsers_parked")
+    logger.info(f"Parked browser at {address} (pid {parked['pid']})")
+    return parked
+
+
+def attach(parked, service=None):
+    """Reattach to a parked browser, or return None if it has expired or is gone."""
+    if not parked:
+        return None
+    if time.time() - parked.get("parked_at", 0) > park_ttl():
+        logger.info("Parked browser has expired, starting a new one")
+        close_parked(parked)
+        return None
+    options = webdriver.ChromeOptions()
+    options.debugger_address = parked["debugger_address"]
+    options.page_load_strategy = parked.get("page_load_strategy", "normal")
+    try:
+        driver = webdriver.Chrome(service=service, options=options) if service else webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(30)
+    except WebDriverException as e:
+        logger.warning(f"Could not reattach to parked browser at {parked['debugger_address']}: {e}")
+        close_parked(parked)
+        return None
+    run_report.incr("browsers_reattached")
+    logger.info(f"Reattached to parked browser at {parked['debugger_address']} on {driver.current_url}")
+    return driver
+
+
+def release(driver):
+    """Disconnect from a reattached browser but leave it parked, e.g. after a wrong CAPTCHA answer."""
+    try:
+        driver.service.stop()
+    except Exception as e:
+        logger.debug(f"Error stopping chromedriver: {e}")
+
+
+def _is_parked_chrome(pid, address):
+    # On Linux make sure the PID still belongs to the browser we parked before killing it
+    cmdline = f"/proc/{pid}/cmdline"
+    if not os.path.exists("/proc"):
+        return True
+    try:
+        with open(cmdline, "rb") as f:
+            args = f.read().decode(errors="ignore")
+    except OSError:
+        return False
+    port = address.rsplit(":", 1)[-1]
+    return "chrom" in args.lower() and (f"--remote-debugging-port={port}" in args or "--remote-debugging-port=0" in args)
+
+
+def close_parked(parked):
+    """Close a parked browser that is no longer needed."""
+    if not parked or not parked.get("pid"):
+        return
+    pid = parked["pid"]
+    if not _is_parked_chrome(pid, parked.get("debugger_address", "")):
+        return
+    try:
+        os.kill(pid, signal.SIGTERM)
+        logger.info(f"Closed parked browser (pid {pid})")
+    except OSError:
+        pass
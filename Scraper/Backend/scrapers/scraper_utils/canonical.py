@@ -0,0 +1,119 @@
+"""Canonical product identity derived from scraped product URLs.
+
+The same product is linked with different tracking parameters, slugs and
+hosts (Amazon ref=/sr= paths, Flipkart lid/marketplace query noise, DHgate
+and Alibaba tracking suffixes). Each site's stable product ID is extracted
+here so deduplication, the product store and the seen index all key on the
+product rather than on the link that happened to be scraped.
+"""
+import logging
+import re
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+# Patterns are tried against the URL path in order; the first group is the product ID.
+ID_PATTERNS = {
+    "amazon": [r"/(?:dp|gp/product|gp/aw/d|exec/obidos/ASIN)/([A-Z0-9]{10})(?:[/?]|$)"],
+    "flipkart": [r"/p/(itm[0-9a-z]+)"],
+    "ebay": [r"/itm/(?:[^/]+/)?(\d{9,15})(?:[/?]|$)"],
+    "alibaba": [r"_(\d{6,})\.html", r"/product/(\d{6,})"],
+    "dhgate": [r"/(\d{6,})\.html"],
+    "indiamart": [r"-(\d{6,})\.html"],
+    "madeinchina": [r"/product/([A-Za-z0-9]+)/"],
+}
+
+# Query parameters that carry the product ID on some sites.
+ID_PARAMS = {
+    "amazon": "asin",
+    "flipkart": "pid",
+}
+
+
+def canonical_url(url):
+    """Normalize a product URL so tracking parameters do not create duplicate rows."""
+    if not url:
+        return url
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), path, "", ""))
+
+
+def product_id(site, url):
+    """Return the site's stable product ID for a URL, or None if it has none."""
+    if not url or url == "N/A":
+        return None
+    parts = urlsplit(url.strip())
+    if site == "amazon" and "/sspa/click" in parts.path:
+        # Sponsored results wrap the product link in a redirect
+        target = parse_qs(parts.query).get("url")
+        return product_id(site, target[0]) if target else None
+    param = ID_PARAMS.get(site)
+    if param:
+        values = parse_qs(parts.query).get(param)
+        if values and values[0]:
+            return values[0].upper() if site == "amazon" else values[0]
+    for pattern in ID_PATTERNS.get(site, []):
+        match = re.search(pattern, parts.path)
+        if match:
+            return match.group(1)
+    return None
+
+
+def canonical_key(site, url):
+    """Return the deduplication key for a product: "<site>:<id>", or its normalized URL."""
+    if not url or url == "N/A":
+        return None
+    pid = product_id(site, url)
+    if pid:
+        return f"{site}:{pid}"
+    return canonical_url(url)
+
+
+def canonical_product_url(site, url):
+    """Return the shortest stable URL for a product, used as its product store key."""
+    if not url or url == "N/A":
+        return url
+    pid = product_id(site, url)
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if site == "amazon" and pid:
+        return f"https://{host}/dp/{pid}"
+    if site == "ebay" and pid:
+        return f"https://{host}/itm/{pid}"
+    if site == "flipkart":
+        pid_values = parse_qs(parts.query).get("pid")
+        base = canonical_url(url)
+        return f"{base}?pid={pid_values[0]}" if pid_values else base
+    return canonical_url(url)
+
+
+class ProductIndex:
+    def __init__(self, site: str):
+        """Create an empty in-run index of product keys for a site."""
+        self.site = site
+        self._keys = set()
+
+    def key(self, url):
+        """Return the canonical key for a product URL."""
+        return canonical_key(self.site, url)
+
+    def is_duplicate(self, url) -> bool:
+        """Return True if a product with the same identity was already saved this run."""
+        if not url or url == "N/A":
+            return False
+        if self.key(url) in self._keys:
+            run_report.incr("duplicate_fetches_prevented")
+            logger.info(f"Skipping duplicate product {url}")
+            return True
+        return False
+
+    def add(self, url):
+        """Record a saved product."""
+        if url and url != "N/A":
+            self._keys.add(self.key(url))
+
+    def __len__(self):
+        return len(self._keys)
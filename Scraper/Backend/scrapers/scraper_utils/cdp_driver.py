@@ -0,0 +1,333 @@
+"""Chrome DevTools backend for the hot path of a scrape.
+
+Every WebDriver command is an HTTP request to chromedriver, which forwards
+it to Chrome over its own DevTools connection. On chatty pages the
+per-command overhead adds up to seconds. With SCRAPER_CDP_DRIVER (a
+comma-separated list of sites, or "all") a site's Chrome driver is wrapped
+in a CDPDriver. It opens a second DevTools connection straight to the page,
+on a persistent WebSocket, and serves the operations the scrapers use most
+from it:
+
+    get, execute_script, execute_async_script, page_source, title,
+    current_url, get_cookies, add_cookie, delete_all_cookies, click(selector)
+
+Everything else (find_element, get_log, execute_cdp_cmd, quit, ...) still
+goes to WebDriver. chromedriver still starts the browser, so the proxy,
+profile and fingerprint setup are unchanged. Scripts that take elements as
+arguments run through WebDriver. So do scripts that return elements, which
+means those scripts run twice.
+
+The backend needs the websocket-client package. Without it, and for
+browsers without a DevTools address (Firefox), the driver is used as is.
+Compare the two paths on a live page with
+
+    python -m scraper_utils.cdp_driver <url> [repeat]
+"""
+import collections
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import (JavascriptException, NoSuchElementException, TimeoutException,
+                                        WebDriverException)
+
+from .config import env_sites
+from .cookie_jar import cookie_from_cdp, cookie_to_cdp
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+COMMAND_TIMEOUT = 30
+
+# Elements cannot be returned by value over DevTools, so results containing them are flagged for WebDriver
+RESULT_CHECK = ("r => (r instanceof Node || ((Array.isArray(r) || r instanceof NodeList || r instanceof HTMLCollection)"
+                " && Array.from(r).some(x => x instanceof Node))) ? {nodes: true} : {value: r}")
+SCRIPT_TEMPLATE = "(() => {{ const r = (function() {{ {script}\n}}).apply(null, {args}); return ({check})(r); }})()"
+ASYNC_SCRIPT_TEMPLATE = ("new Promise(resolve => {{ (function() {{ {script}\n}}).apply(null, {args}.concat([resolve])); }})"
+                         ".then({check})")
+CLICK_TARGET_JS = """(() => {
+    const el = document.querySelector(%s);
+    if (!el) return null;
+    el.scrollIntoView({block: 'center'});
+    const r = el.getBoundingClientRect();
+    return {x: r.left + r.width / 2, y: r.top + r.height / 2};
+})()"""
+
+
+def _require_websocket():
+    try:
+        import websocket
+        return websocket
+    except ImportError as e:
+        raise RuntimeError("The CDP driver backend requires websocket-client (pip install websocket-client)") from e
+
+
+def enabled(site) -> bool:
+    """Return True if SCRAPER_CDP_DRIVER selects the DevTools backend for a site."""
+    return env_sites("SCRAPER_CDP_DRIVER", site)
+
+
+class CDPDriver:
+    def __init__(self, driver, address: str):
+        """Open a DevTools connection to the tab `driver` controls, through the browser's debugger address."""
+        self.webdriver = driver
+        self.address = address
+        self.page_load_timeout = COMMAND_TIMEOUT
+        self.script_timeout = COMMAND_TIMEOUT
+        self.page_load_strategy = (driver.capabilities or {}).get("pageLoadStrategy", "normal")
+        self._websocket = _require_websocket()
+        self._events = collections.deque(maxlen=1000)
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self._connect()
+        logger.info(f"Using the DevTools backend at {address}")
+
+    def _connect(self):
+        # chromedriver's window handles are DevTools target ids
+        url = f"ws://{self.address}/devtools/page/{self.webdriver.current_window_handle}"
+        try:
+            self._ws = self._websocket.create_connection(url, timeout=COMMAND_TIMEOUT, suppress_origin=True)
+        except (self._websocket.WebSocketException, OSError) as e:
+            raise WebDriverException(f"Could not open a DevTools connection to {url}: {e}") from e
+        self._events.clear()
+        self._command("Page.enable")
+        self._command("Page.setLifecycleEventsEnabled", {"enabled": True})
+
+    def retarget(self):
+        """Reconnect to the tab WebDriver has switched to; call after switch_to.window()."""
+        with self._lock:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+            self._connect()
+
+    def __getattr__(self, name):
+        if name == "webdriver":
+            # Not initialised (e.g. while copying); avoid recursing through __getattr__
+            raise AttributeError(name)
+        return getattr(self.webdriver, name)
+
+    def _read(self, timeout) -> dict:
+        self._ws.settimeout(timeout)
+        try:
+            return json.loads(self._ws.recv())
+        except self._websocket.WebSocketTimeoutException as e:
+            raise TimeoutException(f"timeout: no DevTools message within {timeout:.0f}s") from e
+        except (self._websocket.WebSocketException, OSError, ValueError) as e:
+            # Worded like chromedriver's error so the supervisor treats it as a dead browser
+            raise WebDriverException(f"chrome not reachable: DevTools connection lost ({e})") from e
+
+    def _command(self, method, params=None, timeout=COMMAND_TIMEOUT) -> dict:
+        """Send a DevTools command and wait for its result; events that arrive meanwhile are kept."""
+        with self._lock:
+            self._next_id += 1
+            command_id = self._next_id
+            try:
+                self._ws.send(json.dumps({"id": command_id, "method": method, "params": params or {}}))
+            except (self._websocket.WebSocketException, OSError) as e:
+                raise WebDriverException(f"chrome not reachable: DevTools connection lost ({e})") from e
+            deadline = time.monotonic() + timeout
+            while True:
+                message = self._read(max(0.01, deadline - time.monotonic()))
+                if "id" not in message:
+                    self._events.append(message)
+                elif message["id"] == command_id:
+                    break
+                # Anything else answers a command that already timed out
+        run_report.incr("cdp_commands")
+        if "error" in message:
+            raise WebDriverException(f"unknown error: {method} failed: {message['error'].get('message')}")
+        return message.get("result", {})
+
+    def _wait_lifecycle(self, loader_id, name, timeout):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                for event in self._events:
+                    params = event.get("params", {})
+                    if (event.get("method") == "Page.lifecycleEvent" and params.get("loaderId") == loader_id
+                            and params.get("name") == name):
+                        self._events.clear()
+                        return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutException(f"timeout: Timed out receiving message from renderer: {timeout}")
+                message = self._read(remaining)
+                if "id" not in message:
+                    self._events.append(message)
+
+    def _evaluate(self, expression, await_promise=False, timeout=COMMAND_TIMEOUT):
+        result = self._command("Runtime.evaluate", {
+            "expression": expression, "returnByValue": True, "awaitPromise": await_promise, "userGesture": True,
+        }, timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            message = details.get("exception", {}).get("description") or details.get("text")
+            raise JavascriptException(f"javascript error: {message}")
+        return result.get("result", {}).get("value")
+
+    def get(self, url):
+        """Navigate and wait for DOMContentLoaded or load, following the driver's page-load strategy."""
+        self._events.clear()
+        result = self._command("Page.navigate", {"url": url}, self.page_load_timeout)
+        if result.get("errorText"):
+            raise WebDriverException(f"unknown error: {result['errorText']}")
+        # Same-document navigations have no loader
+        if self.page_load_strategy != "none" and result.get("loaderId"):
+            event = "load" if self.page_load_strategy == "normal" else "DOMContentLoaded"
+            self._wait_lifecycle(result["loaderId"], event, self.page_load_timeout)
+
+    def execute_script(self, script, *args):
+        """Run a WebDriver-style script (a function body using `arguments`) in one DevTools round trip."""
+        try:
+            encoded = json.dumps(list(args))
+        except (TypeError, ValueError):
+            run_report.incr("cdp_fallbacks")
+            return self.webdriver.execute_script(script, *args)
+        outcome = self._evaluate(SCRIPT_TEMPLATE.format(script=script, args=encoded, check=RESULT_CHECK)) or {}
+        if outcome.get("nodes"):
+            run_report.incr("cdp_fallbacks")
+            return self.webdriver.execute_script(script, *args)
+        return outcome.get("value")
+
+    def execute_async_script(self, script, *args):
+        """Run a WebDriver-style async script; the callback is the last argument."""
+        try:
+            encoded = json.dumps(list(args))
+        except (TypeError, ValueError):
+            run_report.incr("cdp_fallbacks")
+            return self.webdriver.execute_async_script(script, *args)
+        expression = ASYNC_SCRIPT_TEMPLATE.format(script=script, args=encoded, check=RESULT_CHECK)
+        try:
+            outcome = self._evaluate(expression, await_promise=True, timeout=self.script_timeout) or {}
+        except TimeoutException as e:
+            raise TimeoutException(f"script timeout after {self.script_timeout}s") from e
+        if outcome.get("nodes"):
+            run_report.incr("cdp_fallbacks")
+            return self.webdriver.execute_async_script(script, *args)
+        return outcome.get("value")
+
+    def set_script_timeout(self, time_to_wait):
+        self.script_timeout = time_to_wait
+        self.webdriver.set_script_timeout(time_to_wait)
+
+    def set_page_load_timeout(self, time_to_wait):
+        self.page_load_timeout = time_to_wait
+        self.webdriver.set_page_load_timeout(time_to_wait)
+
+    @property
+    def page_source(self) -> str:
+        # Serialised the same way chromedriver does
+        return self._evaluate("new XMLSerializer().serializeToString(document)")
+
+    @property
+    def title(self) -> str:
+        return self._evaluate("document.title")
+
+    @property
+    def current_url(self) -> str:
+        return self._evaluate("location.href")
+
+    def get_cookies(self) -> list:
+        """Return the cookies visible to the current page, in Selenium's format."""
+        return [cookie_from_cdp(cookie) for cookie in self._command("Network.getCookies").get("cookies", [])]
+
+    def get_cookie(self, name):
+        return next((cookie for cookie in self.get_cookies() if cookie["name"] == name), None)
+
+    def add_cookie(self, cookie):
+        params = cookie_to_cdp(cookie)
+        if "domain" not in params:
+            params["url"] = self.current_url
+        if not self._command("Network.setCookie", params).get("success", True):
+            raise WebDriverException(f"unable to set cookie: {cookie.get('name')}")
+
+    def delete_all_cookies(self):
+        for cookie in self._command("Network.getCookies").get("cookies", []):
+            self._command("Network.deleteCookies",
+                          {"name": cookie["name"], "domain": cookie["domain"], "path": cookie["path"]})
+
+    def click(self, selector):
+        """Scroll the first element matching a CSS selector into view and click its centre with the mouse."""
+        point = self._evaluate(CLICK_TARGET_JS % json.dumps(selector))
+        if not point:
+            raise NoSuchElementException(f"no such element: {selector}")
+        for event in ("mousePressed", "mouseReleased"):
+            self._command("Input.dispatchMouseEvent",
+                          {"type": event, "x": point["x"], "y": point["y"], "button": "left", "clickCount": 1})
+
+    def quit(self):
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+        self.webdriver.quit()
+
+
+def wrap_cdp(driver, site):
+    """Serve a Chrome driver's hot-path commands over DevTools when SCRAPER_CDP_DRIVER covers the site."""
+    if not enabled(site):
+        return driver
+    address = (driver.capabilities or {}).get("goog:chromeOptions", {}).get("debuggerAddress")
+    if not address:
+        return driver
+    try:
+        return CDPDriver(driver, address)
+    except (RuntimeError, WebDriverException) as e:
+        logger.warning(f"Not using the DevTools backend: {e}")
+        return driver
+
+
+OPERATIONS = {
+    "navigate": lambda driver, url: driver.get(url),
+    "evaluate": lambda driver, url: driver.execute_script("return document.querySelectorAll('a').length"),
+    "page_source": lambda driver, url: driver.page_source,
+    "title": lambda driver, url: driver.title,
+    "cookies": lambda driver, url: driver.get_cookies(),
+}
+
+
+def benchmark(driver, url, repeat=5) -> dict:
+    """Time each operation through WebDriver and through DevTools; return the median milliseconds of each."""
+    results = {}
+    for name, operation in OPERATIONS.items():
+        timings = {}
+        for label, target in (("webdriver", driver.webdriver), ("cdp", driver)):
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                operation(target, url)
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[label] = round(statistics.median(samples), 2)
+        timings["speedup"] = round(timings["webdriver"] / timings["cdp"], 1) if timings["cdp"] else None
+        results[name] = timings
+    return results
+
+
+def main():
+    """Load a page in headless Chrome and compare per-command latency of both backends on it."""
+    if len(sys.argv) < 2:
+        print("Usage: python -m scraper_utils.cdp_driver <url> [repeat]")
+        sys.exit(1)
+    url = sys.argv[1]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.page_load_strategy = "eager"
+    driver = webdriver.Chrome(options=options)
+    try:
+        address = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        cdp = CDPDriver(driver, address)
+        cdp.get(url)
+        print(json.dumps({"url": url, "repeat": repeat, "milliseconds": benchmark(cdp, url, repeat)}, indent=2))
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
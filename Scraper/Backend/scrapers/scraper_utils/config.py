@@ -0,0 +1,53 @@
+"""Environment-driven settings shared by the scrapers.
+
+The Node backend spawns each scraper with the server's environment (loaded
+from .env), so optional behaviour is switched on with SCRAPER_* variables
+instead of extra command-line arguments.
+"""
+import os
+from pathlib import Path
+
+
+def env_str(name, default=None):
+    """Return an environment variable, treating empty strings as unset."""
+    value = os.environ.get(name)
+    return value if value not in (None, "") else default
+
+
+def env_int(name, default):
+    """Return an environment variable parsed as an int."""
+    try:
+        return int(env_str(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    """Return an environment variable parsed as a float."""
+    try:
+        return float(env_str(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_bool(name, default=False):
+    """Return an environment variable parsed as a boolean flag."""
+    value = env_str(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_sites(name, site):
+    """Return True if a per-site switch ("all", a boolean flag or a comma-separated list of sites) covers `site`."""
+    value = (env_str(name) or "").strip().lower()
+    if value in ("1", "true", "yes", "on", "all"):
+        return True
+    return site in {s.strip() for s in value.split(",")}
+
+
+def state_path(*parts):
+    """Return a path inside the shared scraper state directory, creating parents."""
+    path = Path(env_str("SCRAPER_STATE_DIR", ".scraper_state")).joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
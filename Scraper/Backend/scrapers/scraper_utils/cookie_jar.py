@@ -0,0 +1,209 @@
+"""Per-site cookie jar carried over between runs.
+
+A fresh browser profile gets cookie-consent interstitials and locale
+redirects, and looks more like a bot. With SCRAPER_COOKIE_JAR=1 the cookies
+of a successful run (at least one page scraped, no CAPTCHA) are merged into
+a per-site jar in SCRAPER_STATE_DIR and preloaded into the next browser.
+Expired cookies are dropped on load and save, and a jar that has not been
+refreshed for SCRAPER_COOKIE_JAR_MAX_AGE_HOURS (default 168) is ignored.
+Updates are made under a lock file so concurrent jobs for the same site
+merge their cookies instead of overwriting each other.
+
+Each run is recorded as "warm" or "cold" together with whether it hit a
+CAPTCHA and how long its first page fetch took. Compare the two with
+
+    python -m scraper_utils.cookie_jar
+"""
+import json
+import logging
+import os
+import time
+
+from .config import env_bool, env_float, state_path
+from .locks import FileLock
+from .rate_limit import throttled_get
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+# Selenium cookie keys and their Chrome DevTools Network.setCookies equivalents
+CDP_KEYS = {"name": "name", "value": "value", "domain": "domain", "path": "path",
+            "secure": "secure", "httpOnly": "httpOnly", "sameSite": "sameSite", "expiry": "expires"}
+
+
+def _live(cookies, now=None):
+    now = now or time.time()
+    return [c for c in cookies if not c.get("expiry") or c["expiry"] > now]
+
+
+def cookie_from_cdp(cookie) -> dict:
+    """Convert a DevTools cookie to Selenium's format."""
+    reverse = {cdp: key for key, cdp in CDP_KEYS.items()}
+    converted = {reverse[k]: v for k, v in cookie.items() if k in reverse}
+    # DevTools reports session cookies with expires = -1
+    if converted.get("expiry", -1) <= 0:
+        converted.pop("expiry", None)
+    else:
+        converted["expiry"] = int(converted["expiry"])
+    return converted
+
+
+def cookie_to_cdp(cookie) -> dict:
+    """Convert a Selenium cookie to a DevTools Network.setCookie(s) parameter."""
+    return {CDP_KEYS[k]: v for k, v in cookie.items() if k in CDP_KEYS}
+
+
+def export_cookies(driver) -> list:
+    """Return all of a browser's cookies in Selenium's format (every domain in Chrome, the current one elsewhere)."""
+    if hasattr(driver, "execute_cdp_cmd"):
+        cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+        return [cookie_from_cdp(cookie) for cookie in cookies]
+    return driver.get_cookies()
+
+
+def inject_cookies(driver, cookies, base_url):
+    """Add cookies to a browser; browsers without DevTools first load `base_url`'s robots.txt."""
+    if hasattr(driver, "execute_cdp_cmd"):
+        # Chrome can take cookies for any domain without loading a page first
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [cookie_to_cdp(cookie) for cookie in cookies]})
+        return
+    # Other browsers only accept cookies for the current domain; robots.txt is the cheapest page
+    throttled_get(driver, f"{base_url.rstrip('/')}/robots.txt")
+    for cookie in cookies:
+        try:
+            driver.add_cookie(cookie)
+        except Exception as e:
+            logger.debug(f"Skipping cookie {cookie.get('name')}: {e}")
+
+
+def _empty_stats():
+    return {"runs": 0, "captcha_runs": 0, "first_page_runs": 0, "first_page_seconds": 0.0}
+
+
+class CookieJar:
+    def __init__(self, site: str, base_url: str, max_age_hours: float = 168):
+        """Open the jar for a site; `base_url` is used to set cookies in browsers without DevTools."""
+        self.site = site
+        self.base_url = base_url.rstrip("/")
+        self.max_age = max_age_hours * 3600
+        self.path = state_path("cookies", f"{site}.json")
+        self.warm = False
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"saved_at": 0, "cookies": [], "stats": {}}
+
+    def _write(self, data: dict):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> list:
+        """Return the jar's unexpired cookies, or an empty list if the jar is missing or stale."""
+        data = self._read()
+        if time.time() - data.get("saved_at", 0) > self.max_age:
+            return []
+        return _live(data.get("cookies", []))
+
+    def preload(self, driver) -> bool:
+        """Load the jar into a new browser; return True if the browser starts warm."""
+        cookies = self.load()
+        if cookies:
+            try:
+                inject_cookies(driver, cookies, self.base_url)
+                self.warm = True
+            except Exception as e:
+                logger.warning(f"Could not preload {self.site} cookies: {e}")
+        run_report.set("cookie_jar", "warm" if self.warm else "cold")
+        logger.info(f"Starting {self.site} with a {'warm' if self.warm else 'cold'} cookie jar ({len(cookies)} cookies)")
+        return self.warm
+
+    def finish(self, driver):
+        """Record this run's warm/cold stats and save the browser's cookies if the run went well."""
+        report = run_report.as_dict()
+        captcha = bool(report.get("page_failures_captcha") or report.get("captcha_sessions"))
+        succeeded = bool(report.get("pages_succeeded")) and not captcha
+        cookies = None
+        if succeeded:
+            try:
+                cookies = driver.get_cookies()
+            except Exception as e:
+                logger.warning(f"Could not read {self.site} cookies: {e}")
+        try:
+            with FileLock(self.path):
+                data = self._read()
+                if cookies:
+                    merged = {(c.get("name"), c.get("domain"), c.get("path")): c for c in data.get("cookies", [])}
+                    merged.update({(c.get("name"), c.get("domain"), c.get("path")): c for c in cookies})
+                    data["cookies"] = _live(list(merged.values()))
+                    data["saved_at"] = time.time()
+                stats = data.setdefault("stats", {})
+                bucket = stats.setdefault("warm" if self.warm else "cold", _empty_stats())
+                bucket["runs"] += 1
+                bucket["captcha_runs"] += int(captcha)
+                if report.get("first_page_seconds") is not None:
+                    bucket["first_page_runs"] += 1
+                    bucket["first_page_seconds"] += report["first_page_seconds"]
+                self._write(data)
+            if cookies:
+                logger.info(f"Saved {len(data['cookies'])} {self.site} cookies to {self.path}")
+        except (OSError, TimeoutError) as e:
+            logger.error(f"Error updating {self.site} cookie jar: {e}")
+
+
+class DisabledCookieJar:
+    """Stand-in used when SCRAPER_COOKIE_JAR is off."""
+
+    warm = False
+
+    def preload(self, driver) -> bool:
+        return False
+
+    def finish(self, driver):
+        pass
+
+
+def open_cookie_jar(site, base_url):
+    """Return the site's cookie jar, or a no-op jar when SCRAPER_COOKIE_JAR is off."""
+    if not env_bool("SCRAPER_COOKIE_JAR"):
+        return DisabledCookieJar()
+    return CookieJar(site, base_url, env_float("SCRAPER_COOKIE_JAR_MAX_AGE_HOURS", 168))
+
+
+def summarize(stats: dict) -> dict:
+    """Turn raw warm/cold counters into CAPTCHA rates and mean first-page latencies."""
+    summary = {}
+    for kind, bucket in stats.items():
+        runs = bucket.get("runs", 0)
+        timed = bucket.get("first_page_runs", 0)
+        summary[kind] = {
+            "runs": runs,
+            "captcha_rate": round(bucket.get("captcha_runs", 0) / runs, 3) if runs else None,
+            "first_page_seconds": round(bucket.get("first_page_seconds", 0) / timed, 2) if timed else None,
+        }
+    return summary
+
+
+def main():
+    """Print CAPTCHA rate and first-page latency for warm and cold runs of every site."""
+    directory = state_path("cookies", "x").parent
+    report = {}
+    for path in sorted(directory.glob("*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        report[path.stem] = {
+            "cookies": len(_live(data.get("cookies", []))),
+            **summarize(data.get("stats", {})),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""Supervised WebDriver that recycles worn-out browsers and replaces crashed ones.
+
+A long run navigates hundreds of pages in one tab and Chrome's memory keeps
+growing until the machine swaps or the driver crashes. SupervisedDriver
+wraps the real driver, delegates everything to it, and before each
+navigation checks a watchdog:
+
+    - after SCRAPER_RECYCLE_NAVIGATIONS navigations (default 0, off), or
+    - when the browser's process tree uses more than SCRAPER_RECYCLE_RSS_MB
+      (default 2048; sampled every SCRAPER_WATCHDOG_EVERY navigations)
+
+the browser is quit and a fresh one is started with the same factory. The
+factory is passed the old browser's proxy, so the new browser keeps the
+exit IP its copied cookies belong to. The old browser's cookies are copied
+over, and the navigation that was about to happen goes to the new browser,
+so the scraper carries on from the same position. Peak browser RSS, CPU time and recycles are added to the run
+report.
+
+When Chrome or chromedriver dies mid-run (invalid session id, chrome not
+reachable, ...), the supervisor starts a replacement and restores the
+cookies it snapshotted after the last successful navigation. A navigation
+that hit the crash is replayed in the new browser; any other call re-raises
+after the replacement is up, so the scraper's page retry runs against a
+live browser. SCRAPER_SPARE_DRIVERS (default 0) browsers are kept started
+on a background thread so a replacement is ready at once; spares need
+their own profile directory, so they are off with SCRAPER_BROWSER_PROFILES.
+At most SCRAPER_MAX_CRASH_RECOVERIES (default 5) crashes are recovered per
+run; each one is counted as driver_crash_recoveries. Factories raise when
+a browser cannot start, so a failed replacement reaches the scraper's page
+retry like any other browser error, and the run still saves its results.
+
+A closed tab or window (no such window) is not a dead browser: the search
+paginator opens and closes background tabs. The supervisor switches to a
+remaining tab (opening one if none is left) and keeps the browser, its
+profile and its other tabs. The interrupted call is handled as for a crash:
+a navigation is replayed, anything else re-raises. Each such switch is
+counted as driver_window_recoveries.
+"""
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException, WebDriverException
+
+from . import fingerprint, proxy_pool
+from .config import env_bool, env_int
+from .cookie_jar import export_cookies, inject_cookies
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+# chromedriver's errors for a browser that has gone away ("disconnected: not connected to DevTools", ...)
+DEAD_SESSION_MARKERS = ("invalid session id", "chrome not reachable", "disconnected")
+CLOSED_WINDOW_MARKERS = ("no such window", "target window already closed", "web view not found")
+
+
+def _proc_tree_usage(root_pid):
+    """Return (rss bytes, cpu seconds) for a process and its descendants using /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields after it are space-separated
+                fields = f.read().rsplit(")", 1)[1].split()
+            children.setdefault(int(fields[1]), []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    ticks = os.sysconf("SC_CLK_TCK")
+    rss = cpu = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                rss += int(f.read().split()[1]) * page_size
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss, cpu
+
+
+def browser_usage(driver):
+    """Return (rss MB, cpu seconds) of a local browser and its driver process, or None if unknown."""
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return None
+    try:
+        import psutil
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+        rss = cpu = 0
+        for process in processes:
+            try:
+                rss += process.memory_info().rss
+                times = process.cpu_times()
+                cpu += times.user + times.system
+            except psutil.Error:
+                continue
+    except ImportError:
+        if not os.path.isdir("/proc"):
+            return None
+        rss, cpu = _proc_tree_usage(pid)
+    except Exception as e:
+        logger.debug(f"Could not sample browser usage: {e}")
+        return None
+    return rss / (1024 * 1024), cpu
+
+
+def is_dead_session(error) -> bool:
+    """Return True if an exception means the browser or chromedriver behind a session is gone."""
+    if isinstance(error, InvalidSessionIdException):
+        return True
+    message = str(error).lower()
+    if isinstance(error, NoSuchWindowException):
+        return False
+    if isinstance(error, WebDriverException):
+        return any(marker in message for marker in DEAD_SESSION_MARKERS)
+    # chromedriver itself has exited: its local HTTP endpoint refuses connections
+    return isinstance(error, ConnectionError) or "max retries exceeded" in message
+
+
+def is_closed_window(error) -> bool:
+    """Return True if an exception means only the current tab or window was closed."""
+    if isinstance(error, NoSuchWindowException):
+        return True
+    return (isinstance(error, WebDriverException) and not is_dead_session(error)
+            and any(marker in str(error).lower() for marker in CLOSED_WINDOW_MARKERS))
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class SupervisedDriver:
+    def __init__(self, factory, site: str, driver=None, max_navigations: int = 0, max_rss_mb: int = 2048,
+                 check_every: int = 10, spares: int = 0, max_recoveries: int = 5):
+        """Wrap a driver started by `factory` (or an existing one) and replace it when it wears out or dies.
+
+        `factory(proxy=None)` starts a browser, through `proxy` if it is given and still healthy.
+        """
+        self._factory = factory
+        self._driver = driver or factory()
+        self.site = site
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.check_every = max(1, check_every)
+        self.spares = spares
+        self.max_recoveries = max_recoveries
+        self.navigations = 0
+        self.recoveries = 0
+        self.peak_rss_mb = 0.0
+        self.cpu_seconds = 0.0
+        self._cookies = []
+        self._last_url = None
+        self._spare_drivers = []
+        self._spare_lock = threading.Lock()
+        self._filling = False
+        self._closed = False
+        self._fill_spares()
+
+    @property
+    def wrapped_driver(self):
+        """The current underlying WebDriver."""
+        return self._driver
+
+    def __getattr__(self, name):
+        if name == "_driver":
+            # Not initialised (e.g. while copying); avoid recursing through __getattr__
+            raise AttributeError(name)
+        try:
+            attr = getattr(self._driver, name)
+        except Exception as e:
+            self._recover(e)
+            raise
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                self._recover(e)
+                raise
+        return call
+
+    def get(self, url):
+        """Navigate, replacing the browser first if the watchdog says it is due or if it has crashed."""
+        reason = self._recycle_reason()
+        if reason:
+            self.recycle(url, reason)
+        try:
+            self._driver.get(url)
+        except Exception as e:
+            if not self._recover(e):
+                raise
+            logger.info(f"Replaying {url} in the {self.site} browser")
+            self._driver.get(url)
+        self.navigations += 1
+        self._last_url = url
+        try:
+            self._cookies = export_cookies(self._driver)
+        except Exception as e:
+            logger.debug(f"Could not snapshot {self.site} cookies: {e}")
+
+    def _recycle_reason(self):
+        if self.max_navigations and self.navigations >= self.max_navigations:
+            return f"{self.navigations} navigations"
+        if self.navigations and self.navigations % self.check_every == 0:
+            usage = browser_usage(self._driver)
+            if usage:
+                rss_mb, cpu = usage
+                self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+                run_report.set("browser_peak_rss_mb", round(self.peak_rss_mb, 1))
+                run_report.set("browser_cpu_seconds", round(self.cpu_seconds + cpu, 1))
+                if self.max_rss_mb and rss_mb > self.max_rss_mb:
+                    return f"{rss_mb:.0f} MB RSS"
+        return None
+
+    def _fill_spares(self):
+        """Start spare browsers on a background thread until the pool is full."""
+        with self._spare_lock:
+            if self._filling or self._closed or len(self._spare_drivers) >= self.spares:
+                return
+            self._filling = True
+
+        def fill():
+            try:
+                while True:
+                    with self._spare_lock:
+                        if self._closed or len(self._spare_drivers) >= self.spares:
+                            return
+                    driver = self._factory(proxy_pool.proxy_of(self._driver))
+                    with self._spare_lock:
+                        if not self._closed:
+                            self._spare_drivers.append(driver)
+                            continue
+                    driver.quit()
+            except Exception as e:
+                # A spare that cannot start must not take the run down
+                logger.warning(f"Could not start a spare {self.site} browser: {e}")
+            finally:
+                with self._spare_lock:
+                    self._filling = False
+
+        threading.Thread(target=fill, name=f"{self.site}-spare-browsers", daemon=True).start()
+
+    def _next_driver(self, proxy):
+        with self._spare_lock:
+            # A spare started before the proxy changed would carry the cookies to another IP
+            spares = [spare for spare in self._spare_drivers if proxy_pool.proxy_of(spare) == proxy]
+            driver = spares[0] if spares else None
+            if driver is not None:
+                self._spare_drivers.remove(driver)
+        if driver is None:
+            driver = self._factory(proxy)
+        else:
+            logger.info(f"Using a spare {self.site} browser")
+        self._fill_spares()
+        return driver
+
+    def _replace(self, cookies, url):
+        self._driver = self._next_driver(proxy_pool.proxy_of(self._driver))
+        if cookies and url:
+            try:
+                inject_cookies(self._driver, cookies, _origin(url))
+            except Exception as e:
+                logger.warning(f"Could not restore cookies in the new {self.site} browser: {e}")
+        fingerprint.restore(self)
+        self.navigations = 0
+
+    def recycle(self, url, reason="requested"):
+        """Quit the browser and start a fresh one with the same cookies."""
+        logger.info(f"Recycling {self.site} browser after {reason}")
+        try:
+            cookies = export_cookies(self._driver)
+        except Exception as e:
+            logger.warning(f"Could not copy cookies from the old {self.site} browser, using the last snapshot: {e}")
+            cookies = self._cookies
+        usage = browser_usage(self._driver)
+        if usage:
+            self.cpu_seconds += usage[1]
+        try:
+            self._driver.quit()
+        except Exception as e:
+            logger.debug(f"Error quitting the old browser: {e}")
+        self._replace(cookies, url)
+        run_report.incr("driver_recycles")
+
+    def _recover(self, error) -> bool:
+        """Recover from a closed tab or a dead browser; return True if the driver can be used again."""
+        return self._switch_to_live_window(error) or self._check_crash(error)
+
+    def _switch_to_live_window(self, error) -> bool:
+        """Switch to a remaining tab if `error` says the current one was closed; return True if it did."""
+        if not is_closed_window(error) or self._closed:
+            return False
+        driver = self._driver
+        try:
+            handles = driver.window_handles
+            if handles:
+                driver.switch_to.window(handles[0])
+            else:
+                driver.switch_to.new_window("tab")
+            # The DevTools connection is bound to the closed tab
+            retarget = getattr(driver, "retarget", None)
+            if retarget:
+                retarget()
+        except Exception as e:
+            logger.warning(f"Could not switch to another {self.site} tab after {error.__class__.__name__}: {e}")
+            return False
+        fingerprint.restore(self)
+        logger.warning(f"{self.site} tab was closed, switched to a remaining one")
+        run_report.incr("driver_window_recoveries")
+        return True
+
+    def _check_crash(self, error) -> bool:
+        """Replace the browser if `error` shows it has died; return True if it was replaced."""
+        if not is_dead_session(error) or self._closed:
+            return False
+        if self.recoveries >= self.max_recoveries:
+            logger.error(f"{self.site} browser died again after {self.recoveries} recoveries, giving up")
+            return False
+        self.recoveries += 1
+        logger.warning(f"{self.site} browser died ({error.__class__.__name__}), starting a replacement")
+        try:
+            self._driver.quit()
+        except Exception as e:
+            logger.debug(f"Error cleaning up the dead browser: {e}")
+        self._replace(self._cookies, self._last_url)
+        run_report.incr("driver_crash_recoveries")
+        return True
+
+    def discard_spares(self):
+        """Quit the spare browsers and stop starting new ones."""
+        with self._spare_lock:
+            self._closed = True
+            spares, self._spare_drivers = self._spare_drivers, []
+        for driver in spares:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.debug(f"Error quitting a spare browser: {e}")
+
+    def quit(self):
+        """Quit the current browser and any spares."""
+        self.discard_spares()
+        self._driver.quit()
+
+
+def supervise(factory, site, driver=None):
+    """Wrap a driver factory in a SupervisedDriver configured from SCRAPER_* settings."""
+    spares = env_int("SCRAPER_SPARE_DRIVERS", 0)
+    if spares and env_bool("SCRAPER_BROWSER_PROFILES"):
+        logger.warning("Spare browsers cannot share the managed browser profile, not starting any")
+        spares = 0
+    return SupervisedDriver(
+        factory,
+        site,
+        driver,
+        env_int("SCRAPER_RECYCLE_NAVIGATIONS", 0),
+        env_int("SCRAPER_RECYCLE_RSS_MB", 2048),
+        env_int("SCRAPER_WATCHDOG_EVERY", 10),
+        spares,
+        env_int("SCRAPER_MAX_CRASH_RECOVERIES", 5),
+    )
@@ -0,0 +1,269 @@
+"""Columnar (Parquet / Arrow IPC) export of scraped products.
+
+Rows are read from the SQLite product store in batches and written as typed
+record batches into a Hive-style layout partitioned by site and scrape date:
+
+    <out_dir>/site=<site>/scrape_date=<YYYY-MM-DD>/part-<run>.<parquet|arrow>
+
+Scrapers export the products of the current run when SCRAPER_EXPORT_FORMAT
+is set to "parquet" or "arrow" (SCRAPER_EXPORT_DIR, default "exports").
+Whole databases can be exported from the command line:
+
+    python -m scraper_utils.export --db products.db --format parquet --out exports
+
+pyarrow is only needed when an export is requested.
+"""
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+from .config import env_int, env_str
+from .product_store import price_value
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+
+# (column name, kind); kind selects the Arrow type in arrow_schema().
+COLUMNS = [
+    ("url", "string"),
+    ("title", "string"),
+    ("currency", "category"),
+    ("exact_price", "float"),
+    ("price_text", "string"),
+    ("description", "string"),
+    ("min_order", "string"),
+    ("supplier", "string"),
+    ("origin", "string"),
+    ("feedback_rating", "float"),
+    ("feedback_review", "int"),
+    ("image_url", "string"),
+    ("images", "list"),
+    ("videos", "list"),
+    ("specifications", "map"),
+    ("dimensions", "string"),
+    ("website_name", "category"),
+    ("discount_information", "string"),
+    ("brand_name", "string"),
+    ("keyword", "category"),
+    ("scraped_at", "timestamp"),
+]
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError as e:
+        raise RuntimeError("Columnar export requires pyarrow (pip install pyarrow)") from e
+
+
+def arrow_schema(pa):
+    """Build the Arrow schema used for exported products."""
+    types = {
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "float": pa.float64(),
+        "int": pa.int64(),
+        "list": pa.list_(pa.string()),
+        "map": pa.map_(pa.string(), pa.string()),
+        "timestamp": pa.timestamp("s", tz="UTC"),
+    }
+    return pa.schema([pa.field(name, types[kind]) for name, kind in COLUMNS])
+
+
+def _text(value):
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def _int_value(value):
+    if value is None:
+        return None
+    match = re.search(r'\d[\d,]*', str(value))
+    return int(match.group(0).replace(",", "")) if match else None
+
+
+def _str_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value if v]
+
+
+def flatten_product(product, keyword, scraped_at):
+    """Flatten a scraped product record into typed column values."""
+    feedback = product.get("feedback") or {}
+    specifications = product.get("specifications") or {}
+    price_text = _text(product.get("exact_price"))
+    return {
+        "url": _text(product.get("url")),
+        "title": _text(product.get("title")),
+        "currency": _text(product.get("currency")),
+        "exact_price": price_value(price_text),
+        "price_text": price_text,
+        "description": _text(product.get("description")),
+        "min_order": _text(product.get("min_order")),
+        "supplier": _text(product.get("supplier")),
+        "origin": _text(product.get("origin")),
+        "feedback_rating": price_value(feedback.get("rating")),
+        "feedback_review": _int_value(feedback.get("review")),
+        "image_url": _text(product.get("image_url")),
+        "images": _str_list(product.get("images")),
+        "videos": _str_list(product.get("videos")),
+        "specifications": [(str(k), str(v)) for k, v in specifications.items()],
+        "dimensions": _text(product.get("dimensions")),
+        "website_name": _text(product.get("website_name")),
+        "discount_information": _text(product.get("discount_information")),
+        "brand_name": _text(product.get("brand_name")),
+        "keyword": _text(keyword),
+        "scraped_at": scraped_at,
+    }
+
+
+class ColumnarWriter:
+    def __init__(self, out_dir: str, fmt: str = "parquet", batch_size: int = 1000):
+        """Prepare a partitioned writer; files are opened lazily per partition."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}. Use one of: {', '.join(FORMATS)}")
+        self.pa = _require_pyarrow()
+        self.schema = arrow_schema(self.pa)
+        self.out_dir = Path(out_dir)
+        self.fmt = fmt
+        self.batch_size = max(1, batch_size)
+        self.run_tag = time.strftime("%Y%m%dT%H%M%S")
+        self.rows_written = 0
+        self._buffers = {}
+        self._writers = {}
+
+    def write(self, row: dict, site: str):
+        """Buffer a flattened row, writing a record batch when its partition fills up."""
+        scrape_date = row["scraped_at"].strftime("%Y-%m-%d") if row["scraped_at"] else "unknown"
+        key = (site, scrape_date)
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self._write_batch(key)
+
+    def _writer_for(self, key):
+        if key in self._writers:
+            return self._writers[key]
+        site, scrape_date = key
+        partition = self.out_dir / f"site={site}" / f"scrape_date={scrape_date}"
+        partition.mkdir(parents=True, exist_ok=True)
+        path = partition / f"part-{self.run_tag}.{FORMATS[self.fmt]}"
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+        else:
+            writer = self.pa.ipc.new_file(str(path), self.schema)
+        self._writers[key] = writer
+        logger.info(f"Writing {self.fmt} partition {path}")
+        return writer
+
+    def _write_batch(self, key):
+        rows = self._buffers.get(key)
+        if not rows:
+            return
+        pa = self.pa
+        arrays = []
+        for field in self.schema:
+            values = [row[field.name] for row in rows]
+            if pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self._writer_for(key).write_batch(batch)
+        self.rows_written += len(rows)
+        self._buffers[key] = []
+
+    def close(self):
+        """Flush remaining rows and finalize every partition file."""
+        for key in list(self._buffers):
+            self._write_batch(key)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+def iter_store_rows(db_path, site=None, keyword=None, since=None, batch_size=1000):
+    """Yield (record, site, keyword, last_seen) from the product store in batches."""
+    query = "SELECT data, site, keyword, last_seen FROM products WHERE 1 = 1"
+    params = []
+    for column, value, op in (("site", site, "="), ("keyword", keyword, "="), ("last_seen", since, ">=")):
+        if value:
+            query += f" AND {column} {op} ?"
+            params.append(value)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for data, row_site, row_keyword, last_seen in rows:
+                yield json.loads(data), row_site, row_keyword, last_seen
+    finally:
+        conn.close()
+
+
+def export_store(db_path, out_dir, fmt="parquet", site=None, keyword=None, since=None, batch_size=1000):
+    """Export products from the SQLite store into partitioned columnar files."""
+    writer = ColumnarWriter(out_dir, fmt, batch_size)
+    try:
+        for record, row_site, row_keyword, last_seen in iter_store_rows(db_path, site, keyword, since, batch_size):
+            scraped_at = datetime.fromisoformat(last_seen) if last_seen else None
+            writer.write(flatten_product(record, row_keyword, scraped_at), row_site)
+    finally:
+        writer.close()
+    logger.info(f"Exported {writer.rows_written} products to {out_dir} as {fmt}")
+    return writer.rows_written
+
+
+def export_run(store):
+    """Export the products written by the current run if SCRAPER_EXPORT_FORMAT is set."""
+    fmt = env_str("SCRAPER_EXPORT_FORMAT")
+    if not fmt or store.conn is None:
+        return 0
+    store.flush()
+    try:
+        return export_store(
+            store.db_path,
+            env_str("SCRAPER_EXPORT_DIR", "exports"),
+            fmt.lower(),
+            site=store.site,
+            keyword=store.keyword,
+            since=store.run_started_at,
+            batch_size=env_int("SCRAPER_EXPORT_BATCH_SIZE", 1000),
+        )
+    except Exception as e:
+        logger.error(f"Error exporting products as {fmt}: {e}")
+        return 0
+
+
+def main():
+    """Command-line entry point for exporting an existing product store."""
+    parser = argparse.ArgumentParser(description="Export scraped products to Parquet or Arrow IPC")
+    parser.add_argument("--db", default=env_str("SCRAPER_DB_PATH", "products.db"), help="SQLite product store")
+    parser.add_argument("--out", default=env_str("SCRAPER_EXPORT_DIR", "exports"), help="Output directory")
+    parser.add_argument("--format", default="parquet", choices=sorted(FORMATS))
+    parser.add_argument("--site", help="Only export this site")
+    parser.add_argument("--keyword", help="Only export this keyword")
+    parser.add_argument("--since", help="Only export products seen at or after this ISO timestamp")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    count = export_store(args.db, args.out, args.format, args.site, args.keyword, args.since, args.batch_size)
+    print(json.dumps({"status": "completed", "exported": count, "out": args.out}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Retry policy for field extraction.
+
+Most extractions are lookups on a BeautifulSoup tree that has already been
+parsed. When such a lookup fails (AttributeError on a missing tag, IndexError,
+KeyError, ...) re-running it can never succeed, so it fails fast. Timed
+retries are kept for live-DOM calls, whose Selenium exceptions (stale or not
+yet rendered elements, timeouts) may go away while the page settles.
+"""
+import logging
+import random
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Return True for errors from the live browser DOM, which may succeed on retry."""
+    return isinstance(error, WebDriverException)
+
+
+def extract_with_retry(func, attempts=3, delay=1, default=None, jitter=0.0, allow_empty=False):
+    """Run an extraction, retrying with a delay only when the failure came from the live DOM.
+
+    Falsy results (or None when allow_empty is set) count as misses and are
+    re-tried without sleeping, as before.
+    """
+    for i in range(attempts):
+        try:
+            result = func()
+            found = result is not None if allow_empty else bool(result)
+            if found:
+                return result
+        except Exception as e:
+            remaining = attempts - 1 - i
+            if not is_retryable(e):
+                # A static tree gives the same answer every time; skip the remaining sleeps
+                if remaining:
+                    run_report.incr("extraction_sleeps_avoided", remaining)
+                    run_report.incr("extraction_sleep_seconds_avoided", remaining * delay)
+                logger.debug(f"Static extraction failed, not retrying: {e}")
+                return default
+            logger.warning(f"Retry {i+1}/{attempts} failed: {e}")
+            if remaining:
+                time.sleep(delay + random.uniform(0, jitter))
+    return default
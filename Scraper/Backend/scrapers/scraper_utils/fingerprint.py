@@ -0,0 +1,183 @@
+"""Browser fingerprint rotation over the DevTools protocol, without relaunching.
+
+A fingerprint is a consistent set of user agent (with matching client-hint
+metadata), Accept-Language, locale, timezone and viewport. It is applied to
+the running Chrome tab with CDP overrides, so switching to another one costs
+a few DevTools calls instead of a browser restart.
+
+With SCRAPER_FINGERPRINTS=1 each Chrome browser starts on a random
+fingerprint and rotates to a different one:
+
+    - every SCRAPER_FINGERPRINT_ROTATE_PAGES page loads (default 0, never),
+    - after a block or CAPTCHA, unless SCRAPER_FINGERPRINT_ROTATE_ON_BLOCK=0.
+
+throttled_get and PageRetry drive the policy, so scrapers only hand their
+driver to manage_fingerprint. Firefox has no CDP overrides and keeps its launch settings.
+"""
+import logging
+import random
+import weakref
+
+from .config import env_bool, env_int
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+CHROME_VERSION = "135.0.0.0"
+
+
+def _chrome(platform_token, ua_platform, platform_version, navigator_platform, brand="Google Chrome"):
+    major = CHROME_VERSION.split(".")[0]
+    product = f"Chrome/{CHROME_VERSION} Safari/537.36"
+    if brand == "Microsoft Edge":
+        product += f" Edg/{CHROME_VERSION}"
+    return {
+        "user_agent": f"Mozilla/5.0 ({platform_token}) AppleWebKit/537.36 (KHTML, like Gecko) {product}",
+        "platform": navigator_platform,
+        "metadata": {
+            "brands": [
+                {"brand": "Chromium", "version": major},
+                {"brand": brand, "version": major},
+                {"brand": "Not-A.Brand", "version": "99"},
+            ],
+            "fullVersion": CHROME_VERSION,
+            "platform": ua_platform,
+            "platformVersion": platform_version,
+            "architecture": "x86",
+            "model": "",
+            "mobile": False,
+        },
+    }
+
+
+BROWSERS = [
+    _chrome("Windows NT 10.0; Win64; x64", "Windows", "10.0.0", "Win32"),
+    _chrome("Windows NT 10.0; Win64; x64", "Windows", "15.0.0", "Win32", brand="Microsoft Edge"),
+    _chrome("Macintosh; Intel Mac OS X 10_15_7", "macOS", "14.4.0", "MacIntel"),
+    _chrome("X11; Linux x86_64", "Linux", "6.5.0", "Linux x86_64"),
+]
+
+LOCALES = [
+    {"locale": "en-US", "accept_language": "en-US,en;q=0.9", "timezone": "America/New_York"},
+    {"locale": "en-GB", "accept_language": "en-GB,en;q=0.9", "timezone": "Europe/London"},
+    {"locale": "en-IN", "accept_language": "en-IN,en;q=0.9,hi;q=0.8", "timezone": "Asia/Kolkata"},
+]
+
+VIEWPORTS = [(1920, 1080), (1536, 864), (1440, 900), (1366, 768), (1680, 1050)]
+
+
+def random_fingerprint(exclude=None) -> dict:
+    """Pick a random fingerprint, different from `exclude` when possible."""
+    for _ in range(10):
+        browser = random.choice(BROWSERS)
+        locale = random.choice(LOCALES)
+        width, height = random.choice(VIEWPORTS)
+        fingerprint = {**browser, **locale, "width": width, "height": height}
+        if not exclude or fingerprint["user_agent"] != exclude["user_agent"] or fingerprint["locale"] != exclude["locale"]:
+            return fingerprint
+    return fingerprint
+
+
+class FingerprintManager:
+    def __init__(self, driver, site: str, rotate_every: int = 0, rotate_on_block: bool = True):
+        """Manage the fingerprint of a running Chrome driver."""
+        # Weak, so the module's driver -> manager registry does not keep drivers alive
+        self._driver = weakref.ref(driver)
+        self.site = site
+        self.rotate_every = rotate_every
+        self.rotate_on_block = rotate_on_block
+        self.current = None
+        self.pages = 0
+
+    def apply(self, fingerprint: dict) -> bool:
+        """Apply a fingerprint to the current tab; return False if the browser rejected it."""
+        driver = self._driver()
+        if driver is None:
+            return False
+        cdp = driver.execute_cdp_cmd
+        try:
+            cdp("Network.setUserAgentOverride", {
+                "userAgent": fingerprint["user_agent"],
+                "acceptLanguage": fingerprint["accept_language"],
+                "platform": fingerprint["platform"],
+                "userAgentMetadata": fingerprint["metadata"],
+            })
+            cdp("Emulation.setDeviceMetricsOverride", {
+                "width": fingerprint["width"],
+                "height": fingerprint["height"],
+                "deviceScaleFactor": 1,
+                "mobile": False,
+            })
+            cdp("Emulation.setTimezoneOverride", {"timezoneId": fingerprint["timezone"]})
+        except Exception as e:
+            logger.warning(f"Failed to apply fingerprint: {e}")
+            return False
+        try:
+            # Chrome refuses to replace an active locale override, so clear it first
+            cdp("Emulation.setLocaleOverride", {})
+            cdp("Emulation.setLocaleOverride", {"locale": fingerprint["locale"]})
+        except Exception as e:
+            logger.debug(f"Could not override locale: {e}")
+        self.current = fingerprint
+        logger.debug(f"Using fingerprint {fingerprint['metadata']['platform']} / {fingerprint['locale']} / "
+                     f"{fingerprint['width']}x{fingerprint['height']}")
+        return True
+
+    def rotate(self, reason="policy"):
+        """Switch the running tab to a different fingerprint."""
+        if self.apply(random_fingerprint(exclude=self.current)):
+            self.pages = 0
+            run_report.incr("fingerprint_rotations")
+            logger.info(f"Rotated {self.site} fingerprint ({reason})")
+
+    def before_page(self):
+        """Count a page load, rotating first if the policy says so."""
+        if self.rotate_every and self.pages >= self.rotate_every:
+            self.rotate()
+        self.pages += 1
+
+    def after_block(self):
+        """Rotate after a block or CAPTCHA, if enabled."""
+        if self.rotate_on_block:
+            self.rotate("block")
+
+
+_managers = weakref.WeakKeyDictionary()
+
+
+def manage_fingerprint(driver, site, rotate_every=None, enabled=None):
+    """Start managing a driver's fingerprint; returns the manager, or None for Firefox or when disabled."""
+    if enabled is None:
+        enabled = env_bool("SCRAPER_FINGERPRINTS")
+    if not enabled or not hasattr(driver, "execute_cdp_cmd"):
+        return None
+    manager = FingerprintManager(
+        driver,
+        site,
+        env_int("SCRAPER_FINGERPRINT_ROTATE_PAGES", 0) if rotate_every is None else rotate_every,
+        env_bool("SCRAPER_FINGERPRINT_ROTATE_ON_BLOCK", True),
+    )
+    manager.apply(random_fingerprint())
+    _managers[driver] = manager
+    return manager
+
+
+def before_page(driver):
+    """Hook for page loads: apply the per-N-pages rotation policy of a registered driver."""
+    manager = _managers.get(driver)
+    if manager:
+        manager.before_page()
+
+
+def after_block(driver):
+    """Hook for blocks and CAPTCHAs: rotate a registered driver's fingerprint."""
+    manager = _managers.get(driver)
+    if manager:
+        manager.after_block()
+
+
+def restore(driver):
+    """Hook for replaced browsers: re-apply a registered driver's current fingerprint."""
+    manager = _managers.get(driver)
+    if manager and manager.current:
+        manager.apply(manager.current)
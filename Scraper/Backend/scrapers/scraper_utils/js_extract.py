@@ -0,0 +1,251 @@
+"""In-browser batch extraction: one execute_script call per page.
+
+The WebDriver path crosses the browser boundary once per element: a
+find_elements per scroll step, an outerHTML per card, and a click plus
+several lookups per thumbnail. In this mode a single JavaScript function
+walks the DOM in the browser and returns a compact JSON array with every
+field of every card (or of the page itself, for product pages).
+
+A spec names the card selectors and, for each field, the selectors to try
+in order and what to read from the first match:
+
+    {"cards": ["div.card", "li.listing-item"],
+     "fields": {"title": {"selectors": ["div.producttitle", "h2"]},
+                "url": {"selectors": ["a.product-title", "a[href]"], "attr": "href", "match": "^/"},
+                "images": {"selectors": ["img"], "attr": ["src", "data-src"], "all": True}}}
+
+"attr" is "text" (the default), an attribute name, a ".property" of the
+DOM element (e.g. ".naturalWidth"), or a list of these tried in order;
+"match" is a regular expression the value must match.
+Every returned field also names the selector that produced it, so selector
+drift shows up in the logs.
+
+Turn the mode on per site with SCRAPER_JS_EXTRACT, e.g.
+"indiamart,amazon" or "all". Compare it with the WebDriver path on a live
+page with
+
+    python -m scraper_utils.js_extract <site> <url> [repeat]
+"""
+import json
+import logging
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+
+from .config import env_sites
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_JS = r"""
+const spec = arguments[0];
+function query(root, selector) {
+    try {
+        return Array.from(root.querySelectorAll(selector));
+    } catch (e) {
+        return [];  // selectors the browser does not support are skipped
+    }
+}
+function read(el, attrs, match) {
+    for (const attr of attrs) {
+        let value;
+        if (attr === 'text') value = el.textContent.replace(/\s+/g, ' ').trim();
+        else if (attr.startsWith('.')) value = el[attr.slice(1)];
+        else value = el.getAttribute(attr);
+        if (value === null || value === undefined || value === '') continue;
+        if (match && !new RegExp(match).test(String(value))) continue;
+        return value;
+    }
+    return null;
+}
+function extract(root, field) {
+    const attrs = [].concat(field.attr || 'text');
+    for (const selector of field.selectors) {
+        const els = query(root, selector);
+        if (field.all) {
+            const values = els.map(el => read(el, attrs, field.match)).filter(v => v !== null);
+            if (values.length) return [values, selector];
+        } else {
+            for (const el of els) {
+                const value = read(el, attrs, field.match);
+                if (value !== null) return [value, selector];
+            }
+        }
+    }
+    return null;
+}
+let roots = [document];
+if (spec.cards) {
+    roots = [];
+    for (const selector of spec.cards) {
+        const found = query(document, selector);
+        if (found.length) { roots = found; break; }
+    }
+}
+return roots.map(root => {
+    const record = {};
+    for (const [name, field] of Object.entries(spec.fields)) {
+        const result = extract(root, field);
+        if (result) record[name] = result;
+    }
+    return record;
+});
+"""
+
+SPECS = {
+    # Search result cards, with the selectors extract_product_data in indiamart.py uses
+    "indiamart": {
+        "cards": ["div.card", "div.product-card", "div.listing", 'div[class*="product"]', "li.listing-item"],
+        "fields": {
+            "title": {"selectors": ["div.producttitle", "div.titleAskPriceImageNavigation a", "a.product-title",
+                                    "h2.product-name"]},
+            "url": {"selectors": ["div.titleAskPriceImageNavigation a", "a.product-title", "a.cardlinks", "a[href]"],
+                    "attr": "href", "match": r"indiamart\.com|^/"},
+            "price": {"selectors": ["p.price", "div.price", "span.price", 'p[class*="price"]', 'div[class*="price"]',
+                                    'span[class*="price"]', '*[class*="price"]', "div.mprice", "span.mrp"]},
+            "description": {"selectors": ["div.description", "p.description", "div.prod-desc", 'p[class*="desc"]']},
+            "min_order": {"selectors": ["span.unit", "div.moq", '*[class*="moq"]', '*[class*="min-order"]']},
+            "supplier": {"selectors": ["div.companyname a", "div.companyname", "p.company-name", '*[class*="company"]']},
+            "origin": {"selectors": ["span.origin", 'div[class*="origin"]', 'p[class*="origin"]']},
+            "rating": {"selectors": ["div.rating", "span.rating", '*[class*="rating"]']},
+            "reviews": {"selectors": ["span.reviews", '*[class*="review"]']},
+            "images": {"selectors": ['img[class*="product-img"]', 'img[class*="image"]', 'img[src*="product"]',
+                                     "img[src]", "img"],
+                       "attr": ["src", "data-src"], "match": "^(?!data:)", "all": True},
+            "image_width": {"selectors": ['img[class*="product-img"]', 'img[class*="image"]', 'img[src*="product"]',
+                                          "img[src]"], "attr": ".naturalWidth"},
+            "image_height": {"selectors": ['img[class*="product-img"]', 'img[class*="image"]', 'img[src*="product"]',
+                                           "img[src]"], "attr": ".naturalHeight"},
+            "videos": {"selectors": ["video source", "video[src]"], "attr": "src", "all": True},
+            "discount": {"selectors": ["span.discount", 'div[class*="discount"]', 'p[class*="discount"]']},
+        },
+    },
+    # Product page gallery: every thumbnail instead of clicking through them one by one
+    "amazon": {
+        "fields": {
+            "images": {"selectors": ["#altImages li.imageThumbnail img"], "attr": "src", "all": True},
+            "main_image": {"selectors": ["#landingImage", "#imgTagWrapperId img"], "attr": ["data-old-hires", "src"]},
+        },
+    },
+}
+
+
+def enabled(site) -> bool:
+    """Return True if SCRAPER_JS_EXTRACT turns in-browser extraction on for a site."""
+    return env_sites("SCRAPER_JS_EXTRACT", site)
+
+
+def extract(driver, spec) -> list:
+    """Run a spec in the browser in one round trip; return a {"fields", "selectors"} record per card."""
+    records = driver.execute_script(EXTRACT_JS, spec) or []
+    run_report.incr("js_extract_calls")
+    run_report.incr("js_extract_records", len(records))
+    records = [
+        {"fields": {name: value for name, (value, _) in record.items()},
+         "selectors": {name: selector for name, (_, selector) in record.items()}}
+        for record in records
+    ]
+    used = sorted({f"{name}={selector}" for record in records for name, selector in record["selectors"].items()})
+    logger.debug(f"Extracted {len(records)} records in one call using {', '.join(used)}")
+    return records
+
+
+def extract_page(driver, spec) -> dict:
+    """Run a spec without card selectors and return the page's single record."""
+    records = extract(driver, spec)
+    return records[0] if records else {"fields": {}, "selectors": {}}
+
+
+def webdriver_extract(driver, spec) -> list:
+    """Extract the same records the WebDriver way (element handles, outerHTML and BeautifulSoup), for comparison."""
+    roots = [None]
+    if spec.get("cards"):
+        roots = []
+        for selector in spec["cards"]:
+            roots = driver.find_elements(By.CSS_SELECTOR, selector)
+            if roots:
+                break
+    records = []
+    for root in roots:
+        html = root.get_attribute("outerHTML") if root is not None else driver.page_source
+        soup = BeautifulSoup(html, "html.parser")
+        record = {"fields": {}, "selectors": {}}
+        for name, field in spec["fields"].items():
+            attrs = field.get("attr", "text")
+            attrs = [attrs] if isinstance(attrs, str) else attrs
+            for selector in field["selectors"]:
+                try:
+                    els = soup.select(selector)
+                except Exception:
+                    continue
+                values = []
+                for el in els:
+                    for attr in attrs:
+                        if attr.startswith("."):
+                            # Rendered properties only exist in the live DOM: one more round trip per element
+                            found = (root or driver).find_elements(By.CSS_SELECTOR, selector)
+                            value = found[0].get_property(attr[1:]) if found else None
+                        elif attr == "text":
+                            value = " ".join(el.get_text().split())
+                        else:
+                            value = el.get(attr)
+                        if value and (not field.get("match") or re.search(field["match"], str(value))):
+                            values.append(value)
+                            break
+                    if values and not field.get("all"):
+                        break
+                if values:
+                    record["fields"][name] = values if field.get("all") else values[0]
+                    record["selectors"][name] = selector
+                    break
+        records.append(record)
+    return records
+
+
+def benchmark(driver, spec, repeat=3) -> dict:
+    """Time the in-browser and WebDriver extraction paths on the page the driver has loaded."""
+    timings = {}
+    results = {}
+    for name, func in (("webdriver", webdriver_extract), ("js", extract)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            results[name] = func(driver, spec)
+        timings[name] = (time.perf_counter() - started) / repeat
+    fields = sum(len(r["fields"]) for r in results["js"])
+    differing = sum(
+        1 for js, wd in zip(results["js"], results["webdriver"]) for field in js["fields"]
+        if js["fields"][field] != wd["fields"].get(field)
+    )
+    return {
+        "records": len(results["js"]),
+        "fields": fields,
+        "webdriver_seconds": round(timings["webdriver"], 3),
+        "js_seconds": round(timings["js"], 3),
+        "speedup": round(timings["webdriver"] / timings["js"], 1) if timings["js"] else None,
+        "differing_fields": differing,
+    }
+
+
+def main():
+    """Load a page in headless Chrome and compare both extraction paths on it."""
+    if len(sys.argv) < 3 or sys.argv[1] not in SPECS:
+        print(f"Usage: python -m scraper_utils.js_extract <{'|'.join(SPECS)}> <url> [repeat]")
+        sys.exit(1)
+    site, url = sys.argv[1], sys.argv[2]
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.get(url)
+        print(json.dumps({"site": site, "url": url, **benchmark(driver, SPECS[site], repeat)}, indent=2))
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Cross-process file locks for state shared through SCRAPER_STATE_DIR."""
+import os
+import time
+
+LOCK_TIMEOUT = 10
+# A lock file older than this was left behind by a crashed process
+STALE_LOCK_AGE = 60
+
+
+class FileLock:
+    def __init__(self, path):
+        """Create an exclusive lock backed by a lock file next to `path`."""
+        self.path = f"{path}.lock"
+
+    def __enter__(self):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > STALE_LOCK_AGE:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out waiting for {self.path}")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,197 @@
+"""Listing capture from the browser's JSON API responses instead of the DOM.
+
+Alibaba and Flipkart fill their search results from background JSON calls,
+and the DOM path scrolls and sleeps just to let those calls render. With
+SCRAPER_NET_CAPTURE (a comma-separated list of sites, or "all") the
+scraper enables Chrome's performance log, and a NetworkCapture watches the
+DevTools Network events of the page. It fetches the bodies of JSON
+responses whose URL matches the site's listing API and turns them directly
+into listing records.
+
+A site's shape names the item fields as dotted paths, tried in order:
+
+    {"url": r"/api/\\d+/page/fetch",
+     "fields": {"title": ["productInfo.value.titles.title"], "price": ["productInfo.value.pricing.finalPrice.value"]},
+     "required": ["title", "url"]}
+
+Every list of objects in a matching response is checked against the shape.
+The list with the most items that have all required fields wins. When no
+response matches, the capture returns nothing and the scraper falls back
+to DOM parsing. These runs are counted as net_capture_fallbacks.
+"""
+import base64
+import json
+import logging
+import re
+
+from . import perf_log
+from .config import env_sites
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+# Anti-JSON-hijacking prefixes some APIs put in front of their payload
+XSSI_PREFIXES = (")]}'", "for(;;);", "while(1);")
+
+SHAPES = {
+    # Flipkart's page API: slots[].widget.data.products[].productInfo.value
+    "flipkart": {
+        "url": r"flipkart\.com/api/\d+/page/fetch|flipkart\.com/api/\d+/search",
+        "fields": {
+            "title": ["productInfo.value.titles.title", "titles.title"],
+            "url": ["productInfo.value.baseUrl", "productInfo.value.smartUrl", "baseUrl", "smartUrl"],
+            "price": ["productInfo.value.pricing.finalPrice.value", "pricing.finalPrice.value"],
+            "currency": ["productInfo.value.pricing.finalPrice.currency", "pricing.finalPrice.currency"],
+            "image": ["productInfo.value.media.images.0.url", "media.images.0.url"],
+            "rating": ["productInfo.value.rating.average", "rating.average"],
+            "reviews": ["productInfo.value.rating.count", "rating.count"],
+            "brand": ["productInfo.value.productBrand", "productBrand"],
+        },
+        "required": ["title", "url"],
+    },
+    # Alibaba's search API offer lists
+    "alibaba": {
+        "url": r"alibaba\.com/.*(search|offer).*",
+        "fields": {
+            "title": ["information.puretitle", "information.title", "title", "subject"],
+            "url": ["information.productUrl", "productUrl", "detailUrl"],
+            "price": ["tradePrice.price", "promotionPrice", "price"],
+            "min_order": ["tradePrice.minOrder", "moq", "minOrder"],
+            "supplier": ["supplier.supplierName", "companyName", "supplierName"],
+            "image": ["image.mainImage", "mainImage", "imageUrl"],
+            "images": ["image.productImages", "multiImage", "images"],
+            "rating": ["reviews.productScore", "productScore"],
+            "reviews": ["reviews.productReviewCount", "productReviewCount"],
+        },
+        "required": ["title", "url"],
+    },
+}
+
+
+def enabled(site) -> bool:
+    """Return True if SCRAPER_NET_CAPTURE turns network capture on for a site."""
+    return env_sites("SCRAPER_NET_CAPTURE", site)
+
+
+def prepare(chrome_options, site):
+    """Enable the performance log a NetworkCapture needs, if capture is on for the site."""
+    if enabled(site):
+        perf_log.enable(chrome_options)
+    return chrome_options
+
+
+def resolve(item, path):
+    """Follow a dotted path ("a.b.0.c") into nested dicts and lists; return None if it is missing."""
+    value = item
+    for key in path.split("."):
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            return None
+    return value
+
+
+def match_items(payload, shape) -> list:
+    """Return the records of the list in `payload` that best matches the shape, or [] if none does."""
+    best = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+            records = []
+            for item in node:
+                if not isinstance(item, dict):
+                    continue
+                record = {}
+                for field, paths in shape["fields"].items():
+                    for path in paths:
+                        value = resolve(item, path)
+                        if value not in (None, "", []):
+                            record[field] = value
+                            break
+                if all(field in record for field in shape["required"]):
+                    records.append(record)
+            if len(records) > len(best):
+                best = records
+    return best
+
+
+def parse_body(body: str):
+    """Parse a response body as JSON, stripping anti-hijacking prefixes; None if it is not JSON."""
+    body = body.lstrip()
+    for prefix in XSSI_PREFIXES:
+        if body.startswith(prefix):
+            body = body[len(prefix):]
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class NetworkCapture:
+    def __init__(self, driver, site: str, shape: dict):
+        """Watch a Chrome driver's Network events for responses from the site's listing API."""
+        self.driver = driver
+        self.site = site
+        self.shape = shape
+        self.pattern = re.compile(shape["url"])
+        self.pending = {}
+        self.finished = []
+        perf_log.subscribe(driver, "Network.responseReceived", self.on_response)
+        perf_log.subscribe(driver, "Network.loadingFinished", self.on_finished)
+
+    def on_response(self, params):
+        response = params.get("response", {})
+        if "json" in response.get("mimeType", "") and self.pattern.search(response.get("url", "")):
+            self.pending[params.get("requestId")] = response["url"]
+
+    def on_finished(self, params):
+        url = self.pending.pop(params.get("requestId"), None)
+        if url:
+            self.finished.append((params["requestId"], url))
+
+    def reset(self):
+        """Forget responses seen so far; call before loading the next page."""
+        perf_log.pump(self.driver)
+        self.pending.clear()
+        self.finished.clear()
+
+    def listings(self) -> list:
+        """Return the listing records from API responses since the last call; [] means use the DOM."""
+        perf_log.pump(self.driver)
+        finished, self.finished = self.finished, []
+        records = []
+        for request_id, url in finished:
+            try:
+                result = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            except Exception as e:
+                logger.debug(f"Could not read response body of {url}: {e}")
+                continue
+            body = result.get("body", "")
+            if result.get("base64Encoded"):
+                body = base64.b64decode(body).decode("utf-8", errors="replace")
+            payload = parse_body(body)
+            items = match_items(payload, self.shape) if payload is not None else []
+            run_report.incr("net_capture_responses")
+            if items:
+                logger.info(f"Captured {len(items)} {self.site} listings from {url}")
+                records.extend(items)
+            else:
+                logger.info(f"Response from {url} does not match the {self.site} listing shape")
+        if records:
+            run_report.incr("net_capture_listings", len(records))
+        else:
+            run_report.incr("net_capture_fallbacks")
+        return records
+
+
+def open_capture(driver, site):
+    """Start capturing a site's listing API responses, or return None when capture is off or unsupported."""
+    if not enabled(site) or site not in SHAPES or not hasattr(driver, "execute_cdp_cmd"):
+        return None
+    return NetworkCapture(driver, site, SHAPES[site])
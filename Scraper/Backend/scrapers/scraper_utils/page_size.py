@@ -0,0 +1,78 @@
+"""Larger search result pages: the same products in fewer page loads.
+
+Callers ask for `page_count` search pages. Some sites accept a page-size
+parameter, and for those a plan turns the page count into a product
+target: page_count times the site's default page size. The scraper then
+requests pages as large as the site allows, and only as many as it needs to
+reach that target. For example, 4 eBay pages of 60 become a single page
+of 240.
+
+SITES declares each site's parameter, its default size and the sizes it
+accepts. A site without an entry keeps its own page size and the page
+count as given. SCRAPER_PAGE_SIZE (or SCRAPER_PAGE_SIZE_<SITE>) caps the
+size that is requested; the largest accepted size at or below the cap is
+used. 0 disables larger pages.
+"""
+import logging
+import math
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .config import env_int
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+SITES = {
+    # /sch/i.html?_ipg=N; eBay shows 60 results unless asked for 120 or 240
+    "ebay": {"param": "_ipg", "default": 60, "sizes": (60, 120, 240)},
+    # Amazon, Flipkart, IndiaMART, Alibaba, DHgate and Made-in-China have no page-size parameter
+}
+
+
+def page_size(site):
+    """Return the page size to request from a site, or None to leave the site's default."""
+    spec = SITES.get(site)
+    if not spec:
+        return None
+    cap = env_int(f"SCRAPER_PAGE_SIZE_{site.upper()}", env_int("SCRAPER_PAGE_SIZE", max(spec["sizes"])))
+    sizes = [size for size in spec["sizes"] if size <= cap]
+    if not sizes or max(sizes) <= spec["default"]:
+        return None
+    return max(sizes)
+
+
+class PagePlan:
+    def __init__(self, site: str, page_count: int):
+        """Work out how many pages of which size cover `page_count` default-sized pages of a site."""
+        self.site = site
+        self.page_count = page_count
+        self.per_page = page_size(site)
+        if self.per_page:
+            self.target = page_count * SITES[site]["default"]
+            self.pages = max(1, math.ceil(self.target / self.per_page))
+        else:
+            self.target = None
+            self.pages = page_count
+        run_report.set(f"page_plan_{site}", {"pages": self.pages, "per_page": self.per_page, "target": self.target})
+        if self.per_page:
+            logger.info(f"Requesting {self.pages} {site} pages of {self.per_page} instead of {page_count} "
+                        f"(target {self.target} products)")
+
+    def apply(self, url: str) -> str:
+        """Add the page-size parameter to a search URL."""
+        if not self.per_page:
+            return url
+        parts = urlsplit(url)
+        param = SITES[self.site]["param"]
+        query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != param]
+        query.append((param, str(self.per_page)))
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def reached(self, products: int) -> bool:
+        """Return True once `products` result cards cover what the original page count would have."""
+        return self.target is not None and products >= self.target
+
+
+def plan(site, page_count) -> PagePlan:
+    """Return the page plan for scraping `page_count` search pages of a site."""
+    return PagePlan(site, page_count)
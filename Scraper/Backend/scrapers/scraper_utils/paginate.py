@@ -0,0 +1,183 @@
+"""Concurrent search-page pagination in background tabs.
+
+Search result URLs are deterministic per page, but the scrapers fetched
+them one after another, each waiting for the previous page's detail
+fetches. With SCRAPER_SEARCH_CONCURRENCY (or
+SCRAPER_SEARCH_CONCURRENCY_<SITE>) set to N > 1, a SearchPager keeps the
+next N - 1 search pages loading in background tabs of the same browser
+while the scraper works on the current one. When the scraper moves on to a
+prefetched page, that tab becomes the working tab and the old one is
+closed. Pages are still processed, merged and deduplicated in page order.
+
+Prefetches go through the domain's rate limiter like any other page load.
+Each new tab gets the driver's current fingerprint (and the site's
+`on_open` setup, e.g. stealth scripts) before it navigates. After each
+page the scraper calls finish(), saying whether the page was actually
+parsed. A parsed page that returned no cards, or only cards already seen on
+earlier pages, stops the pagination: sites past their last results page
+return nothing or repeat it. No further pages are requested and open tabs
+are closed. A page whose attempts all failed says nothing about the results
+and never stops the pagination.
+
+Tabs need DevTools (Page.navigate on the new tab), so browsers without it
+and a concurrency of 1 (the default) load each page in place, as before.
+"""
+import logging
+
+from selenium.common.exceptions import NoSuchWindowException, WebDriverException
+
+from . import fingerprint, perf_log, proxy_pool, rate_limit, readiness
+from .config import env_int
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+# The prefetched document's start and response times, for readiness and the rate limiter;
+# nothing while the tab still shows the blank page it opened with
+NAVIGATION_TIMING_JS = """
+if (location.href === 'about:blank') return [null, null];
+const nav = performance.getEntriesByType('navigation')[0];
+return [performance.timeOrigin, nav ? nav.responseEnd : null];
+"""
+
+
+def search_concurrency(site) -> int:
+    """Return how many search pages may load at once for a site (1 means one after another)."""
+    return max(1, env_int(f"SCRAPER_SEARCH_CONCURRENCY_{site.upper()}", env_int("SCRAPER_SEARCH_CONCURRENCY", 1)))
+
+
+class SearchPager:
+    def __init__(self, driver, site: str, url_for, last_page: int, product_index, on_open=None, concurrency=None):
+        """Page through `url_for(page)` up to `last_page`, prefetching ahead in background tabs.
+
+        `on_open(driver)` prepares each new tab before it navigates; `concurrency` overrides the configured one.
+        """
+        self.driver = driver
+        self.site = site
+        self.url_for = url_for
+        self.last_page = last_page
+        self.product_index = product_index
+        self.on_open = on_open
+        self.concurrency = (concurrency or search_concurrency(site)) if hasattr(driver, "execute_cdp_cmd") else 1
+        self.exhausted = False
+        self._tabs = {}
+        self._loaded = set()
+        self._cards = set()
+        self._new_cards = 0
+
+    def load(self, page):
+        """Make `page` the working tab's page, switching to its prefetched tab if it has one."""
+        url = self.url_for(page)
+        handle = self._tabs.pop(page, None)
+        if handle is None or not self._switch_to(handle, url):
+            rate_limit.throttled_get(self.driver, url)
+        self._loaded.add(page)
+        self._prefetch(page)
+
+    def _retarget(self):
+        # The DevTools backend is bound to one tab; point it at the one WebDriver switched to
+        retarget = getattr(self.driver, "retarget", None)
+        if retarget:
+            retarget()
+
+    def _switch_to(self, handle, url) -> bool:
+        driver = self.driver
+        try:
+            # A recycled or replaced browser has none of the old tabs
+            if handle not in driver.window_handles:
+                raise NoSuchWindowException(f"tab {handle} is gone")
+            driver.close()
+            driver.switch_to.window(handle)
+            self._retarget()
+            fingerprint.restore(driver)
+            time_origin, response_end = driver.execute_script(NAVIGATION_TIMING_JS)
+            readiness.mark_navigation(driver, at=time_origin)
+            blocked = rate_limit.looks_blocked(driver.title)
+        except WebDriverException as e:
+            logger.warning(f"Could not switch to the prefetched tab for {url}, loading it again: {e}")
+            self._close_tabs()
+            try:
+                driver.switch_to.window(driver.window_handles[0])
+                self._retarget()
+            except (WebDriverException, IndexError):
+                pass
+            return False
+        latency = response_end / 1000 if response_end else None
+        rate_limit.limiter_for(url).record(latency, blocked)
+        proxy_pool.record_page(driver, not blocked, latency)
+        perf_log.pump(driver)
+        run_report.set("rate_limits", rate_limit.snapshot())
+        run_report.incr("search_pages_prefetched")
+        logger.info(f"Using prefetched {self.site} search page {url}")
+        return True
+
+    def _prefetch(self, page):
+        if self.concurrency < 2 or self.exhausted:
+            return
+        driver = self.driver
+        last = min(self.last_page, page + self.concurrency - 1)
+        for ahead in range(page + 1, last + 1):
+            if ahead in self._tabs or ahead in self._loaded:
+                continue
+            url = self.url_for(ahead)
+            rate_limit.limiter_for(url).acquire()
+            try:
+                working = driver.current_window_handle
+                driver.switch_to.new_window("tab")
+                self._tabs[ahead] = driver.current_window_handle
+                try:
+                    fingerprint.before_page(driver)
+                    fingerprint.restore(driver)
+                    if self.on_open:
+                        self.on_open(driver)
+                    # Page.navigate returns once the response starts; the tab goes on loading in the background
+                    driver.execute_cdp_cmd("Page.navigate", {"url": url})
+                finally:
+                    driver.switch_to.window(working)
+            except WebDriverException as e:
+                logger.warning(f"Could not prefetch {self.site} search page {ahead}: {e}")
+                self._tabs.pop(ahead, None)
+                return
+            logger.info(f"Prefetching {self.site} search page {ahead} in a background tab")
+
+    def saw(self, url):
+        """Record a product card found on the current search page; a card without a URL counts as new."""
+        key = self.product_index.key(url) if url and url != "N/A" else None
+        if key is None or key not in self._cards:
+            self._cards.add(key)
+            self._new_cards += 1
+
+    def finish(self, page, processed=False) -> bool:
+        """Record that the scraper is done with a page; return True if it was parsed, had no new cards and paging should stop."""
+        new_cards, self._new_cards = self._new_cards, 0
+        if processed and new_cards == 0 and not self.exhausted:
+            logger.info(f"{self.site} search page {page} had no new products, not requesting further pages")
+            run_report.incr("search_pages_stopped_early", self.last_page - page)
+            self.exhausted = True
+            self.close()
+        return self.exhausted
+
+    def _close_tabs(self):
+        tabs, self._tabs = self._tabs, {}
+        if not tabs:
+            return
+        driver = self.driver
+        try:
+            working = driver.current_window_handle
+        except WebDriverException as e:
+            logger.debug(f"Could not close prefetch tabs: {e}")
+            return
+        for handle in tabs.values():
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except WebDriverException as e:
+                logger.debug(f"Could not close prefetch tab {handle}: {e}")
+        try:
+            driver.switch_to.window(working)
+        except WebDriverException as e:
+            logger.debug(f"Could not return to the working tab: {e}")
+
+    def close(self):
+        """Close the tabs of pages that were prefetched but will not be used."""
+        self._close_tabs()
@@ -0,0 +1,60 @@
+"""Shared reader for Chrome's performance log.
+
+Chrome reports DevTools events (network requests, responses, cache hits)
+through the "performance" log, and chromedriver hands out each entry only
+once. Several helpers need these events, so they subscribe to event methods
+here, and page loads pump the log and dispatch each event to every
+subscriber of its method.
+"""
+import json
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_subscribers = weakref.WeakKeyDictionary()
+
+
+def enable(chrome_options):
+    """Ask chromedriver to record DevTools events in the performance log."""
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return chrome_options
+
+
+def subscribe(driver, method, callback):
+    """Call `callback(params)` for every `method` event (e.g. "Network.responseReceived") of a driver."""
+    _subscribers.setdefault(driver, {}).setdefault(method, []).append(callback)
+
+
+def unsubscribe(driver, method, callback):
+    """Stop delivering `method` events to a callback."""
+    callbacks = _subscribers.get(driver, {}).get(method, [])
+    if callback in callbacks:
+        callbacks.remove(callback)
+
+
+def pump(driver):
+    """Read the pending performance log entries of a driver and dispatch them to subscribers."""
+    # Subscriptions are keyed by a SupervisedDriver (they survive its browser being replaced)
+    # or by the browser it currently runs
+    browser = getattr(driver, "wrapped_driver", driver)
+    keys = [driver] if browser is driver else [driver, browser]
+    subscriptions = [_subscribers[key] for key in keys if _subscribers.get(key)]
+    if not subscriptions:
+        return
+    try:
+        entries = browser.get_log("performance")
+    except Exception as e:
+        logger.debug(f"Could not read the performance log: {e}")
+        return
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        for subscribers in subscriptions:
+            for callback in subscribers.get(message.get("method"), ()):
+                try:
+                    callback(message.get("params", {}))
+                except Exception as e:
+                    logger.debug(f"Performance log subscriber failed on {message.get('method')}: {e}")
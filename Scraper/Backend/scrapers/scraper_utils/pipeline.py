@@ -0,0 +1,108 @@
+"""Overlapped fetch and parse: product pages are parsed while the browser loads the next one.
+
+Without a pool, navigation and parsing alternate: the browser sits idle
+while BeautifulSoup parses a large page, and the CPU sits idle while the
+browser loads. With SCRAPER_PARSE_WORKERS=N the scraper hands each page's
+HTML to a pool of N worker processes and goes on fetching. The parsed
+fields are merged back in fetch order.
+
+At most SCRAPER_PARSE_QUEUE pages (default 2 per worker) can be queued for
+or inside a worker. When the queue is full, submit() blocks the fetch
+stage, so memory stays bounded however far ahead the browser gets.
+
+Workers are forked, so the parse functions can be module-level functions
+(or methods of picklable objects) of the scraper script itself. They are
+started when the pool opens, before the browser and its helper threads.
+Where fork is unavailable (Windows), threads are used instead: parsing then
+still overlaps the browser's page loads, but does not run on several cores.
+The default of 0 workers parses inline, as before.
+
+The run report gets parse_jobs, parse_seconds (time spent parsing) and
+parse_blocked_seconds (time the fetch stage waited for a free slot).
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .config import env_int
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+
+def _noop():
+    return None
+
+
+def _timed(func, args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class ParsePool:
+    def __init__(self, workers: int, max_pending: int):
+        """Start `workers` parse workers, with at most `max_pending` pages queued for or inside a worker."""
+        if "fork" in multiprocessing.get_all_start_methods():
+            self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+            kind = "processes"
+        else:
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix="parse")
+            kind = "threads"
+        # Fork every worker now, while the process is still small and single-threaded
+        self._executor.submit(_noop)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        logger.info(f"Parsing in {workers} worker {kind}, at most {max_pending} pages queued")
+
+    def submit(self, func, *args) -> Future:
+        """Parse in a worker and return a future for the result; blocks while the queue is full."""
+        started = time.perf_counter()
+        self._slots.acquire()
+        run_report.incr("parse_blocked_seconds", round(time.perf_counter() - started, 3))
+        run_report.incr("parse_jobs")
+        try:
+            job = self._executor.submit(_timed, func, args)
+        except Exception:
+            self._slots.release()
+            raise
+        result = Future()
+
+        def done(job):
+            self._slots.release()
+            try:
+                value, seconds = job.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            run_report.incr("parse_seconds", round(seconds, 3))
+            result.set_result(value)
+        job.add_done_callback(done)
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class InlinePool:
+    """Stand-in used without parse workers: parses immediately in the calling thread."""
+
+    def submit(self, func, *args) -> Future:
+        result = Future()
+        try:
+            result.set_result(func(*args))
+        except Exception as e:
+            result.set_exception(e)
+        return result
+
+    def close(self):
+        pass
+
+
+def open_parse_pool(site):
+    """Return a parse worker pool sized by SCRAPER_PARSE_WORKERS, or an inline stand-in when it is 0."""
+    workers = env_int("SCRAPER_PARSE_WORKERS", 0)
+    if workers <= 0:
+        return InlinePool()
+    return ParsePool(workers, max(1, env_int("SCRAPER_PARSE_QUEUE", 2 * workers)))
@@ -0,0 +1,219 @@
+"""Durable SQLite product store with batched upserts and price history.
+
+Every scraper writes its products here in addition to the per-run JSON file,
+so results from different keywords, sites and days can be queried together.
+Set SCRAPER_DB_PATH to choose the database file (default: products.db in the
+working directory). A batch that fails to write stays buffered and is retried
+with the next flush, but at most SCRAPER_DB_MAX_BUFFER products (default four
+batches) are kept; beyond that the oldest are dropped so memory stays bounded.
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from .canonical import canonical_product_url
+from .config import env_int, env_str
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    url TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    keyword TEXT,
+    title TEXT,
+    currency TEXT,
+    price REAL,
+    price_text TEXT,
+    availability TEXT,
+    data TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_site ON products(site);
+CREATE INDEX IF NOT EXISTS idx_products_keyword ON products(keyword);
+CREATE INDEX IF NOT EXISTS idx_products_last_seen ON products(last_seen);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    site TEXT NOT NULL,
+    keyword TEXT,
+    scraped_at TEXT NOT NULL,
+    currency TEXT,
+    price REAL,
+    price_text TEXT,
+    availability TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_url ON price_history(url, scraped_at);
+CREATE INDEX IF NOT EXISTS idx_history_site ON price_history(site, scraped_at);
+CREATE INDEX IF NOT EXISTS idx_history_keyword ON price_history(keyword);
+CREATE INDEX IF NOT EXISTS idx_history_scraped_at ON price_history(scraped_at);
+"""
+
+UPSERT_PRODUCT = """
+INSERT INTO products (url, site, keyword, title, currency, price, price_text, availability, data, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(url) DO UPDATE SET
+    site = excluded.site,
+    keyword = excluded.keyword,
+    title = COALESCE(excluded.title, products.title),
+    currency = COALESCE(excluded.currency, products.currency),
+    price = excluded.price,
+    price_text = excluded.price_text,
+    availability = excluded.availability,
+    data = excluded.data,
+    last_seen = excluded.last_seen
+"""
+
+INSERT_HISTORY = """
+INSERT INTO price_history (url, site, keyword, scraped_at, currency, price, price_text, availability)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def utc_now():
+    """Return the current UTC time as an ISO-8601 string."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def price_value(price_text):
+    """Parse the first number out of a scraped price string.
+
+    Grouping commas are dropped whatever the grouping, so Western (1,234,567.00)
+    and Indian lakh/crore (12,34,567.00) prices both parse.
+    """
+    if price_text is None:
+        return None
+    if isinstance(price_text, (int, float)):
+        return float(price_text)
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', str(price_text))
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def availability(product):
+    """Derive an availability label for a product record."""
+    if product.get("availability"):
+        return product["availability"]
+    price_text = product.get("exact_price")
+    if price_value(price_text) is not None:
+        return "in_stock"
+    if price_text and "ask" in str(price_text).lower():
+        return "on_request"
+    return "unknown"
+
+
+class ProductStore:
+    def __init__(self, db_path: str, site: str, keyword: str, batch_size: int = 50, max_buffer: int = None):
+        """Open (or create) the store and prepare a write buffer of at most `max_buffer` products."""
+        self.db_path = db_path
+        self.site = site
+        self.keyword = keyword
+        self.batch_size = max(1, batch_size)
+        self.max_buffer = max(self.batch_size, max_buffer or 4 * self.batch_size)
+        self.run_started_at = utc_now()
+        self._buffer = []
+        self._lock = threading.Lock()
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA busy_timeout=30000")
+            self.conn.executescript(SCHEMA)
+            logger.info(f"Product store opened at {db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Error opening product store {db_path}: {e}")
+            self.conn = None
+
+    def add(self, product: dict):
+        """Queue a product for upsert, flushing once a full batch is buffered."""
+        if self.conn is None or not product.get("url"):
+            return
+        with self._lock:
+            self._buffer.append(product)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        """Write all buffered products in a single transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.conn is None or not self._buffer:
+            return
+        now = utc_now()
+        product_rows = []
+        history_rows = []
+        for product in self._buffer:
+            url = canonical_product_url(self.site, product["url"])
+            price_text = product.get("exact_price")
+            price_text = str(price_text) if price_text is not None else None
+            price = price_value(price_text)
+            status = availability(product)
+            product_rows.append((
+                url, self.site, self.keyword, product.get("title"), product.get("currency"),
+                price, price_text, status,
+                json.dumps(product, ensure_ascii=False), now, now
+            ))
+            history_rows.append((
+                url, self.site, self.keyword, now, product.get("currency"),
+                price, price_text, status
+            ))
+        try:
+            with self.conn:
+                self.conn.executemany(UPSERT_PRODUCT, product_rows)
+                self.conn.executemany(INSERT_HISTORY, history_rows)
+            logger.info(f"Upserted {len(product_rows)} products into {self.db_path}")
+            self._buffer.clear()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing products to store: {e}")
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                del self._buffer[:overflow]
+                logger.error(f"Dropped {overflow} products that could not be written to {self.db_path}")
+                run_report.incr("store_products_dropped", overflow)
+
+    def get(self, url: str):
+        """Return the last stored record for a product URL, or None."""
+        if self.conn is None or not url:
+            return None
+        try:
+            row = self.conn.execute(
+                "SELECT data FROM products WHERE url = ?", (canonical_product_url(self.site, url),)
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error reading product {url} from store: {e}")
+            return None
+
+    def close(self):
+        """Flush pending writes and close the connection."""
+        self.flush()
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Error closing product store: {e}")
+            self.conn = None
+
+
+def open_store(site, keyword):
+    """Open the shared product store configured by SCRAPER_DB_PATH."""
+    return ProductStore(
+        env_str("SCRAPER_DB_PATH", "products.db"),
+        site,
+        keyword,
+        batch_size=env_int("SCRAPER_DB_BATCH_SIZE", 50),
+        max_buffer=env_int("SCRAPER_DB_MAX_BUFFER", 0),
+    )
@@ -0,0 +1,249 @@
+"""Managed per-site browser profiles with a bounded, persistent HTTP disk cache.
+
+With SCRAPER_BROWSER_PROFILES=1 every browser gets a profile directory under
+SCRAPER_STATE_DIR/profiles/<site> instead of a throwaway one, so the site's
+JS and CSS bundles come from the disk cache on later runs. The cache is
+capped at SCRAPER_PROFILE_CACHE_MB (default 256).
+
+Each run works on its own clone of the site's base profile, because a
+profile cannot be shared by two running browsers. The clone is made when
+the run first launches a browser, so a process that never starts one
+(e.g. --validate-captcha reattaching to a parked browser) copies nothing.
+Files are cloned copy-on-write where the filesystem supports reflinks
+(btrfs, XFS) and copied otherwise. When the run ends, its clone replaces
+the base profile, so the next clone starts from the latest cache. A
+process that resumes a parked browser adopts the parking run's clone and
+saves that one instead. Worker clones left
+behind by crashed runs are removed after SCRAPER_PROFILE_MAX_AGE_HOURS
+(default 24). Base profiles are removed least recently used first once they
+take more than SCRAPER_PROFILE_MAX_MB (default 1024) in total.
+
+In Chrome, bytes served from the disk cache and from the network are
+counted from the performance log and reported as cache_hit_bytes and
+network_bytes.
+"""
+import logging
+import os
+import shutil
+import time
+
+from . import perf_log
+from .config import env_bool, env_float, env_int, state_path
+from .locks import FileLock
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409
+# Chrome's per-instance lock files must not be cloned into another profile
+SKIP_FILES = ("SingletonLock", "SingletonSocket", "SingletonCookie", "lock", ".parentlock")
+
+
+def _clone_file(src, dst):
+    try:
+        import fcntl
+        with open(src, "rb") as source, open(dst, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        shutil.copystat(src, dst)
+        return dst
+    except (ImportError, OSError):
+        return shutil.copy2(src, dst)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class CacheStats:
+    def __init__(self):
+        """Count cached and downloaded bytes from Chrome's Network events."""
+        self.cached = set()
+        self.hit_bytes = 0
+        self.network_bytes = 0
+
+    def on_response(self, params):
+        if params.get("response", {}).get("fromDiskCache"):
+            self.cached.add(params.get("requestId"))
+
+    def on_served_from_cache(self, params):
+        self.cached.add(params.get("requestId"))
+
+    def on_data(self, params):
+        if params.get("requestId") in self.cached:
+            self.hit_bytes += params.get("dataLength", 0)
+        else:
+            self.network_bytes += params.get("encodedDataLength", 0)
+        run_report.set("cache_hit_bytes", self.hit_bytes)
+        run_report.set("network_bytes", self.network_bytes)
+
+
+class BrowserProfile:
+    def __init__(self, site: str, cache_mb: int = 256, max_age_hours: float = 24, max_total_mb: int = 1024):
+        """Prepare a private profile directory for this run; the base profile is cloned on first use."""
+        self.site = site
+        self.cache_bytes = cache_mb * 1024 * 1024
+        self.max_age = max_age_hours * 3600
+        self.max_total = max_total_mb * 1024 * 1024
+        self.root = state_path("profiles", site, "base").parent
+        self.base = self.root / "base"
+        self.dir = self.root / "workers" / f"{os.getpid()}_{int(time.time() * 1000)}"
+        self.stats = CacheStats()
+        self._ready = False
+        self._collect_garbage()
+
+    def _prepare(self) -> bool:
+        if self._ready:
+            return True
+        try:
+            self.dir.parent.mkdir(parents=True, exist_ok=True)
+            if self.base.is_dir():
+                with FileLock(self.base):
+                    shutil.copytree(self.base, self.dir, symlinks=True, copy_function=_clone_file,
+                                    ignore=shutil.ignore_patterns(*SKIP_FILES))
+                run_report.set("browser_profile", "warm")
+            else:
+                self.dir.mkdir()
+                run_report.set("browser_profile", "cold")
+        except (OSError, TimeoutError) as e:
+            logger.warning(f"Could not prepare a browser profile for {self.site}, using a temporary one: {e}")
+            shutil.rmtree(self.dir, ignore_errors=True)
+            return False
+        self._ready = True
+        return True
+
+    @property
+    def workdir(self):
+        """This run's profile directory, or None if no browser has used it yet."""
+        return os.path.abspath(self.dir) if self._ready else None
+
+    def _worker(self, workdir):
+        # Only directories this site's runs cloned are taken over or removed
+        path = self.root / "workers" / os.path.basename(workdir or "")
+        return path if workdir and os.path.abspath(workdir) == os.path.abspath(path) and path.is_dir() else None
+
+    def adopt(self, workdir):
+        """Take over the profile directory of a parked browser from an earlier run, so release() saves it."""
+        path = self._worker(workdir)
+        if path:
+            self.dir = path
+            self._ready = True
+
+    def discard(self, workdir):
+        """Remove the profile directory of an earlier run's browser that has been closed."""
+        path = self._worker(workdir)
+        if path:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def apply_chrome(self, chrome_options):
+        """Point Chrome at this run's profile and cap its disk cache."""
+        if not self._prepare():
+            return chrome_options
+        chrome_options.add_argument(f"--user-data-dir={self.dir}")
+        chrome_options.add_argument(f"--disk-cache-size={self.cache_bytes}")
+        perf_log.enable(chrome_options)
+        return chrome_options
+
+    def apply_firefox(self, firefox_options):
+        """Point Firefox at this run's profile and cap its disk cache."""
+        if not self._prepare():
+            return firefox_options
+        firefox_options.add_argument("-profile")
+        firefox_options.add_argument(str(self.dir))
+        firefox_options.set_preference("browser.cache.disk.enable", True)
+        firefox_options.set_preference("browser.cache.disk.smart_size.enabled", False)
+        firefox_options.set_preference("browser.cache.disk.capacity", self.cache_bytes // 1024)
+        return firefox_options
+
+    def attach(self, driver):
+        """Start counting cache hits for a Chrome driver launched with this profile."""
+        if not hasattr(driver, "execute_cdp_cmd"):
+            return driver
+        perf_log.subscribe(driver, "Network.responseReceived", self.stats.on_response)
+        perf_log.subscribe(driver, "Network.requestServedFromCache", self.stats.on_served_from_cache)
+        perf_log.subscribe(driver, "Network.dataReceived", self.stats.on_data)
+        return driver
+
+    def release(self):
+        """Make this run's profile the new base profile; call after the browser has quit."""
+        if not self._ready or not self.dir.is_dir():
+            return
+        try:
+            with FileLock(self.base):
+                trash = self.root / f"trash_{os.getpid()}"
+                if self.base.is_dir():
+                    os.replace(self.base, trash)
+                os.replace(self.dir, self.base)
+            shutil.rmtree(trash, ignore_errors=True)
+            logger.info(f"Saved {self.site} browser profile ({_dir_size(self.base) // (1024 * 1024)} MB)")
+        except (OSError, TimeoutError) as e:
+            logger.warning(f"Could not save {self.site} browser profile: {e}")
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _collect_garbage(self):
+        now = time.time()
+        workers = self.root / "workers"
+        if workers.is_dir():
+            for worker in workers.iterdir():
+                try:
+                    if now - worker.stat().st_mtime > self.max_age:
+                        shutil.rmtree(worker, ignore_errors=True)
+                        logger.info(f"Removed stale browser profile {worker}")
+                except OSError:
+                    continue
+        # Drop the least recently used sites' base profiles once all of them exceed the size limit
+        bases = [p / "base" for p in self.root.parent.iterdir() if (p / "base").is_dir()]
+        sizes = {base: _dir_size(base) for base in bases}
+        total = sum(sizes.values())
+        for base in sorted(bases, key=lambda p: p.stat().st_mtime):
+            if total <= self.max_total:
+                break
+            shutil.rmtree(base, ignore_errors=True)
+            total -= sizes[base]
+            logger.info(f"Removed browser profile {base} to stay under {self.max_total // (1024 * 1024)} MB")
+
+
+class DisabledProfile:
+    """Stand-in used when SCRAPER_BROWSER_PROFILES is off: browsers keep their throwaway profiles."""
+
+    workdir = None
+
+    def apply_chrome(self, chrome_options):
+        return chrome_options
+
+    def apply_firefox(self, firefox_options):
+        return firefox_options
+
+    def attach(self, driver):
+        return driver
+
+    def adopt(self, workdir):
+        pass
+
+    def discard(self, workdir):
+        pass
+
+    def release(self):
+        pass
+
+
+def open_profile(site):
+    """Return a managed profile for the site, or a no-op one when SCRAPER_BROWSER_PROFILES is off."""
+    if not env_bool("SCRAPER_BROWSER_PROFILES"):
+        return DisabledProfile()
+    try:
+        return BrowserProfile(
+            site,
+            env_int("SCRAPER_PROFILE_CACHE_MB", 256),
+            env_float("SCRAPER_PROFILE_MAX_AGE_HOURS", 24),
+            env_int("SCRAPER_PROFILE_MAX_MB", 1024),
+        )
+    except (OSError, TimeoutError) as e:
+        logger.warning(f"Could not prepare a browser profile for {site}, using a temporary one: {e}")
+        return DisabledProfile()
@@ -0,0 +1,284 @@
+"""Per-site proxy pools with health scoring, eviction and sticky assignment.
+
+Proxies are configured with SCRAPER_PROXIES, either a comma-separated list
+used for every site or a JSON object keyed by site with a "default"
+fallback, e.g.
+
+    {"default": ["http://10.0.0.2:3128"], "flipkart": ["http://10.0.0.3:3128", "socks5://10.0.0.4:1080"]}
+
+Without it every scraper connects directly, as before. Chrome and Firefox
+cannot be given proxy credentials on the command line or in preferences, so
+entries with user:pass@ are rejected when the pool is created; use proxies
+that authorise by IP, or a local forwarding proxy that adds the credentials.
+
+Each page load through a proxy updates its health for that site: an
+exponentially weighted success rate and latency. A new browser picks a
+proxy at random, weighted by success rate / (1 + latency / target). A proxy
+whose success rate drops below SCRAPER_PROXY_EVICT_BELOW (default 0.5)
+after SCRAPER_PROXY_MIN_SAMPLES (default 5) loads is evicted for
+SCRAPER_PROXY_COOLDOWN seconds (default 1800). Health is shared between
+processes through SCRAPER_STATE_DIR.
+
+A browser keeps its proxy for its whole life, and a CAPTCHA session
+records the proxy it was solved through, so the resumed job comes back
+from the same IP its cookies belong to.
+
+Check the pool, for example against local stand-in proxies, with
+
+    SCRAPER_PROXY_CHECK_URL=http://127.0.0.1:8000/ python -m scraper_utils.proxy_pool <site>
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+import urllib.request
+import weakref
+from urllib.parse import urlsplit
+
+from .config import env_float, env_int, env_str, state_path
+from .locks import FileLock
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.2
+LATENCY_TARGET = 8.0
+
+
+def mask(proxy):
+    """Return a proxy URL with its credentials hidden, for logs and reports."""
+    if not proxy:
+        return proxy
+    parts = urlsplit(proxy)
+    if parts.username:
+        return proxy.replace(parts.netloc, f"***@{parts.hostname}:{parts.port}")
+    return proxy
+
+
+def proxies_for(site, raw=None):
+    """Return the configured proxy URLs for a site."""
+    raw = raw if raw is not None else env_str("SCRAPER_PROXIES")
+    if not raw:
+        return []
+    raw = raw.strip()
+    if raw.startswith("{"):
+        try:
+            config = json.loads(raw)
+        except ValueError as e:
+            logger.error(f"Ignoring invalid SCRAPER_PROXIES: {e}")
+            return []
+        return list(config.get(site, config.get("default", [])))
+    return [p.strip() for p in raw.split(",") if p.strip()]
+
+
+class ProxyPool:
+    def __init__(self, site: str, proxies: list, min_samples: int = 5, evict_below: float = 0.5, cooldown: float = 1800):
+        """Create a pool for a site; health is loaded from and saved to the shared state directory."""
+        credentialed = [mask(p) for p in proxies if urlsplit(p).username]
+        if credentialed:
+            raise ValueError(f"Proxies with credentials are not supported for {site}: {', '.join(credentialed)}. "
+                             "The browser would connect without them; use IP-authorised proxies or a local "
+                             "forwarding proxy that adds the credentials")
+        self.site = site
+        self.proxies = list(dict.fromkeys(proxies))
+        self.min_samples = min_samples
+        self.evict_below = evict_below
+        self.cooldown = cooldown
+        self.path = state_path("proxies", f"{site}.json")
+        self._drivers = weakref.WeakKeyDictionary()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, health: dict):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(health, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def score(stats: dict) -> float:
+        """Weight a proxy by its success rate, discounted by its latency."""
+        return stats.get("ok", 1.0) / (1 + stats.get("latency", 0.0) / LATENCY_TARGET)
+
+    def acquire(self, prefer=None):
+        """Pick a healthy proxy, keeping `prefer` if it is still healthy; None means connect directly."""
+        if not self.proxies:
+            return None
+        health = self._load()
+        now = time.time()
+        healthy = [p for p in self.proxies if health.get(p, {}).get("evicted_until", 0) <= now]
+        if prefer in healthy:
+            proxy = prefer
+        else:
+            if prefer:
+                logger.warning(f"Sticky proxy {mask(prefer)} for {self.site} is evicted, picking another one")
+            if not healthy:
+                # Everything is evicted; fall back to the proxy that comes back soonest
+                healthy = [min(self.proxies, key=lambda p: health[p]["evicted_until"])]
+            weights = [max(0.01, self.score(health.get(p, {}))) for p in healthy]
+            proxy = random.choices(healthy, weights=weights)[0]
+        run_report.set("proxy", mask(proxy))
+        return proxy
+
+    def record(self, proxy, ok: bool, latency=None):
+        """Update a proxy's health after a page load, evicting it if it keeps failing."""
+        if not proxy:
+            return
+        try:
+            with FileLock(self.path):
+                health = self._load()
+                stats = health.setdefault(proxy, {"ok": 1.0, "latency": 0.0, "samples": 0, "evicted_until": 0})
+                if stats["evicted_until"] and stats["evicted_until"] <= time.time():
+                    # Back from eviction: give it a fresh, slightly doubtful start
+                    stats.update({"ok": 0.75, "samples": 0, "evicted_until": 0})
+                stats["ok"] = (1 - EWMA_ALPHA) * stats["ok"] + EWMA_ALPHA * (1.0 if ok else 0.0)
+                if latency is not None:
+                    stats["latency"] = (1 - EWMA_ALPHA) * stats["latency"] + EWMA_ALPHA * latency
+                stats["samples"] += 1
+                if stats["samples"] >= self.min_samples and stats["ok"] < self.evict_below:
+                    stats["evicted_until"] = time.time() + self.cooldown
+                    run_report.incr("proxies_evicted")
+                    logger.warning(f"Evicting proxy {mask(proxy)} for {self.site} "
+                                   f"(success rate {stats['ok']:.2f}) for {self.cooldown:.0f}s")
+                self._save(health)
+        except (OSError, TimeoutError) as e:
+            logger.error(f"Error updating proxy health for {self.site}: {e}")
+        run_report.incr("proxy_failures" if not ok else "proxy_successes")
+
+    def configure_chrome(self, chrome_options, prefer=None):
+        """Route a Chrome browser through a proxy from the pool; return the proxy chosen."""
+        proxy = self.acquire(prefer)
+        if proxy:
+            parts = urlsplit(proxy)
+            chrome_options.add_argument(f"--proxy-server={parts.scheme}://{parts.hostname}:{parts.port}")
+        return proxy
+
+    def configure_firefox(self, firefox_options, prefer=None):
+        """Route a Firefox browser through a proxy from the pool; return the proxy chosen."""
+        proxy = self.acquire(prefer)
+        if proxy:
+            parts = urlsplit(proxy)
+            firefox_options.set_preference("network.proxy.type", 1)
+            if parts.scheme.startswith("socks"):
+                firefox_options.set_preference("network.proxy.socks", parts.hostname)
+                firefox_options.set_preference("network.proxy.socks_port", parts.port)
+                firefox_options.set_preference("network.proxy.socks_version", 4 if parts.scheme == "socks4" else 5)
+                firefox_options.set_preference("network.proxy.socks_remote_dns", True)
+            else:
+                for scheme in ("http", "ssl"):
+                    firefox_options.set_preference(f"network.proxy.{scheme}", parts.hostname)
+                    firefox_options.set_preference(f"network.proxy.{scheme}_port", parts.port)
+        return proxy
+
+    def bind(self, driver, proxy):
+        """Remember which proxy a browser uses so its page loads update that proxy's health."""
+        if proxy:
+            self._drivers[driver] = proxy
+            _pools[driver] = self
+        return driver
+
+    def proxy_of(self, driver):
+        """Return the proxy a browser was bound to, if any."""
+        return self._drivers.get(getattr(driver, "wrapped_driver", driver))
+
+    def probe(self, proxy, url, timeout=15) -> bool:
+        """Fetch a URL through a proxy over plain HTTP and record the result."""
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({"http": proxy, "https": proxy}))
+        started = time.monotonic()
+        try:
+            with opener.open(url, timeout=timeout) as response:
+                ok = response.status < 400
+        except OSError as e:
+            logger.warning(f"Proxy {mask(proxy)} failed: {e}")
+            ok = False
+        self.record(proxy, ok, time.monotonic() - started)
+        return ok
+
+    def snapshot(self) -> dict:
+        """Return the current health of every proxy in the pool."""
+        health = self._load()
+        now = time.time()
+        return {
+            mask(p): {
+                "ok": round(health.get(p, {}).get("ok", 1.0), 3),
+                "latency": round(health.get(p, {}).get("latency", 0.0), 2),
+                "samples": health.get(p, {}).get("samples", 0),
+                "evicted_for": max(0, round(health.get(p, {}).get("evicted_until", 0) - now)),
+            }
+            for p in self.proxies
+        }
+
+
+class DirectConnection:
+    """Stand-in used when no proxies are configured for a site."""
+
+    proxies = []
+
+    def acquire(self, prefer=None):
+        return None
+
+    def record(self, proxy, ok, latency=None):
+        pass
+
+    def configure_chrome(self, chrome_options, prefer=None):
+        return None
+
+    def configure_firefox(self, firefox_options, prefer=None):
+        return None
+
+    def bind(self, driver, proxy):
+        return driver
+
+    def proxy_of(self, driver):
+        return None
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def open_proxy_pool(site):
+    """Return the site's proxy pool, or a direct connection when SCRAPER_PROXIES has none for it."""
+    proxies = proxies_for(site)
+    if not proxies:
+        return DirectConnection()
+    return ProxyPool(
+        site,
+        proxies,
+        env_int("SCRAPER_PROXY_MIN_SAMPLES", 5),
+        env_float("SCRAPER_PROXY_EVICT_BELOW", 0.5),
+        env_float("SCRAPER_PROXY_COOLDOWN", 1800),
+    )
+
+
+def proxy_of(driver):
+    """Return the proxy a browser is bound to in any site's pool, if any."""
+    pool = _pools.get(getattr(driver, "wrapped_driver", driver))
+    return pool.proxy_of(driver) if pool else None
+
+
+def record_page(driver, ok, latency=None):
+    """Hook for page loads and failures: update the health of the proxy a browser is bound to."""
+    pool = _pools.get(getattr(driver, "wrapped_driver", driver))
+    if pool:
+        pool.record(pool.proxy_of(driver), ok, latency)
+
+
+def main():
+    """Probe every proxy configured for a site and print the pool's health."""
+    site = sys.argv[1] if len(sys.argv) > 1 else "default"
+    pool = open_proxy_pool(site)
+    url = env_str("SCRAPER_PROXY_CHECK_URL", "https://www.example.com/")
+    for proxy in pool.proxies:
+        pool.probe(proxy, url)
+    print(json.dumps(pool.snapshot() if pool.proxies else {}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
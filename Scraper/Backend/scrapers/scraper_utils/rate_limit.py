@@ -0,0 +1,237 @@
+"""Adaptive per-domain rate limiting for page fetches.
+
+Every page fetch goes through a token bucket for its domain (amazon.in,
+ebay.com, made-in-china.com, ...). The bucket's rate adapts with AIMD:
+after each fast, clean response the rate grows by a fixed step, and it is
+cut by a multiplicative factor on block pages (429 / 503 / access denied),
+CAPTCHAs or responses slower than the latency target.
+
+Limits are configured with SCRAPER_RATE_LIMITS, a JSON object keyed by site
+or domain with a "default" fallback, e.g.
+
+    {"default": {"rate": 0.5}, "amazon": {"rate": 0.3, "max_rate": 1.0}}
+
+Learned rates are saved under SCRAPER_STATE_DIR so the next run starts where
+the last one left off, and are included in the run report. Print them with
+
+    python -m scraper_utils.rate_limit
+"""
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from . import fingerprint, perf_log, proxy_pool, readiness
+from .config import env_str, state_path
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "rate": 0.5,            # requests per second to start with
+    "min_rate": 0.05,
+    "max_rate": 2.0,
+    "burst": 2,             # bucket capacity
+    "increase": 0.05,       # additive increase per clean response
+    "decrease": 0.5,        # multiplicative decrease on blocks and CAPTCHAs
+    "slow_decrease": 0.8,   # multiplicative decrease on slow responses
+    "latency_target": 8.0,  # seconds
+}
+
+# Learned rates older than this are ignored and the configured rate is used again.
+STATE_MAX_AGE = 24 * 3600
+
+BLOCK_TITLE_MARKERS = ("too many requests", "service unavailable", "access denied", "you have been blocked",
+                       "captcha", "robot check", "are you a human")
+
+
+def domain_of(url: str) -> str:
+    """Return the registrable domain of a URL (last two host labels)."""
+    host = urlsplit(url).hostname or url
+    labels = host.lower().split(".")
+    return ".".join(labels[-2:])
+
+
+def _load_config():
+    raw = env_str("SCRAPER_RATE_LIMITS")
+    if not raw:
+        return {}
+    try:
+        config = json.loads(raw)
+        return config if isinstance(config, dict) else {}
+    except ValueError as e:
+        logger.error(f"Ignoring invalid SCRAPER_RATE_LIMITS: {e}")
+        return {}
+
+
+def limits_for(domain: str, config: dict) -> dict:
+    """Merge the default limits with the configured ones for a domain."""
+    limits = dict(DEFAULTS)
+    limits.update(config.get("default", {}))
+    compact = domain.replace("-", "")
+    for key, value in config.items():
+        if key != "default" and (key == domain or compact.startswith(key.replace("-", "") + ".")):
+            limits.update(value)
+    return limits
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, domain: str, **limits):
+        """Create a token bucket for a domain, resuming a recently learned rate if there is one."""
+        settings = dict(DEFAULTS)
+        settings.update(limits)
+        self.domain = domain
+        self.min_rate = settings["min_rate"]
+        self.max_rate = settings["max_rate"]
+        self.burst = max(1.0, float(settings["burst"]))
+        self.increase = settings["increase"]
+        self.decrease = settings["decrease"]
+        self.slow_decrease = settings["slow_decrease"]
+        self.latency_target = settings["latency_target"]
+        self.rate = min(self.max_rate, max(self.min_rate, settings["rate"]))
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.state_file = state_path("rate_limits", f"{domain}.json")
+        self._lock = threading.Lock()
+        self._resume()
+
+    def _resume(self):
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                state = json.load(f)
+            if time.time() - state.get("saved_at", 0) < STATE_MAX_AGE:
+                self.rate = min(self.max_rate, max(self.min_rate, state["rate"]))
+                logger.info(f"Resuming {self.domain} at {self.rate:.3f} req/s")
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def acquire(self):
+        """Block until a request to this domain is allowed."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            # Reserve the token now so concurrent callers queue up behind us
+            self.tokens -= 1
+            self.requests += 1
+            if wait:
+                self.throttled += 1
+                self.waited += wait
+        if wait:
+            time.sleep(wait)
+
+    def record(self, latency=None, blocked=False):
+        """Adapt the rate to a response: multiplicative decrease on trouble, additive increase otherwise."""
+        with self._lock:
+            if blocked:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                logger.warning(f"Slowing {self.domain} to {self.rate:.3f} req/s after a block")
+            elif latency is not None and latency > self.latency_target:
+                self.rate = max(self.min_rate, self.rate * self.slow_decrease)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+        self._save()
+
+    def snapshot(self) -> dict:
+        """Return the limiter's current rate and counters."""
+        return {
+            "rate": round(self.rate, 3),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "waited_seconds": round(self.waited, 1),
+        }
+
+    def _save(self):
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"domain": self.domain, "rate": self.rate, "saved_at": time.time()}, f)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            logger.error(f"Error saving rate limit state for {self.domain}: {e}")
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(url: str) -> AdaptiveRateLimiter:
+    """Return the shared limiter for a URL's domain."""
+    domain = domain_of(url)
+    with _limiters_lock:
+        limiter = _limiters.get(domain)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(domain, **limits_for(domain, _load_config()))
+            _limiters[domain] = limiter
+        return limiter
+
+
+def snapshot() -> dict:
+    """Return the current rate and counters for every domain used in this process."""
+    with _limiters_lock:
+        return {domain: limiter.snapshot() for domain, limiter in _limiters.items()}
+
+
+def looks_blocked(title: str) -> bool:
+    """Return True if a page title looks like a block, rate-limit or CAPTCHA page."""
+    title = (title or "").lower()
+    return any(marker in title for marker in BLOCK_TITLE_MARKERS)
+
+
+def throttled_get(driver, url: str):
+    """Load a URL once the domain's rate limit allows it, and adapt the rate to the response."""
+    limiter = limiter_for(url)
+    fingerprint.before_page(driver)
+    limiter.acquire()
+    readiness.mark_navigation(driver)
+    started = time.monotonic()
+    loaded = False
+    try:
+        driver.get(url)
+        loaded = True
+    finally:
+        latency = time.monotonic() - started
+        try:
+            blocked = looks_blocked(driver.title)
+        except Exception:
+            blocked = False
+        limiter.record(latency, blocked)
+        proxy_pool.record_page(driver, loaded and not blocked, latency)
+        perf_log.pump(driver)
+        run_report.set_default("first_page_seconds", round(latency, 2))
+        run_report.set("rate_limits", snapshot())
+
+
+def penalize(url: str):
+    """Slow a domain down after a block or CAPTCHA was detected."""
+    if not url:
+        return
+    limiter_for(url).record(blocked=True)
+    run_report.set("rate_limits", snapshot())
+
+
+def main():
+    """Print the learned per-domain rates saved by recent runs."""
+    directory = state_path("rate_limits", "x").parent
+    rates = {}
+    for path in sorted(directory.glob("*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            rates[state["domain"]] = {
+                "rate": round(state["rate"], 3),
+                "age_seconds": round(time.time() - state["saved_at"]),
+            }
+        except (OSError, ValueError, KeyError):
+            continue
+    print(json.dumps(rates, indent=2))
+
+
+if __name__ == "__main__":
+    main()
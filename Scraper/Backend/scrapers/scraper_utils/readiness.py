@@ -0,0 +1,164 @@
+"""Page readiness: start extracting as soon as the data is in the DOM.
+
+By default Selenium's get() waits for the load event, and the scrapers then
+waited for document.readyState == "complete". Both include ads, trackers and
+late images that the scrapers never read. Drivers now start with the
+"eager" page-load strategy: get() returns at DOMContentLoaded. Set
+SCRAPER_PAGE_LOAD_STRATEGY (or SCRAPER_PAGE_LOAD_STRATEGY_<SITE>) to
+"normal", "eager" or "none".
+
+After navigating, a scraper calls wait_ready(driver, site, page). It checks
+the site's predicate for that page type in the browser: the page is ready
+once one of the selectors matches at least `min` elements. A page that
+reaches readyState "complete" without matching its predicate gets
+SCRAPER_READY_GRACE_MS (default 2000) more, and is then handed to the
+scraper anyway. The scraper's own "no products" and CAPTCHA checks deal
+with it from there.
+
+The time from navigation start to readiness is logged for every page and
+summarised per site and page type as time_to_ready_ms in the run report.
+"""
+import logging
+import threading
+import time
+import weakref
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from .config import env_int, env_str
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("normal", "eager", "none")
+
+PREDICATES = {
+    "amazon": {
+        "search": {"selectors": ['span[data-component-type="s-search-results"] div[data-component-type="s-search-result"]']},
+        "product": {"selectors": ["#productTitle"]},
+    },
+    "flipkart": {
+        "search": {"selectors": ["div._2kHMtA", "div.tUxRFH", "div._1AtVbE", "div[data-id]"]},
+        "product": {"selectors": ["div._30jeq3", "div.Nx9bqj", "span.B_NuCI", "span.VU-ZEz"]},
+    },
+    "indiamart": {
+        "search": {"selectors": ["div.card", "div.product-card", "div.listing"]},
+    },
+    "madeinchina": {
+        "search": {"selectors": [".sr-srpList", ".prod-list", ".search-result-list", 'div[data-component="ProductList"]']},
+        "product": {"selectors": [".basic-info-list", ".sr-proMainInfo-baseInfo", "h1"]},
+    },
+}
+
+READY_JS = r"""
+const [selectors, min, graceMs, navStart] = arguments;
+const done = arguments[arguments.length - 1];
+let completeAt = null;
+let finished = false;
+let observer = null, timer = null;
+function finish(result) {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    clearInterval(timer);
+    done(Object.assign(result, {ms: Math.round(performance.now()), state: document.readyState}));
+}
+function check() {
+    // With the "none" strategy the previous page can still be showing; wait for the new document
+    if (navStart && performance.timeOrigin < navStart - 250) return;
+    for (const selector of selectors) {
+        let count = 0;
+        try { count = document.querySelectorAll(selector).length; } catch (e) { continue; }
+        if (count >= min) return finish({ready: true, selector});
+    }
+    if (document.readyState === 'complete') {
+        completeAt = completeAt || performance.now();
+        if (performance.now() - completeAt >= graceMs) finish({ready: false, selector: null});
+    }
+}
+observer = new MutationObserver(check);
+observer.observe(document.documentElement, {childList: true, subtree: true});
+timer = setInterval(check, 100);
+check();
+"""
+
+_navigations = weakref.WeakKeyDictionary()
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def page_load_strategy(site=None) -> str:
+    """Return the page-load strategy configured for a site ("eager" unless overridden)."""
+    strategy = env_str(f"SCRAPER_PAGE_LOAD_STRATEGY_{site.upper()}") if site else None
+    strategy = (strategy or env_str("SCRAPER_PAGE_LOAD_STRATEGY", "eager")).strip().lower()
+    if strategy not in STRATEGIES:
+        logger.warning(f"Unknown page-load strategy {strategy!r}, using 'normal'")
+        return "normal"
+    return strategy
+
+
+def set_page_load_strategy(options, site):
+    """Apply the site's page-load strategy to Chrome or Firefox options."""
+    options.page_load_strategy = page_load_strategy(site)
+    return options
+
+
+def mark_navigation(driver, at=None):
+    """Remember when a navigation started (epoch ms, default now), so wait_ready can tell the new document from the old one."""
+    try:
+        _navigations[driver] = at or time.time() * 1000
+    except TypeError:
+        pass
+
+
+def summary() -> dict:
+    """Return the page count and average and worst time to ready per site and page type."""
+    with _timings_lock:
+        return {
+            key: {"pages": len(ms), "avg": round(sum(ms) / len(ms)), "max": max(ms)}
+            for key, ms in _timings.items()
+        }
+
+
+def _record(site, page, ms):
+    with _timings_lock:
+        _timings.setdefault(f"{site}_{page}", []).append(ms)
+    run_report.set("time_to_ready_ms", summary())
+
+
+def wait_ready(driver, site, page, timeout=20) -> dict:
+    """Wait until the site's readiness predicate for `page` holds; raise TimeoutException if it never does."""
+    predicate = PREDICATES.get(site, {}).get(page)
+    if predicate is None:
+        raise KeyError(f"No readiness predicate for {site} {page} pages")
+    try:
+        nav_start = _navigations.get(driver)
+    except TypeError:
+        nav_start = None
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            run_report.incr("pages_ready_timeout")
+            raise TimeoutException(f"{site} {page} page not ready after {timeout}s")
+        try:
+            driver.set_script_timeout(remaining)
+            result = driver.execute_async_script(
+                READY_JS, predicate["selectors"], predicate.get("min", 1),
+                env_int("SCRAPER_READY_GRACE_MS", 2000), nav_start
+            )
+            break
+        except TimeoutException:
+            continue
+        except WebDriverException as e:
+            # The document was replaced while waiting (a redirect, or the navigation committing); check the new one
+            logger.debug(f"Readiness check interrupted: {e}")
+            time.sleep(0.1)
+    _record(site, page, result["ms"])
+    if result["ready"]:
+        run_report.incr("pages_ready")
+        logger.info(f"{site} {page} page ready in {result['ms']} ms ({result['selector']})")
+    else:
+        run_report.incr("pages_ready_fallback")
+        logger.info(f"{site} {page} page loaded in {result['ms']} ms without matching its readiness predicate")
+    return result
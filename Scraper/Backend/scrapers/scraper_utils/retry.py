@@ -0,0 +1,260 @@
+"""Page-level retry policy with failure classification and a per-site circuit breaker.
+
+A failed search-page attempt is classified before deciding what to do:
+
+    transient       timeouts, dropped connections, renderer hiccups: retry with backoff
+    rate_limited    block / "too many requests" pages: retry with a long backoff
+    captcha         CAPTCHA or robot-check pages: never retried here
+    selector_drift  the page loaded but the expected markup was not found: not retried
+    unknown         anything else: retried with backoff, like the old fixed sleep
+
+Block and CAPTCHA pages are recognised from the page title, the URL and,
+for short pages (block pages are), the visible text. Ordinary pages that
+merely load a CAPTCHA script or mention "rate limit" somewhere in their
+markup are not mistaken for blocks; the raw source is only searched for
+markers that appear on challenge pages alone.
+
+Block and CAPTCHA failures also feed a circuit breaker whose state is shared
+between processes through SCRAPER_STATE_DIR and updated under a lock file.
+After SCRAPER_BREAKER_THRESHOLD consecutive blocks (default 3) the site's
+breaker opens and jobs stop immediately for SCRAPER_BREAKER_COOLDOWN seconds
+(default 900). After that a single trial request, across all processes, is
+let through, and it closes or reopens the breaker.
+"""
+import json
+import logging
+import os
+import random
+import time
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+    WebDriverException,
+)
+
+from . import fingerprint, proxy_pool
+from .config import env_float, env_int, state_path
+from .locks import FileLock
+from .rate_limit import penalize
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT = "transient"
+RATE_LIMITED = "rate_limited"
+CAPTCHA = "captcha"
+SELECTOR_DRIFT = "selector_drift"
+UNKNOWN = "unknown"
+
+# (base delay, max delay) in seconds for the failure kinds worth retrying.
+BACKOFF = {
+    TRANSIENT: (2, 30),
+    UNKNOWN: (5, 60),
+    RATE_LIMITED: (15, 300),
+}
+
+# Matched against the title, and against the visible text of short pages
+CAPTCHA_MARKERS = ("captcha", "robot check", "are you a human", "verify you are human", "unusual traffic", "slide to verify")
+BLOCK_MARKERS = ("access denied", "too many requests", "rate limit", "request blocked", "you have been blocked",
+                 "request unsuccessful", "403 forbidden", "error 429", "service unavailable")
+# Challenge and block page paths
+CAPTCHA_URL_MARKERS = ("captcha", "/punish", "/sorry/", "/challenge")
+BLOCK_URL_MARKERS = ("/blocked", "/ratelimit", "/rate-limit")
+# Markup only challenge pages carry: Amazon's robot-check form, Alibaba's slider, GeeTest
+CAPTCHA_SOURCE_MARKERS = ('action="/errors/validatecaptcha"', 'id="nc_1_n1z"', 'class="geetest_')
+NETWORK_MARKERS = ("net::err_", "connection reset", "connection refused", "timed out", "disconnected", "tab crashed")
+
+# Pages with more visible text than this are real pages, not block pages
+SHORT_PAGE_CHARS = 3000
+
+# Title, URL and the start of the visible text (with its full length) in one round trip
+PAGE_SIGNALS_JS = f"""
+const text = document.body ? document.body.innerText : '';
+return [document.title, location.href, text.slice(0, {SHORT_PAGE_CHARS}), text.length];
+"""
+
+
+def page_signals(browser) -> dict:
+    """Return the title, URL, visible text (short pages only) and source of the page a browser shows."""
+    signals = {}
+    try:
+        title, url, text, length = browser.execute_script(PAGE_SIGNALS_JS)
+        signals.update(title=title, url=url, text=text if length <= SHORT_PAGE_CHARS else None)
+    except Exception as e:
+        logger.debug(f"Could not read the page left by a failed attempt: {e}")
+    try:
+        signals["source"] = browser.page_source
+    except Exception:
+        pass
+    return signals
+
+
+def _contains(text, markers) -> bool:
+    text = (text or "").lower()
+    return any(marker in text for marker in markers)
+
+
+def classify_failure(error=None, page=None) -> str:
+    """Classify a failed page attempt from the exception and, if available, page_signals() of the page it left."""
+    page = page or {}
+    title, url, text = page.get("title"), page.get("url"), page.get("text")
+    if (_contains(title, CAPTCHA_MARKERS) or _contains(url, CAPTCHA_URL_MARKERS) or _contains(text, CAPTCHA_MARKERS)
+            or _contains((page.get("source") or "")[:200000], CAPTCHA_SOURCE_MARKERS)):
+        return CAPTCHA
+    if _contains(title, BLOCK_MARKERS) or _contains(url, BLOCK_URL_MARKERS) or _contains(text, BLOCK_MARKERS):
+        return RATE_LIMITED
+    if error is None:
+        return UNKNOWN
+    message = str(error).lower()
+    if isinstance(error, (TimeoutException, ConnectionError, OSError)) or any(m in message for m in NETWORK_MARKERS):
+        return TRANSIENT
+    if isinstance(error, (NoSuchElementException, StaleElementReferenceException, AttributeError, KeyError, IndexError)):
+        return SELECTOR_DRIFT
+    if isinstance(error, WebDriverException):
+        return TRANSIENT
+    return UNKNOWN
+
+
+def backoff_delay(kind: str, attempt: int) -> float:
+    """Return an exponential backoff with equal jitter for the given failure kind and attempt."""
+    base, cap = BACKOFF.get(kind, BACKOFF[UNKNOWN])
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    def __init__(self, site: str, threshold: int = 3, cooldown: float = 900):
+        """Load the site's breaker state from the shared state directory."""
+        self.site = site
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.path = state_path("breakers", f"{site}.json")
+        # Identifies this breaker's half-open trial to itself and to other processes
+        self.token = f"{os.getpid()}:{id(self)}"
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"failures": 0, "opened_at": None}
+
+    def _save(self, state: dict):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Error saving circuit breaker state for {self.site}: {e}")
+
+    def allow(self) -> bool:
+        """Return False while the breaker is open; after the cooldown one caller gets the trial request."""
+        try:
+            with FileLock(self.path):
+                return self._allow_locked()
+        except TimeoutError as e:
+            logger.warning(f"Could not lock the circuit breaker for {self.site}, letting the page through: {e}")
+            return True
+
+    def _allow_locked(self) -> bool:
+        state = self._load()
+        opened_at = state.get("opened_at")
+        if opened_at is None:
+            return True
+        now = time.time()
+        remaining = opened_at + self.cooldown - now
+        if remaining > 0:
+            logger.warning(f"Circuit breaker for {self.site} is open for another {remaining:.0f}s")
+            return False
+        trial, trial_at = state.get("trial"), state.get("trial_at") or 0
+        if trial == self.token:
+            return True
+        # A trial that has not reported back within a cooldown died with its process
+        if trial and trial_at + self.cooldown > now:
+            logger.warning(f"Circuit breaker for {self.site} is half-open and another job has the trial request")
+            return False
+        state["trial"], state["trial_at"] = self.token, now
+        self._save(state)
+        logger.info(f"Circuit breaker for {self.site} is half-open, allowing a trial request")
+        return True
+
+    def record_failure(self, kind: str):
+        """Count a block or CAPTCHA failure, opening the breaker once the threshold is reached."""
+        if kind not in (RATE_LIMITED, CAPTCHA):
+            return
+        try:
+            with FileLock(self.path):
+                state = self._load()
+                state["failures"] = state.get("failures", 0) + 1
+                if state["failures"] >= self.threshold:
+                    if state.get("opened_at") is None or state["opened_at"] + self.cooldown <= time.time():
+                        logger.warning(f"Opening circuit breaker for {self.site} after {state['failures']} blocked attempts")
+                        run_report.incr("circuit_breaker_opened")
+                    state["opened_at"] = time.time()
+                    state["trial"] = state["trial_at"] = None
+                self._save(state)
+        except TimeoutError as e:
+            logger.error(f"Could not lock the circuit breaker for {self.site} to record a failure: {e}")
+
+    def record_success(self):
+        """Close the breaker after a successful page."""
+        try:
+            with FileLock(self.path):
+                state = self._load()
+                if state.get("failures") or state.get("opened_at") is not None:
+                    self._save({"failures": 0, "opened_at": None})
+        except TimeoutError as e:
+            logger.error(f"Could not lock the circuit breaker for {self.site} to close it: {e}")
+
+    @classmethod
+    def from_env(cls, site):
+        """Build a breaker from SCRAPER_BREAKER_* settings."""
+        return cls(site, env_int("SCRAPER_BREAKER_THRESHOLD", 3), env_float("SCRAPER_BREAKER_COOLDOWN", 900))
+
+
+class PageRetry:
+    def __init__(self, site: str, retries: int, breaker: CircuitBreaker = None):
+        """Track page-level retries for one scraper run."""
+        self.site = site
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker.from_env(site)
+
+    def allow(self) -> bool:
+        """Return True if the site's circuit breaker lets another page through."""
+        if self.breaker.allow():
+            return True
+        run_report.incr("pages_failed_fast")
+        return False
+
+    def failed(self, attempt: int, error=None, browser=None, kind=None) -> bool:
+        """Record a failed attempt; sleep and return True only if retrying can help."""
+        if kind is None:
+            kind = classify_failure(error, page_signals(browser) if browser is not None else None)
+        run_report.incr(f"page_failures_{kind}")
+        self.breaker.record_failure(kind)
+        if kind in (RATE_LIMITED, CAPTCHA, TRANSIENT) and browser is not None:
+            proxy_pool.record_page(browser, False)
+        if kind in (RATE_LIMITED, CAPTCHA) and browser is not None:
+            try:
+                penalize(browser.current_url)
+            except Exception as e:
+                logger.debug(f"Could not slow down {self.site} after {kind}: {e}")
+            fingerprint.after_block(browser)
+        if kind not in BACKOFF:
+            logger.warning(f"Not retrying {self.site} page after {kind} failure")
+            return False
+        if attempt >= self.retries - 1 or not self.breaker.allow():
+            return False
+        delay = backoff_delay(kind, attempt)
+        logger.info(f"Retrying {self.site} page after {kind} failure in {delay:.1f}s")
+        run_report.incr("page_backoff_seconds", round(delay, 1))
+        time.sleep(delay)
+        return True
+
+    def succeeded(self):
+        """Record a successfully scraped page."""
+        run_report.incr("pages_succeeded")
+        self.breaker.record_success()
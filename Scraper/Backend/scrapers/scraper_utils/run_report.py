@@ -0,0 +1,69 @@
+"""Per-run counters and measurements reported when a scraper finishes."""
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb():
+    """Return this process's peak resident set size in MB, or None if unavailable."""
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None) or getattr(info, "peak_rss", None)
+        if peak:
+            return round(peak / (1024 * 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return round(peak / divisor, 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+class RunReport:
+    def __init__(self):
+        """Start an empty report for the current run."""
+        self.started = time.time()
+        self.counters = {}
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, amount=1):
+        """Add to a named counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name: str, value):
+        """Record a named value, replacing any previous one."""
+        with self._lock:
+            self.values[name] = value
+
+    def set_default(self, name: str, value):
+        """Record a named value unless one was already recorded."""
+        with self._lock:
+            self.values.setdefault(name, value)
+
+    def as_dict(self) -> dict:
+        """Return the counters and values collected so far."""
+        with self._lock:
+            report = dict(self.counters)
+            report.update(self.values)
+        return report
+
+    def finish(self) -> dict:
+        """Record run duration and peak memory, log the report and return it."""
+        self.set("duration_seconds", round(time.time() - self.started, 1))
+        self.set("peak_rss_mb", peak_rss_mb())
+        report = self.as_dict()
+        logger.info(f"Run report: {report}")
+        return report
+
+
+run_report = RunReport()
@@ -0,0 +1,79 @@
+"""Infinite-scroll loader that stops as soon as the page stops growing.
+
+The scrapers used to scroll a fixed number of times with sleeps in between,
+which waits too long on fast pages and gives up too early on slow ones.
+scroll_to_load runs the whole loop inside the browser in one asynchronous
+script. After each scroll a MutationObserver tracks DOM changes. Once the
+page has been quiet for SCRAPER_SCROLL_SETTLE_MS (default 700), the card
+count and document height are compared with the previous scroll. The loop
+stops when neither grew, after `max_scrolls`, or when
+SCRAPER_SCROLL_MAX_SECONDS (default 15) have passed.
+
+Each call returns telemetry (scrolls, ms, cards, height and the reason it
+stopped), which is also added to the run report.
+"""
+import logging
+
+from .config import env_float, env_int
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+SCROLL_JS = r"""
+const [selector, maxMs, settleMs, step, maxScrolls] = arguments;
+const done = arguments[arguments.length - 1];
+const started = performance.now();
+let lastMutation = started;
+const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+observer.observe(document.body, {childList: true, subtree: true});
+const count = () => selector ? document.querySelectorAll(selector).length : 0;
+let scrolls = 0, cards = count(), height = document.body.scrollHeight;
+function finish(reason) {
+    observer.disconnect();
+    done({scrolls, ms: Math.round(performance.now() - started), cards: count(),
+          height: document.body.scrollHeight, reason});
+}
+function scroll() {
+    if (maxScrolls && scrolls >= maxScrolls) return finish('max_scrolls');
+    const y = step ? Math.min(window.scrollY + step, document.body.scrollHeight) : document.body.scrollHeight;
+    window.scrollTo(0, y);
+    scrolls++;
+    const scrolledAt = performance.now();
+    (function settle() {
+        const now = performance.now();
+        if (now - started > maxMs) return finish('time_cap');
+        // Wait for the DOM to go quiet, but not forever on pages with constantly changing widgets
+        const quietFor = now - Math.max(scrolledAt, lastMutation);
+        if (quietFor < settleMs && now - scrolledAt < 4 * settleMs) return setTimeout(settle, 50);
+        const newCards = count(), newHeight = document.body.scrollHeight;
+        const grew = newCards > cards || newHeight > height;
+        cards = newCards;
+        height = newHeight;
+        const atBottom = window.scrollY + window.innerHeight >= newHeight - 2;
+        if (!grew && (!step || atBottom)) return finish('stable');
+        scroll();
+    })();
+}
+scroll();
+"""
+
+
+def scroll_to_load(driver, card_selector=None, step=None, max_scrolls=None, max_seconds=None, settle_ms=None) -> dict:
+    """Scroll until the page stops growing (by `step` pixels at a time, or to the bottom); return telemetry."""
+    max_seconds = max_seconds if max_seconds is not None else env_float("SCRAPER_SCROLL_MAX_SECONDS", 15)
+    settle_ms = settle_ms if settle_ms is not None else env_int("SCRAPER_SCROLL_SETTLE_MS", 700)
+    try:
+        driver.set_script_timeout(max_seconds + 5)
+        stats = driver.execute_async_script(
+            SCROLL_JS, card_selector, int(max_seconds * 1000), settle_ms, step or 0, max_scrolls or 0
+        )
+    except Exception as e:
+        logger.warning(f"Scroll loader failed: {e}")
+        return {"scrolls": 0, "ms": 0, "cards": None, "height": None, "reason": "error"}
+    run_report.incr("scrolls", stats["scrolls"])
+    run_report.incr("scroll_ms", stats["ms"])
+    run_report.incr(f"scroll_stops_{stats['reason']}")
+    logger.info(f"Scrolled {stats['scrolls']} times in {stats['ms']} ms "
+                f"({stats['cards'] if card_selector else stats['height']} {'cards' if card_selector else 'px'}, "
+                f"{stats['reason']})")
+    return stats
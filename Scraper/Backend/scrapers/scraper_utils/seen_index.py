@@ -0,0 +1,337 @@
+"""Cross-run index of products whose detail pages have already been fetched.
+
+Scheduled crawls keep meeting the same products under different keywords and
+on different days. With SCRAPER_SEEN_INDEX=1 each site keeps a persistent
+seen-set so a product's detail page is only fetched again when the freshness
+policy says the stored copy is out of date:
+
+* a scalable Bloom filter (state dir, seen/<site>.bloom) answers "never seen"
+  without touching disk for new products;
+* an exact SQLite index (seen/seen.db) holds the last fetch time and listing
+  price for every seen product and settles Bloom filter hits.
+
+Only products whose detail page was actually fetched are recorded; a run
+that only read listing fields leaves the index alone. A product whose detail
+page is skipped is completed from its last record in the product store, and
+only when that record has a value for every requested detail field, so
+skipped products still carry every requested field.
+
+Freshness settings:
+
+    SCRAPER_REFETCH_AFTER_HOURS       refetch once the stored copy is older (default 168)
+    SCRAPER_REFETCH_ON_PRICE_CHANGE   refetch when the listing price changed (default on)
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import struct
+from datetime import datetime, timedelta, timezone
+
+from .config import env_bool, env_float, env_int, state_path
+from .canonical import canonical_key
+from .product_store import price_value, utc_now
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    site TEXT NOT NULL,
+    key TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_fetched TEXT NOT NULL,
+    price REAL,
+    PRIMARY KEY (site, key)
+);
+CREATE INDEX IF NOT EXISTS idx_seen_last_fetched ON seen(site, last_fetched);
+"""
+
+UPSERT_SEEN = """
+INSERT INTO seen (site, key, first_seen, last_fetched, price)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(site, key) DO UPDATE SET
+    last_fetched = excluded.last_fetched,
+    price = excluded.price
+"""
+
+# Detail fields that are empty in a listing-only record and worth filling from the store.
+EMPTY_VALUES = (None, "", "N/A", [], {})
+
+
+def is_empty(value) -> bool:
+    """Return True for a missing field value, including a dict of missing values (e.g. feedback)."""
+    if isinstance(value, dict):
+        return all(is_empty(v) for v in value.values())
+    return value in EMPTY_VALUES
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float, bits: bytearray = None, count: int = 0):
+        """Size a filter for `capacity` keys at the given false-positive rate."""
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: str):
+        """Set the bits for a key."""
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """Bloom filter that grows by adding larger, tighter filters as it fills up."""
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.001):
+        """Start with a single filter sized for `capacity` keys."""
+        self.initial_capacity = capacity
+        self.error_rate = error_rate
+        self.filters = []
+
+    def __contains__(self, key):
+        return any(key in f for f in reversed(self.filters))
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+
+    def add(self, key: str):
+        """Add a key unless it already appears to be present."""
+        if key in self:
+            return
+        if not self.filters or self.filters[-1].full:
+            n = len(self.filters)
+            self.filters.append(BloomFilter(
+                self.initial_capacity * self.GROWTH ** n,
+                self.error_rate * (1 - self.TIGHTENING) * self.TIGHTENING ** n,
+            ))
+        self.filters[-1].add(key)
+
+    def save(self, path):
+        """Write the filter atomically as a JSON header followed by the raw bit arrays."""
+        header = json.dumps({
+            "capacity": self.initial_capacity,
+            "error_rate": self.error_rate,
+            "filters": [[f.capacity, f.error_rate, f.count] for f in self.filters],
+        }).encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(">I", len(header)))
+            f.write(header)
+            for bloom in self.filters:
+                f.write(bloom.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a filter written by save()."""
+        with open(path, "rb") as f:
+            (header_len,) = struct.unpack(">I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+            sbf = cls(header["capacity"], header["error_rate"])
+            for capacity, error_rate, count in header["filters"]:
+                bloom = BloomFilter(capacity, error_rate, count=count)
+                bloom.bits = bytearray(f.read(len(bloom.bits)))
+                if len(bloom.bits) != (bloom.num_bits + 7) // 8:
+                    raise ValueError(f"Truncated Bloom filter file {path}")
+                sbf.filters.append(bloom)
+        return sbf
+
+
+class FreshnessPolicy:
+    def __init__(self, refetch_after_hours: float = 168, refetch_on_price_change: bool = True):
+        """Decide when a previously fetched product is worth fetching again."""
+        self.max_age = timedelta(hours=refetch_after_hours)
+        self.refetch_on_price_change = refetch_on_price_change
+
+    def reason_to_refetch(self, last_fetched: str, stored_price, listing_price):
+        """Return why a seen product should be refetched ("stale", "price_change"), or None."""
+        try:
+            fetched_at = datetime.fromisoformat(last_fetched)
+        except (TypeError, ValueError):
+            return "stale"
+        if datetime.now(timezone.utc) - fetched_at >= self.max_age:
+            return "stale"
+        if (self.refetch_on_price_change and listing_price is not None
+                and stored_price is not None and abs(listing_price - stored_price) > 0.005):
+            return "price_change"
+        return None
+
+    @classmethod
+    def from_env(cls):
+        """Build the policy from SCRAPER_REFETCH_* settings."""
+        return cls(
+            env_float("SCRAPER_REFETCH_AFTER_HOURS", 168),
+            env_bool("SCRAPER_REFETCH_ON_PRICE_CHANGE", True),
+        )
+
+
+class SeenIndex:
+    def __init__(self, site: str, policy: FreshnessPolicy = None, capacity: int = 10000, error_rate: float = 0.001):
+        """Load the site's Bloom filter and open the exact index."""
+        self.site = site
+        self.policy = policy or FreshnessPolicy()
+        self.bloom_path = state_path("seen", f"{site}.bloom")
+        self.db_path = state_path("seen", "seen.db")
+        self._added = []
+        self._reused = set()
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(str(self.db_path), timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA busy_timeout=30000")
+            self.conn.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            logger.error(f"Error opening seen index {self.db_path}: {e}")
+            self.conn = None
+        self.bloom = self._load_bloom(capacity, error_rate)
+
+    def _load_bloom(self, capacity, error_rate):
+        if self.bloom_path.exists():
+            try:
+                bloom = ScalableBloomFilter.load(self.bloom_path)
+                logger.info(f"Loaded seen index for {self.site}: ~{len(bloom)} products")
+                return bloom
+            except (OSError, ValueError, KeyError, struct.error) as e:
+                logger.warning(f"Rebuilding unreadable Bloom filter {self.bloom_path}: {e}")
+        bloom = ScalableBloomFilter(capacity, error_rate)
+        if self.conn is not None:
+            for (key,) in self.conn.execute("SELECT key FROM seen WHERE site = ?", (self.site,)):
+                bloom.add(key)
+        return bloom
+
+    def _lookup(self, key):
+        if self.conn is None:
+            return None
+        try:
+            return self.conn.execute(
+                "SELECT last_fetched, price FROM seen WHERE site = ? AND key = ?", (self.site, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading seen index: {e}")
+            return None
+
+    def should_fetch(self, url, listing_price=None) -> bool:
+        """Return True if the product's detail page needs fetching this run."""
+        key = canonical_key(self.site, url)
+        if not key or key not in self.bloom:
+            run_report.incr("seen_new")
+            return True
+        row = self._lookup(key)
+        if row is None:
+            run_report.incr("seen_bloom_false_positives")
+            return True
+        reason = self.policy.reason_to_refetch(row[0], row[1], price_value(listing_price))
+        if reason:
+            run_report.incr(f"seen_refetched_{reason}")
+            return True
+        return False
+
+    def reuse(self, product: dict, store, fields=()) -> bool:
+        """Fill a listing record from the store when its detail page is still fresh.
+
+        `fields` are the detail fields this run asks for; the stored copy is only used if it has all of them.
+        Returns True if the stored copy was used and the detail fetch can be skipped.
+        """
+        url = product.get("url")
+        if not url or url == "N/A" or self.should_fetch(url, product.get("exact_price")):
+            return False
+        cached = store.get(url)
+        if not cached:
+            run_report.incr("seen_missing_in_store")
+            return False
+        if any(is_empty(cached.get(field)) for field in fields):
+            run_report.incr("seen_incomplete_in_store")
+            return False
+        for field, value in cached.items():
+            if is_empty(product.get(field)):
+                product[field] = value
+        self._reused.add(canonical_key(self.site, url))
+        run_report.incr("detail_fetches_skipped")
+        logger.info(f"Reusing stored details for {url}")
+        return True
+
+    def record(self, product: dict, fetched: bool = True):
+        """Mark a saved product as fetched now if its detail page was fetched (not skipped or reused)."""
+        key = canonical_key(self.site, product.get("url"))
+        if not fetched or not key or key in self._reused:
+            return
+        if key not in self.bloom:
+            self.bloom.add(key)
+            self._added.append(key)
+        if self.conn is None:
+            return
+        now = utc_now()
+        try:
+            with self.conn:
+                self.conn.execute(UPSERT_SEEN, (self.site, key, now, now, price_value(product.get("exact_price"))))
+        except sqlite3.Error as e:
+            logger.error(f"Error updating seen index: {e}")
+
+    def close(self):
+        """Persist the Bloom filter, merging with any copy saved by a concurrent run."""
+        if self._added:
+            bloom = self.bloom
+            if self.bloom_path.exists():
+                try:
+                    bloom = ScalableBloomFilter.load(self.bloom_path)
+                    for key in self._added:
+                        bloom.add(key)
+                except (OSError, ValueError, KeyError, struct.error):
+                    bloom = self.bloom
+            try:
+                bloom.save(self.bloom_path)
+            except OSError as e:
+                logger.error(f"Error saving Bloom filter {self.bloom_path}: {e}")
+            self._added = []
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class DisabledSeenIndex:
+    """Seen index used when SCRAPER_SEEN_INDEX is off: every product is fetched."""
+
+    def should_fetch(self, url, listing_price=None) -> bool:
+        return True
+
+    def reuse(self, product: dict, store, fields=()) -> bool:
+        return False
+
+    def record(self, product: dict, fetched: bool = True):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_seen_index(site):
+    """Return the seen index for a site, or a disabled one unless SCRAPER_SEEN_INDEX is set."""
+    if not env_bool("SCRAPER_SEEN_INDEX"):
+        return DisabledSeenIndex()
+    return SeenIndex(
+        site,
+        FreshnessPolicy.from_env(),
+        capacity=env_int("SCRAPER_SEEN_CAPACITY", 10000),
+    )
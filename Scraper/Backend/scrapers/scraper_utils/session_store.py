@@ -0,0 +1,206 @@
+"""Persistent CAPTCHA sessions with the scrape position needed to resume a job.
+
+When a scraper hits a CAPTCHA it saves the browser cookies, the job
+parameters, where it stopped (page, card index, pending detail URL) and the
+products collected so far, then reports "captcha_required" with the session
+ID. Validating the CAPTCHA with `<site>.py --validate-captcha <input> <id>`
+restores the session and continues the job from that position.
+
+Sessions live in one SQLite database (SCRAPER_SESSION_DB, default
+sessions.db in the state directory) opened in WAL mode, so concurrent jobs can
+save and load safely. Sessions expire after SCRAPER_SESSION_TTL_HOURS
+(default 24) and are evicted whenever the store is opened.
+
+A session may also hold a parked browser (see browser_park), which is closed
+when the session is deleted or evicted.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from .browser_park import close_parked, park_ttl
+from .config import env_float, env_str, state_path
+from .run_report import run_report
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    url TEXT,
+    cookies TEXT NOT NULL,
+    job TEXT,
+    position TEXT,
+    parked TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_site ON sessions(site);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+
+CREATE TABLE IF NOT EXISTS session_products (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+"""
+
+
+class CaptchaRequired(Exception):
+    def __init__(self, details: dict, url: str = None):
+        """Signal that a CAPTCHA blocked the scrape; carries the details shown to the user."""
+        super().__init__("CAPTCHA detected")
+        self.details = details
+        self.url = url
+
+
+def new_session_id(site):
+    """Return a session ID that stays unique across concurrent jobs."""
+    return f"{site}_{int(time.time())}_{os.getpid()}"
+
+
+class SessionStore:
+    def __init__(self, db_path: str, ttl_hours: float = 24):
+        """Open (or create) the session database and evict expired sessions."""
+        self.db_path = db_path
+        self.ttl = ttl_hours * 3600
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sessions)")}
+        if "parked" not in columns:
+            self.conn.execute("ALTER TABLE sessions ADD COLUMN parked TEXT")
+        self.evict_expired()
+
+    def save(self, session_id, site, url, cookies, job=None, position=None, products=None, parked=None):
+        """Save or replace a session together with its position, partial results and parked browser."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions "
+                "(session_id, site, url, cookies, job, position, parked, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, site, url, json.dumps(cookies or []), json.dumps(job), json.dumps(position),
+                 json.dumps(parked) if parked else None, now, now + self.ttl)
+            )
+            if products is not None:
+                self.conn.execute("DELETE FROM session_products WHERE session_id = ?", (session_id,))
+                self.conn.executemany(
+                    "INSERT INTO session_products (session_id, seq, data) VALUES (?, ?, ?)",
+                    ((session_id, seq, json.dumps(product, ensure_ascii=False))
+                     for seq, product in enumerate(products))
+                )
+        logger.info(f"Saved session {session_id} to {self.db_path}")
+
+    def load(self, session_id):
+        """Return a saved session as a dict, or None if it does not exist or has expired."""
+        row = self.conn.execute(
+            "SELECT site, url, cookies, job, position, parked FROM sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time())
+        ).fetchone()
+        if not row:
+            logger.warning(f"Session {session_id} not found or expired")
+            return None
+        site, url, cookies, job, position, parked = row
+        products = [
+            json.loads(data) for (data,) in self.conn.execute(
+                "SELECT data FROM session_products WHERE session_id = ? ORDER BY seq", (session_id,)
+            )
+        ]
+        return {
+            "session_id": session_id,
+            "site": site,
+            "url": url,
+            "cookies": json.loads(cookies),
+            "job": json.loads(job) if job else None,
+            "position": json.loads(position) if position else None,
+            "parked": json.loads(parked) if parked else None,
+            "products": products,
+        }
+
+    def delete(self, session_id, close_browser=True):
+        """Remove a session and its partial results, closing its parked browser unless told not to."""
+        if close_browser:
+            row = self.conn.execute("SELECT parked FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row and row[0]:
+                close_parked(json.loads(row[0]))
+        with self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self.conn.execute("DELETE FROM session_products WHERE session_id = ?", (session_id,))
+
+    def evict_expired(self):
+        """Delete every session whose TTL has passed and close browsers parked for too long."""
+        now = time.time()
+        stale = self.conn.execute(
+            "SELECT session_id, parked, expires_at FROM sessions WHERE parked IS NOT NULL"
+        ).fetchall()
+        for session_id, parked, expires_at in stale:
+            parked = json.loads(parked)
+            if expires_at <= now or now - parked.get("parked_at", 0) > park_ttl():
+                close_parked(parked)
+                with self.conn:
+                    self.conn.execute("UPDATE sessions SET parked = NULL WHERE session_id = ?", (session_id,))
+        with self.conn:
+            expired = self.conn.execute(
+                "DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            self.conn.execute(
+                "DELETE FROM session_products WHERE session_id NOT IN (SELECT session_id FROM sessions)"
+            )
+        if expired:
+            logger.info(f"Evicted {expired} expired sessions")
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+
+
+def open_session_store():
+    """Open the shared session store configured by SCRAPER_SESSION_DB."""
+    return SessionStore(
+        env_str("SCRAPER_SESSION_DB") or str(state_path("sessions.db")),
+        env_float("SCRAPER_SESSION_TTL_HOURS", 24),
+    )
+
+
+def save_session(session_id, site, url, cookies, job=None, position=None, products=None, parked=None):
+    """Save a CAPTCHA session, logging instead of raising on failure."""
+    run_report.incr("captcha_sessions")
+    try:
+        sessions = open_session_store()
+        try:
+            sessions.save(session_id, site, url, cookies, job, position, products, parked)
+        finally:
+            sessions.close()
+    except sqlite3.Error as e:
+        logger.error(f"Error saving session {session_id}: {e}")
+
+
+def load_session(session_id):
+    """Load a CAPTCHA session, or None if it is missing, expired or unreadable."""
+    try:
+        sessions = open_session_store()
+        try:
+            return sessions.load(session_id)
+        finally:
+            sessions.close()
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(f"Error loading session {session_id}: {e}")
+        return None
+
+
+def delete_session(session_id, close_browser=True):
+    """Delete a CAPTCHA session once its job has finished."""
+    try:
+        sessions = open_session_store()
+        try:
+            sessions.delete(session_id, close_browser)
+        finally:
+            sessions.close()
+    except sqlite3.Error as e:
+        logger.error(f"Error deleting session {session_id}: {e}")
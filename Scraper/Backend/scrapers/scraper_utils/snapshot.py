@@ -0,0 +1,41 @@
+"""One page snapshot per navigation, shared by CAPTCHA detection and extraction.
+
+The scrapers used to call `browser.page_source` separately for CAPTCHA
+detection, CAPTCHA details and extraction. Each call is a round trip that
+serialises the whole DOM, and each caller built its own BeautifulSoup tree.
+A PageSnapshot fetches the source (and URL) the first time it is needed.
+It builds the lowercased text and the parsed tree the first time they are
+used, and keeps them for every later caller.
+
+Take the snapshot once the page is in the state the extractors read,
+i.e. after waiting and scrolling. DOM changes after that are not seen.
+"""
+from functools import cached_property
+
+from bs4 import BeautifulSoup
+
+
+class PageSnapshot:
+    def __init__(self, driver):
+        """Snapshot the page `driver` is showing; nothing is fetched until a view is used."""
+        self.driver = driver
+
+    @cached_property
+    def source(self) -> str:
+        """The page source."""
+        return self.driver.page_source
+
+    @cached_property
+    def url(self) -> str:
+        """The page URL."""
+        return self.driver.current_url
+
+    @cached_property
+    def lower(self) -> str:
+        """The lowercased page source, for keyword checks."""
+        return self.source.lower()
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        """The parsed page."""
+        return BeautifulSoup(self.source, "html.parser")
@@ -0,0 +1,120 @@
+"""Product collections that can keep memory bounded by spilling records to disk.
+
+By default scrapers keep their products in a dict keyed by URL. With
+SCRAPER_BOUNDED_MEMORY=1 only an 8-byte fingerprint per URL stays resident
+and each completed record is appended to a JSON-lines spill file, which is
+streamed back when the results are written.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+from .config import env_bool, state_path
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(key: str) -> int:
+    """Return a compact 64-bit fingerprint for a product key."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class InMemoryProducts(dict):
+    """Products keyed by URL, held entirely in memory."""
+
+    def append(self, product: dict):
+        """Add a product keyed by its URL, keeping the first record for a URL."""
+        self.setdefault(product["url"], product)
+
+    def close(self):
+        """Nothing to release for in-memory products."""
+
+
+class SpilledProducts:
+    def __init__(self, site: str):
+        """Create an empty collection backed by a spill file."""
+        self.path = state_path("spill", f"{site}_{os.getpid()}_{int(time.time())}.jsonl")
+        self._fingerprints = set()
+        self._file = open(self.path, "w", encoding="utf-8")
+        logger.info(f"Spilling {site} products to {self.path}")
+
+    def __contains__(self, key):
+        return bool(key) and fingerprint(key) in self._fingerprints
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def __bool__(self):
+        return bool(self._fingerprints)
+
+    def __setitem__(self, key, product):
+        digest = fingerprint(key)
+        if digest in self._fingerprints:
+            return
+        self._fingerprints.add(digest)
+        self._file.write(json.dumps(product, ensure_ascii=False) + "\n")
+
+    def append(self, product: dict):
+        """Add a product keyed by its URL."""
+        self[product["url"]] = product
+
+    def values(self):
+        """Stream the spilled records back in insertion order."""
+        self._file.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def close(self):
+        """Close and delete the spill file."""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            logger.warning(f"Error removing spill file {self.path}: {e}")
+
+
+def open_products(site):
+    """Return the product collection for a run, bounded if SCRAPER_BOUNDED_MEMORY is set."""
+    if env_bool("SCRAPER_BOUNDED_MEMORY"):
+        return SpilledProducts(site)
+    return InMemoryProducts()
+
+
+def write_json_array(fp, records, indent=None, ensure_ascii=True):
+    """Write records as a JSON array one at a time, matching json.dump's layout."""
+    first = True
+    for record in records:
+        text = json.dumps(record, ensure_ascii=ensure_ascii, indent=indent)
+        if indent:
+            pad = " " * indent
+            text = pad + text.replace("\n", "\n" + pad)
+            fp.write(("[\n" if first else ",\n") + text)
+        else:
+            fp.write(("[" if first else ", ") + text)
+        first = False
+    if first:
+        fp.write("[]")
+    else:
+        fp.write("\n]" if indent else "]")
+
+
+def save_products(path, products):
+    """Stream products to a JSON file in the same format the scrapers always wrote."""
+    with open(path, "w", encoding="utf-8") as f:
+        write_json_array(f, products.values(), indent=4, ensure_ascii=False)
+
+
+def print_result(result: dict, products):
+    """Print a scraper result as one JSON line, streaming its product list."""
+    sys.stdout.write('{"status": ' + json.dumps(result["status"]) + ', "products": ')
+    write_json_array(sys.stdout, products.values())
+    for key, value in result.items():
+        if key not in ("status", "products"):
+            sys.stdout.write(f", {json.dumps(key)}: {json.dumps(value)}")
+    sys.stdout.write("}\n")
+    sys.stdout.flush()
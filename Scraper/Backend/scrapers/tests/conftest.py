@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scrapers import their helpers as the top-level scraper_utils package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
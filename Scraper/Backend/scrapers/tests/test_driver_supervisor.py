@@ -0,0 +1,50 @@
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException, WebDriverException
+
+from scraper_utils.driver_supervisor import SupervisedDriver, is_closed_window, is_dead_session
+
+
+class FakeDriver:
+    """Browser with two tabs whose current tab has just been closed."""
+
+    def __init__(self):
+        self.window_handles = ["tab-1", "tab-2"]
+        self.current = "closed-tab"
+        self.visited = []
+        self.quit_called = False
+        driver = self
+
+        class SwitchTo:
+            def window(self, handle):
+                driver.current = handle
+
+        self.switch_to = SwitchTo()
+
+    def get(self, url):
+        if self.current not in self.window_handles:
+            raise NoSuchWindowException("no such window: target window already closed")
+        self.visited.append((self.current, url))
+
+    def get_cookies(self):
+        return []
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_closed_tab_is_not_a_dead_browser():
+    closed = NoSuchWindowException("no such window: target window already closed")
+    assert is_closed_window(closed) and not is_dead_session(closed)
+    assert is_dead_session(InvalidSessionIdException("invalid session id"))
+    assert is_dead_session(WebDriverException("disconnected: not connected to DevTools"))
+    assert is_dead_session(WebDriverException("unknown error: chrome not reachable"))
+    assert not is_dead_session(WebDriverException("tab crashed"))
+
+
+def test_navigation_in_a_closed_tab_switches_to_a_remaining_one():
+    started = []
+    driver = FakeDriver()
+    supervised = SupervisedDriver(lambda proxy=None: started.append(proxy) or FakeDriver(), "test", driver=driver)
+    supervised.get("https://example.com/")
+    assert supervised.wrapped_driver is driver
+    assert not started and not driver.quit_called
+    assert driver.visited == [("tab-1", "https://example.com/")]
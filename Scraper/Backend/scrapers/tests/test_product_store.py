@@ -0,0 +1,32 @@
+import pytest
+
+from scraper_utils.product_store import ProductStore, price_value
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$1,234,567.89", 1234567.89),
+    ("1,234", 1234.0),
+    ("₹1,23,456.00", 123456.0),
+    ("1,23,456", 123456.0),
+    ("Rs. 12,34,56,789", 123456789.0),
+    ("₹499", 499.0),
+    ("1234.50", 1234.5),
+    ("US $12.99 - $15.99", 12.99),
+])
+def test_price_value_parses_grouped_prices(text, expected):
+    assert price_value(text) == expected
+
+
+def test_price_value_without_a_number():
+    assert price_value("Ask for price") is None
+    assert price_value(None) is None
+    assert price_value(42) == 42.0
+
+
+def test_failed_flushes_keep_the_buffer_bounded(tmp_path):
+    store = ProductStore(str(tmp_path / "products.db"), "ebay", "phone", batch_size=2, max_buffer=5)
+    store.conn.execute("DROP TABLE price_history")
+    for n in range(20):
+        store.add({"url": f"https://www.ebay.com/itm/{n}", "exact_price": "1"})
+    assert len(store._buffer) <= 5
+    assert store._buffer[-1]["url"] == "https://www.ebay.com/itm/19"
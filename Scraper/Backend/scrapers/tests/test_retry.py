@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from scraper_utils.retry import CAPTCHA, RATE_LIMITED, UNKNOWN, CircuitBreaker, classify_failure
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SCRAPER_STATE_DIR", str(tmp_path))
+
+
+def test_ordinary_page_with_captcha_script_is_not_a_block():
+    page = {
+        "title": "Phone case - Amazon.com",
+        "url": "https://www.amazon.com/dp/B000TEST01",
+        "text": None,
+        "source": '<script src="https://www.google.com/recaptcha/api.js"></script><p>no rate limit here</p>',
+    }
+    assert classify_failure(None, page) == UNKNOWN
+
+
+@pytest.mark.parametrize("page, kind", [
+    ({"title": "Robot Check"}, CAPTCHA),
+    ({"url": "https://www.amazon.com/errors/validateCaptcha"}, CAPTCHA),
+    ({"source": '<form action="/errors/validateCaptcha">'}, CAPTCHA),
+    ({"text": "Too many requests. Please try again later."}, RATE_LIMITED),
+    ({"title": "Access Denied"}, RATE_LIMITED),
+])
+def test_block_pages(page, kind):
+    assert classify_failure(None, page) == kind
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    first, second = CircuitBreaker("test", threshold=1, cooldown=0.1), CircuitBreaker("test", threshold=1, cooldown=0.1)
+    first.record_failure(CAPTCHA)
+    assert not first.allow() and not second.allow()
+    time.sleep(0.15)
+    assert first.allow()
+    assert not second.allow()
+    assert first.allow()
+    first.record_success()
+    assert second.allow()
+
+
+def test_breaker_counts_failures_from_every_process():
+    breakers = [CircuitBreaker("test", threshold=3) for _ in range(3)]
+    for breaker in breakers:
+        breaker.record_failure(RATE_LIMITED)
+    assert not breakers[0].allow()
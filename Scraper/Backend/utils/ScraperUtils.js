@@ -76,8 +76,9 @@ const runScraper = (site, keyword, pageCount, retries, fields) => {
   }
 };
 
+// Validation runs the site's own scraper, which resumes the saved job when the CAPTCHA is accepted
 const validateCaptcha = (site, captchaInput, sessionId) => {
-  const scriptPath = path.join(__dirname, '..', 'scrapers', `${sanitize(site)}_captcha.py`);
+  const scriptPath = path.join(__dirname, '..', 'scrapers', `${sanitize(site)}.py`);
 
   if (!fs.existsSync(scriptPath)) {
     logger.error({ message: `CAPTCHA validation script not found for ${site}`, scriptPath });
@@ -87,7 +88,7 @@ const validateCaptcha = (site, captchaInput, sessionId) => {
   // Sanitize inputs
   const safeCaptchaInput = captchaInput.replace(/"/g, '\\"').replace(/`/g, '\\`');
   const safeSessionId = sessionId.replace(/"/g, '\\"').replace(/`/g, '\\`');
-  const command = `python "${scriptPath}" "${safeCaptchaInput}" "${safeSessionId}"`;
+  const command = `python "${scriptPath}" --validate-captcha "${safeCaptchaInput}" "${safeSessionId}"`;
 
   logger.info({ message: `Executing CAPTCHA validation command: ${command}` });
 
@@ -95,10 +96,10 @@ const validateCaptcha = (site, captchaInput, sessionId) => {
     const output = execSync(command, {
       encoding: 'utf8',
       stdio: 'pipe',
-      maxBuffer: 2 * 1024 * 1024, // 2MB
+      maxBuffer: 10 * 1024 * 1024, // 10MB, a resumed job returns its products
     });
 
-    logger.info({ message: `CAPTCHA validation output for ${site}`, output });
+    logger.info({ message: `CAPTCHA validation output for ${site}`, length: output.length });
 
     try {
       const result = JSON.parse(output);